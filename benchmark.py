@@ -0,0 +1,428 @@
+# benchmark Graph LSTM graph construction and execution across graph size, batch size, timesteps and weight sharing
+#
+# CALL SIGNATURE:
+# python benchmark.py results.json [ baseline.json ]
+# python benchmark.py --recompute-report
+# python benchmark.py --sparse-report
+# python benchmark.py --schedule-report
+#
+# Runs graph_lstm on the hand graph and on synthetic random graphs of increasing size for all configurations
+# defined below, and writes the results to results.json. If a baseline (a results.json of an earlier run) is given,
+# the results are compared against it, and the script exits with status 1 if any metric regressed.
+# With --recompute-report, prints the memory and time needed for training with and without recomputing activations
+# in the backward pass (GraphLSTMNet's recompute_activations) instead, for increasing numbers of timesteps.
+# With --sparse-report, prints the metrics of graph_lstm_sparse on random graphs of up to superpixel scale instead,
+# next to those of the equivalent graph_lstm engines for the graph sizes these can still be built for.
+# With --schedule-report, prints the parallelism of the update schedules (the number of vectorised steps per timestep
+# and the nodes updated per step, see GraphLSTMNet.parallelism) on all benchmark graphs instead, next to their timings.
+
+import graph_lstm as glstm
+import graph_lstm_sparse as glstm_sparse
+from helpers import HAND_GRAPH_HANDS2017, HAND_GRAPH_HANDS2017_INDEX_DICT, GLSTM_NUM_UNITS
+
+import tensorflow as tf
+from tensorflow.python.client import timeline
+import networkx as nx
+import numpy as np
+
+from itertools import product
+from sys import argv
+import json
+import platform
+import time
+
+
+# # BENCHMARK CONFIGURATION  # ADAPT HERE
+
+# synthetic random graph sizes (number of nodes), in addition to the hand graph
+RANDOM_GRAPH_SIZES = [50, 100, 200]
+# each node of a random graph is connected to this many nearest neighbours in a ring, before rewiring
+RANDOM_GRAPH_NEIGHBOURS = 4
+# probability of rewiring each edge of a random graph
+RANDOM_GRAPH_REWIRING_PROBABILITY = 0.1
+
+BATCH_SIZES = [1, 64, 512]
+TIMESTEPS = [1, 2, 4]
+SHARED_WEIGHTS = {"ALL_SHARED": glstm.ALL_SHARED,
+                  "NONE_SHARED": glstm.NONE_SHARED,
+                  "NEIGHBOUR_CONNECTIONS_SHARED": glstm.NEIGHBOUR_CONNECTIONS_SHARED}
+STATE_IS_TUPLE = [True, False]
+# keyword arguments passed to graph_lstm for selecting the execution engine
+ENGINES = {"sequential": {},
+           "level": {"update_schedule": glstm.LEVEL_SCHEDULE},
+           "sequential_packed": {"packed_state": True},
+           "level_packed": {"update_schedule": glstm.LEVEL_SCHEDULE, "packed_state": True},
+           "synchronous": {"update_schedule": glstm.SYNCHRONOUS_SCHEDULE},
+           "colouring": {"update_schedule": glstm.COLOURING_SCHEDULE},
+           "level_recompute": {"update_schedule": glstm.LEVEL_SCHEDULE, "recompute_activations": True},
+           "synchronous_recompute": {"update_schedule": glstm.SYNCHRONOUS_SCHEDULE, "recompute_activations": True},
+           "sequential_fused": {"cell_class": glstm.FusedGraphLSTMCell},
+           "level_fused": {"update_schedule": glstm.LEVEL_SCHEDULE, "cell_class": glstm.FusedGraphLSTMCell}}
+
+# the configuration every sweep starts from (keys as in the lists and dicts above)
+BASE_CONFIG = {"batch_size": 64, "timesteps": 2, "shared_weights": "NEIGHBOUR_CONNECTIONS_SHARED",
+               "state_is_tuple": True, "engine": "sequential"}
+
+# number of untimed steps before timing, and number of timed steps (the median is reported)
+WARMUP_STEPS = 2
+TIMED_STEPS = 10
+
+# a metric regresses if it exceeds its baseline value by more than this fraction
+REGRESSION_TOLERANCE = 0.2
+# metrics allowed to exceed their baseline value by REGRESSION_TOLERANCE, all others (op counts) are compared exactly
+TOLERANT_METRICS = ["build_time", "gradient_build_time", "forward_time", "forward_backward_time", "peak_memory"]
+
+# recompute report: engines compared against their "_recompute" variant in ENGINES, on the hand graph
+RECOMPUTE_ENGINES = ["level", "synchronous"]
+RECOMPUTE_TIMESTEPS = [2, 8, 32]
+RECOMPUTE_BATCH_SIZE = 512
+
+# sparse report: keyword arguments passed to graph_lstm_sparse.sparse_graph_lstm, and the engine of ENGINES yielding
+# the same results (with stacked weights) each is compared against, on random graphs of these sizes
+SPARSE_ENGINES = {"sparse_synchronous": {"update_schedule": glstm.SYNCHRONOUS_SCHEDULE},
+                  "sparse_level": {"update_schedule": glstm.LEVEL_SCHEDULE}}
+SPARSE_DENSE_ENGINES = {"sparse_synchronous": "synchronous", "sparse_level": "level"}
+SPARSE_GRAPH_SIZES = [100, 1000, 10000]
+# graph_lstm engines are only run up to this graph size, as their graph construction time grows with the node count
+SPARSE_DENSE_MAX_NODES = 1000
+
+# schedule report: engines of ENGINES compared on all benchmark graphs, running the base config
+SCHEDULE_ENGINES = ["sequential", "level", "colouring", "synchronous"]
+
+SEED = 0
+
+
+def random_graph(num_nodes, seed=SEED):
+    """Create a connected random graph with random confidence values (see GraphLSTMNet.create_nxgraph).
+
+    Returns:
+      A pair (graph, confidence_dict).
+    """
+    graph = nx.connected_watts_strogatz_graph(num_nodes, RANDOM_GRAPH_NEIGHBOURS, RANDOM_GRAPH_REWIRING_PROBABILITY,
+                                              seed=seed)
+    confidence_dict = dict(zip(graph, np.random.RandomState(seed).rand(num_nodes)))
+    return graph, confidence_dict
+
+
+def benchmark_graphs():
+    """Return the graphs to benchmark as dict of name: (graph, confidence_dict, index_dict) triples."""
+    graphs = {"hand": (HAND_GRAPH_HANDS2017, None, HAND_GRAPH_HANDS2017_INDEX_DICT)}
+    for num_nodes in RANDOM_GRAPH_SIZES:
+        graph, confidence_dict = random_graph(num_nodes)
+        graphs["random%i" % num_nodes] = (graph, confidence_dict, None)
+    return graphs
+
+
+def sweep_configs(base_config=None):
+    """Return the configurations to benchmark: the base config, and the base config with one parameter changed,
+    for every value of every parameter."""
+    base_config = BASE_CONFIG if base_config is None else base_config
+    axes = {"batch_size": BATCH_SIZES, "timesteps": TIMESTEPS, "shared_weights": sorted(SHARED_WEIGHTS),
+            "state_is_tuple": STATE_IS_TUPLE, "engine": sorted(ENGINES)}
+    configs = [dict(base_config)]
+    for key, values in axes.items():
+        for value in values:
+            config = dict(base_config, **{key: value})
+            if config not in configs:
+                configs.append(config)
+    return configs
+
+
+def _median_step_time(sess, fetches, feed_dict):
+    for _ in range(WARMUP_STEPS):
+        sess.run(fetches, feed_dict=feed_dict)
+    step_times = []
+    for _ in range(TIMED_STEPS):
+        start = time.perf_counter()
+        sess.run(fetches, feed_dict=feed_dict)
+        step_times.append(time.perf_counter() - start)
+    return float(np.median(step_times))
+
+
+def _memory(sess, fetches, feed_dict):
+    """Return the memory needed for one step: a pair (peak_memory, stack_memory).
+
+    peak_memory is the maximum number of bytes allocated at once during the step, summed over all allocators.
+    stack_memory is the number of bytes pushed onto the stacks keeping the tensors of tf.while_loop iterations
+    for the backward pass, i.e. the memory held from the forward to the backward pass of a time loop. It is not
+    included in peak_memory.
+    """
+    run_metadata = tf.RunMetadata()
+    sess.run(fetches, feed_dict=feed_dict,
+             options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), run_metadata=run_metadata)
+    allocator_maximums = timeline.Timeline(run_metadata.step_stats).analyze_step_stats(
+        show_memory=True).allocator_maximums
+    stack_memory = sum(output.tensor_description.allocation_description.requested_bytes
+                       for device_stats in run_metadata.step_stats.dev_stats
+                       for node_stats in device_stats.node_stats if "StackPush" in node_stats.timeline_label
+                       for output in node_stats.output)
+    return int(sum(maximum.num_bytes for maximum in allocator_maximums.values())), int(stack_memory)
+
+
+def run_benchmark(graph, config, confidence_dict=None, index_dict=None):
+    """Build and run graph_lstm on graph for one configuration.
+
+    Args:
+      graph: The graph, or something a networkx.Graph can be built from.
+      config (dict): The configuration, with keys as in BASE_CONFIG.
+      confidence_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+      index_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+
+    Returns:
+      A dict holding the metrics: the time needed to build the forward graph and the gradients (s), the op counts
+      after building the forward graph and the gradients, the median forward and forward+backward step times (s),
+      and the peak memory and stack memory of a forward+backward step (bytes, see _memory).
+    """
+    nxgraph = glstm.GraphLSTMNet.create_nxgraph(graph, GLSTM_NUM_UNITS, confidence_dict=confidence_dict,
+                                                index_dict=index_dict, state_is_tuple=config["state_is_tuple"],
+                                                cell_class=ENGINES[config["engine"]].get("cell_class"))
+    return _run_network(lambda input_tensor: glstm.graph_lstm(
+        input_tensor, nxgraph, state_is_tuple=config["state_is_tuple"],
+        shared_weights=SHARED_WEIGHTS[config["shared_weights"]], timesteps=config["timesteps"],
+        **ENGINES[config["engine"]]), len(nxgraph), config["batch_size"])
+
+
+def run_sparse_benchmark(graph, config, confidence_dict=None):
+    """Build and run graph_lstm_sparse on graph for one configuration, with an engine of SPARSE_ENGINES.
+
+    Nodes are indexed in the order of graph. The state format does not apply to graph_lstm_sparse.
+
+    Returns:
+      A dict holding the metrics, as returned by run_benchmark.
+    """
+    graph = nx.Graph(graph)
+    index = {node: i for i, node in enumerate(graph)}
+    edges = [(index[n_i], index[n_j]) for n_i, n_j in graph.edges()]
+    confidence = None if confidence_dict is None else [confidence_dict[node] for node in graph]
+    return _run_network(lambda input_tensor: glstm_sparse.sparse_graph_lstm(
+        input_tensor, edges, GLSTM_NUM_UNITS, confidence=confidence,
+        shared_weights=SHARED_WEIGHTS[config["shared_weights"]], timesteps=config["timesteps"],
+        **SPARSE_ENGINES[config["engine"]]), len(graph), config["batch_size"])
+
+
+def _run_network(build_network, num_nodes, batch_size):
+    """Build a network by calling build_network on an input placeholder and measure it (see run_benchmark)."""
+    with tf.Graph().as_default() as tf_graph:
+        input_tensor = tf.placeholder(tf.float32, [None, num_nodes, GLSTM_NUM_UNITS])
+
+        start = time.perf_counter()
+        output = build_network(input_tensor)
+        build_time = time.perf_counter() - start
+        op_count = len(tf_graph.get_operations())
+
+        start = time.perf_counter()
+        gradients = tf.gradients(tf.reduce_sum(output), tf.trainable_variables())
+        gradient_build_time = time.perf_counter() - start
+        gradient_op_count = len(tf_graph.get_operations())
+
+        feed_dict = {input_tensor: np.random.RandomState(SEED).rand(batch_size, num_nodes, GLSTM_NUM_UNITS)}
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            peak_memory, stack_memory = _memory(sess, [output, gradients], feed_dict)
+            return {"build_time": build_time,
+                    "op_count": op_count,
+                    "gradient_build_time": gradient_build_time,
+                    "gradient_op_count": gradient_op_count,
+                    "forward_time": _median_step_time(sess, output, feed_dict),
+                    "forward_backward_time": _median_step_time(sess, [output, gradients], feed_dict),
+                    "peak_memory": peak_memory,
+                    "stack_memory": stack_memory}
+
+
+def environment():
+    """Return a description of the environment the benchmark runs in."""
+    return {"tensorflow": tf.__version__, "numpy": np.__version__, "networkx": nx.__version__,
+            "python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor(),
+            "timed_steps": TIMED_STEPS}
+
+
+def run_all(graphs=None, configs=None, verbose=True):
+    """Run the benchmark for all combinations of graphs and configurations.
+
+    Returns:
+      A dict holding the environment and a list of results, each holding the graph name, the configuration
+      and the metrics (see run_benchmark).
+    """
+    graphs = benchmark_graphs() if graphs is None else graphs
+    configs = sweep_configs() if configs is None else configs
+    results = []
+    for (graph_name, (graph, confidence_dict, index_dict)), config in product(graphs.items(), configs):
+        metrics = run_benchmark(graph, config, confidence_dict=confidence_dict, index_dict=index_dict)
+        results.append(dict(graph=graph_name, config=config, metrics=metrics))
+        if verbose:
+            print("%-10s %-110s fwd %8.2f ms, fwd+bwd %8.2f ms, build %6.2f s, %6i ops"
+                  % (graph_name, config, metrics["forward_time"] * 1000, metrics["forward_backward_time"] * 1000,
+                     metrics["build_time"], metrics["op_count"]))
+    return {"environment": environment(), "results": results}
+
+
+def recompute_report(engines=RECOMPUTE_ENGINES, timesteps=RECOMPUTE_TIMESTEPS, batch_size=RECOMPUTE_BATCH_SIZE,
+                     verbose=True):
+    """Compare the memory and time needed for a training step with and without recomputing activations.
+
+    Runs the hand graph for every engine and its "_recompute" variant in ENGINES, for every number of timesteps.
+
+    Returns:
+      A list of dicts holding engine, timesteps, and the metrics without and with recomputation
+      (see run_benchmark).
+    """
+    graph, confidence_dict, index_dict = benchmark_graphs()["hand"]
+    rows = []
+    if verbose:
+        print("%-12s %9s %26s %30s" % ("engine", "timesteps", "stack memory (MB)", "fwd+bwd time (ms)"))
+    for engine, engine_timesteps in product(engines, timesteps):
+        config = dict(BASE_CONFIG, engine=engine, timesteps=engine_timesteps, batch_size=batch_size)
+        stored, recomputed = [run_benchmark(graph, dict(config, engine=e), confidence_dict=confidence_dict,
+                                            index_dict=index_dict) for e in (engine, engine + "_recompute")]
+        rows.append(dict(engine=engine, timesteps=engine_timesteps, stored=stored, recomputed=recomputed))
+        if verbose:
+            print("%-12s %9i %8.1f -> %6.1f (x%5.2f) %8.1f -> %8.1f (x%5.2f)"
+                  % (engine, engine_timesteps, stored["stack_memory"] / 2 ** 20, recomputed["stack_memory"] / 2 ** 20,
+                     recomputed["stack_memory"] / stored["stack_memory"], stored["forward_backward_time"] * 1000,
+                     recomputed["forward_backward_time"] * 1000,
+                     recomputed["forward_backward_time"] / stored["forward_backward_time"]))
+    return rows
+
+
+def _dense_vs_sparse(dense, sparse, metric, scale=1., formatting="%10.2f"):
+    if dense is None:
+        return " " * len(formatting % 0 + " -> ") + formatting % (sparse[metric] * scale)
+    return "%s -> %s" % (formatting % (dense[metric] * scale), formatting % (sparse[metric] * scale))
+
+
+def sparse_report(graph_sizes=SPARSE_GRAPH_SIZES, engines=sorted(SPARSE_ENGINES),
+                  dense_max_nodes=SPARSE_DENSE_MAX_NODES, verbose=True):
+    """Measure graph_lstm_sparse on random graphs of increasing size, next to the equivalent graph_lstm engines.
+
+    graph_lstm runs with stacked weights (the weights graph_lstm_sparse uses), on graphs of up to dense_max_nodes
+    nodes. Both run the base config.
+
+    Returns:
+      A list of dicts holding graph, engine, and the metrics (see run_benchmark) of graph_lstm_sparse ("sparse")
+      and graph_lstm ("dense", None for larger graphs).
+    """
+    rows = []
+    if verbose:
+        print("%-12s %-20s %28s %28s %24s %22s" % ("graph", "engine", "build time (s)", "ops",
+                                                   "fwd+bwd time (ms)", "peak memory (MB)"))
+    for num_nodes, engine in product(graph_sizes, engines):
+        graph, confidence_dict = random_graph(num_nodes)
+        config = dict(BASE_CONFIG, engine=engine)
+        sparse = run_sparse_benchmark(graph, config, confidence_dict=confidence_dict)
+        dense = None
+        if num_nodes <= dense_max_nodes:
+            dense_engine = dict(ENGINES[SPARSE_DENSE_ENGINES[engine]], stacked_weights=True)
+            nxgraph = glstm.GraphLSTMNet.create_nxgraph(graph, GLSTM_NUM_UNITS, confidence_dict=confidence_dict,
+                                                        index_dict={n: i for i, n in enumerate(graph)})
+            dense = _run_network(lambda input_tensor: glstm.graph_lstm(
+                input_tensor, nxgraph, shared_weights=SHARED_WEIGHTS[config["shared_weights"]],
+                timesteps=config["timesteps"], **dense_engine), num_nodes, config["batch_size"])
+        rows.append(dict(graph="random%i" % num_nodes, engine=engine, sparse=sparse, dense=dense))
+        if verbose:
+            print("%-12s %-20s %28s %28s %24s %22s"
+                  % ("random%i" % num_nodes, engine, _dense_vs_sparse(dense, sparse, "build_time"),
+                     _dense_vs_sparse(dense, sparse, "gradient_op_count", formatting="%10i"),
+                     _dense_vs_sparse(dense, sparse, "forward_backward_time", 1000, "%8.1f"),
+                     _dense_vs_sparse(dense, sparse, "peak_memory", 2 ** -20, "%8.1f")))
+    return rows
+
+
+def schedule_report(graphs=None, engines=SCHEDULE_ENGINES, verbose=True):
+    """Report the parallelism of update schedules, next to the time they need.
+
+    Returns:
+      A list of dicts holding graph, engine, the parallelism of its update schedule (see GraphLSTMNet.parallelism)
+      and the metrics (see run_benchmark).
+    """
+    graphs = benchmark_graphs() if graphs is None else graphs
+    rows = []
+    if verbose:
+        print("%-12s %-12s %6s %6s %16s %10s %20s" % ("graph", "engine", "nodes", "steps", "nodes per step",
+                                                      "fwd (ms)", "fwd+bwd (ms)"))
+    for (graph_name, (graph, confidence_dict, index_dict)), engine in product(graphs.items(), engines):
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(graph, GLSTM_NUM_UNITS, confidence_dict=confidence_dict,
+                                                    index_dict=index_dict)
+        parallelism = glstm.GraphLSTMNet(nxgraph, update_schedule=ENGINES[engine].get(
+            "update_schedule", glstm.SEQUENTIAL_SCHEDULE)).parallelism()
+        metrics = run_benchmark(graph, dict(BASE_CONFIG, engine=engine), confidence_dict=confidence_dict,
+                                index_dict=index_dict)
+        rows.append(dict(graph=graph_name, engine=engine, parallelism=parallelism, metrics=metrics))
+        if verbose:
+            print("%-12s %-12s %6i %6i %7.1f (max %3i) %10.2f %20.2f"
+                  % (graph_name, engine, parallelism["nodes"], parallelism["steps"], parallelism["mean_wave_size"],
+                     max(parallelism["wave_sizes"]), metrics["forward_time"] * 1000,
+                     metrics["forward_backward_time"] * 1000))
+    return rows
+
+
+def _result_key(result):
+    return result["graph"], tuple(sorted(result["config"].items()))
+
+
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Compare benchmark results against a baseline.
+
+    Results are matched by graph and configuration, results without baseline are ignored.
+
+    Args:
+      results (dict): Benchmark results as returned by run_all.
+      baseline (dict): Benchmark results as returned by run_all, e.g. loaded from an earlier run's JSON file.
+      tolerance (float): The fraction by which a metric in TOLERANT_METRICS may exceed its baseline value.
+
+    Returns:
+      A list of regressions, each a dict holding graph, config, metric, value and baseline value.
+    """
+    baseline_metrics = {_result_key(r): r["metrics"] for r in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        key = _result_key(result)
+        if key not in baseline_metrics:
+            continue
+        for metric, value in result["metrics"].items():
+            baseline_value = baseline_metrics[key].get(metric)
+            if baseline_value is None:
+                continue
+            if metric in TOLERANT_METRICS:
+                regressed = value > baseline_value * (1 + tolerance)
+            else:
+                regressed = value > baseline_value
+            if regressed:
+                regressions.append(dict(graph=result["graph"], config=result["config"], metric=metric,
+                                        value=value, baseline=baseline_value))
+    return regressions
+
+
+def main():
+    if argv[1:] == ["--recompute-report"]:
+        recompute_report()
+        return
+    if argv[1:] == ["--sparse-report"]:
+        sparse_report()
+        return
+    if argv[1:] == ["--schedule-report"]:
+        schedule_report()
+        return
+    if len(argv) - 1 not in (1, 2):
+        print("You need to enter 1 or 2 command line arguments ('results.json' and optionally 'baseline.json'), "
+              "but found %i" % (len(argv) - 1))
+        exit(1)
+
+    results = run_all()
+    with open(argv[1], "w") as f:
+        json.dump(results, f, indent=2)
+    print("Stored benchmark results at %s." % argv[1])
+
+    if len(argv) == 3:
+        with open(argv[2]) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline)
+        for r in regressions:
+            print("REGRESSION %-10s %r: %s = %r (baseline: %r)"
+                  % (r["graph"], r["config"], r["metric"], r["value"], r["baseline"]))
+        print("%i regressions found compared to baseline %s." % (len(regressions), argv[2]))
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# benchmark the TensorFlow 2 Graph LSTM (graph_lstm_tf2) against the TensorFlow 1 Graph LSTM (graph_lstm)
+#
+# CALL SIGNATURE:
+# python benchmark_tf2.py results_tf2.json [ results_tf1.json ]
+#
+# Runs graph_lstm_tf2.GraphLSTMNet under tf.function, with and without XLA compilation, on the graphs of
+# benchmark.py for the configurations defined below, and writes the results to results_tf2.json in the format of
+# benchmark.py. graph_lstm needs TensorFlow 1 and graph_lstm_tf2 TensorFlow 2, so the TensorFlow 1 path is
+# benchmarked separately, by running benchmark.py in a TensorFlow 1 environment. If its results are given,
+# the forward and forward+backward step times of both are compared for every configuration run by both.
+
+import benchmark
+import graph_lstm as glstm
+import graph_lstm_tf2 as glstm_tf2
+from helpers import GLSTM_NUM_UNITS
+
+import tensorflow as tf
+import numpy as np
+
+from itertools import product
+from sys import argv
+import json
+import time
+
+
+# # BENCHMARK CONFIGURATION  # ADAPT HERE
+
+# keyword arguments passed to graph_lstm_tf2.GraphLSTMNet for selecting the execution engine
+ENGINES = {"tf2_level": {"update_schedule": glstm.LEVEL_SCHEDULE},
+           "tf2_level_xla": {"update_schedule": glstm.LEVEL_SCHEDULE, "jit_compile": True},
+           "tf2_synchronous": {"update_schedule": glstm.SYNCHRONOUS_SCHEDULE},
+           "tf2_synchronous_xla": {"update_schedule": glstm.SYNCHRONOUS_SCHEDULE, "jit_compile": True}}
+
+# the engines of benchmark.py each engine is compared against, i.e. those yielding the same results
+TF1_ENGINES = {"tf2_level": ["sequential", "level"],
+               "tf2_level_xla": ["sequential", "level"],
+               "tf2_synchronous": ["synchronous"],
+               "tf2_synchronous_xla": ["synchronous"]}
+
+
+def sweep_configs():
+    """Return the configurations to benchmark: every configuration of benchmark.sweep_configs running an engine
+    of TF1_ENGINES, with each engine compared against it instead. The state format does not apply to
+    graph_lstm_tf2, so only configurations with the base config's state format are run."""
+    configs = []
+    for config in benchmark.sweep_configs():
+        if config["state_is_tuple"] != benchmark.BASE_CONFIG["state_is_tuple"]:
+            continue
+        for engine, tf1_engines in TF1_ENGINES.items():
+            tf2_config = dict(config, engine=engine)
+            if config["engine"] in tf1_engines and tf2_config not in configs:
+                configs.append(tf2_config)
+    return configs
+
+
+def _median_step_time(step, inputs):
+    for _ in range(benchmark.WARMUP_STEPS):
+        step(inputs)
+    step_times = []
+    for _ in range(benchmark.TIMED_STEPS):
+        start = time.perf_counter()
+        step(inputs)
+        step_times.append(time.perf_counter() - start)
+    return float(np.median(step_times))
+
+
+def run_benchmark(graph, config, confidence_dict=None, index_dict=None):
+    """Build and run graph_lstm_tf2.GraphLSTMNet on graph for one configuration.
+
+    The forward+backward step is one tf.function, compiled by XLA as a whole for XLA engines.
+
+    Args:
+      graph: The graph, or something a networkx.Graph can be built from.
+      config (dict): The configuration, with keys as in benchmark.BASE_CONFIG and an engine of ENGINES.
+      confidence_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+      index_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+
+    Returns:
+      A dict holding the metrics: the time needed for the first forward and forward+backward steps, i.e. for
+      tracing (and compiling) them (s), and the median forward and forward+backward step times (s).
+    """
+    engine = ENGINES[config["engine"]]
+    net = glstm_tf2.GraphLSTMNet(graph, num_units=GLSTM_NUM_UNITS, confidence_dict=confidence_dict,
+                                 index_dict=index_dict,
+                                 shared_weights=benchmark.SHARED_WEIGHTS[config["shared_weights"]],
+                                 timesteps=config["timesteps"], **engine)
+    inputs = tf.constant(np.random.RandomState(benchmark.SEED).rand(config["batch_size"], len(net.node_names),
+                                                                    GLSTM_NUM_UNITS), tf.float32)
+
+    def forward(x):
+        return net(x).numpy()
+
+    @tf.function(jit_compile=engine.get("jit_compile", False))
+    def gradients(x):
+        with tf.GradientTape() as tape:
+            loss = tf.reduce_sum(net(x))
+        # the gradients of weights gathered per wave are IndexedSlices
+        return [tf.convert_to_tensor(g) for g in tape.gradient(loss, net.trainable_weights)]
+
+    def forward_backward(x):
+        return [g.numpy() for g in gradients(x)]
+
+    start = time.perf_counter()
+    forward(inputs)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    forward_backward(inputs)
+    gradient_build_time = time.perf_counter() - start
+    return {"build_time": build_time,
+            "gradient_build_time": gradient_build_time,
+            "forward_time": _median_step_time(forward, inputs),
+            "forward_backward_time": _median_step_time(forward_backward, inputs)}
+
+
+def run_all(graphs=None, configs=None, verbose=True):
+    """Run the benchmark for all combinations of graphs and configurations.
+
+    Returns:
+      A dict holding the environment and a list of results, as returned by benchmark.run_all.
+    """
+    graphs = benchmark.benchmark_graphs() if graphs is None else graphs
+    configs = sweep_configs() if configs is None else configs
+    results = []
+    for (graph_name, (graph, confidence_dict, index_dict)), config in product(graphs.items(), configs):
+        metrics = run_benchmark(graph, config, confidence_dict=confidence_dict, index_dict=index_dict)
+        results.append(dict(graph=graph_name, config=config, metrics=metrics))
+        if verbose:
+            print("%-10s %-110s fwd %8.2f ms, fwd+bwd %8.2f ms, build %6.2f s"
+                  % (graph_name, config, metrics["forward_time"] * 1000, metrics["forward_backward_time"] * 1000,
+                     metrics["build_time"]))
+    return {"environment": benchmark.environment(), "results": results}
+
+
+def compare_with_tf1(results, tf1_results):
+    """Compare the step times of graph_lstm_tf2 with those of graph_lstm for the same graphs and configurations.
+
+    Args:
+      results (dict): Benchmark results as returned by run_all.
+      tf1_results (dict): Benchmark results as returned by benchmark.run_all.
+
+    Returns:
+      A list of dicts holding graph, config, the TensorFlow 1 engine compared against, and the forward and
+      forward+backward step times of both (s).
+    """
+    tf1_metrics = {benchmark._result_key(r): r["metrics"] for r in tf1_results["results"]}
+    comparisons = []
+    for result in results["results"]:
+        for tf1_engine in TF1_ENGINES[result["config"]["engine"]]:
+            key = benchmark._result_key(dict(result, config=dict(result["config"], engine=tf1_engine)))
+            if key not in tf1_metrics:
+                continue
+            comparisons.append(dict(graph=result["graph"], config=result["config"], tf1_engine=tf1_engine,
+                                    **{"%s_%s" % (version, metric): metrics[metric]
+                                       for version, metrics in (("tf1", tf1_metrics[key]), ("tf2", result["metrics"]))
+                                       for metric in ("forward_time", "forward_backward_time")}))
+    return comparisons
+
+
+def main():
+    if len(argv) - 1 not in (1, 2):
+        print("You need to enter 1 or 2 command line arguments ('results_tf2.json' and optionally "
+              "'results_tf1.json'), but found %i" % (len(argv) - 1))
+        exit(1)
+
+    results = run_all()
+    with open(argv[1], "w") as f:
+        json.dump(results, f, indent=2)
+    print("Stored benchmark results at %s." % argv[1])
+
+    if len(argv) == 3:
+        with open(argv[2]) as f:
+            tf1_results = json.load(f)
+        print("TensorFlow %s vs. %s:" % (results["environment"]["tensorflow"],
+                                        tf1_results["environment"]["tensorflow"]))
+        for c in compare_with_tf1(results, tf1_results):
+            print("%-10s %-110s vs. %-11s fwd %8.2f -> %8.2f ms (x%5.2f), fwd+bwd %8.2f -> %8.2f ms (x%5.2f)"
+                  % (c["graph"], c["config"], c["tf1_engine"], c["tf1_forward_time"] * 1000,
+                     c["tf2_forward_time"] * 1000, c["tf2_forward_time"] / c["tf1_forward_time"],
+                     c["tf1_forward_backward_time"] * 1000, c["tf2_forward_backward_time"] * 1000,
+                     c["tf2_forward_backward_time"] / c["tf1_forward_backward_time"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+# export a trained network as a frozen, inference-only graph
+#
+# CALL SIGNATURE:
+# python export_inference_graph.py prefix model_name [ epoch ]
+#
+# Loads the training meta graph and the checkpoint of the given epoch (default: the last one), and stores a
+# meta graph holding only what is needed for computing the network output from its input, with all weights folded
+# into constants, next to the checkpoint (see helpers.inference_graph_path). Everything else in the training graph is
+# stripped: the loss (including the MHP meta loss branch), the optimizer and its slots, summaries, and the gradient
+# wrappers of lr_mult. Training flags (is_training and the Keras learning phase) are fixed to False, which removes the
+# tf.cond branches of dropout, and consecutive linear layers are folded into one (see fold_linear_layers).
+# validate.py and test.py use the exported graph instead of the training graph if it exists.
+
+import graph_lstm as glstm
+from helpers import *
+
+import tensorflow as tf
+from tensorflow.core.framework import graph_pb2
+from tensorflow.core.framework import node_def_pb2
+from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import tensor_util
+import numpy as np
+import re
+
+
+# # EXPORT CONFIGURATION  # ADAPT HERE
+
+# if True, consecutive linear layers are also folded if the folded layer needs more multiply-adds than the two layers
+# it replaces, as for low-rank bottlenecks like the 40 dimensional PCA layer of the Region Ensemble network and the
+# (MHP) output layer following it. This saves a kernel launch, but on a CPU, the 18432 x 63 matrix product of the
+# folded layer took 40 % longer than the 18432 x 40 and 40 x 63 products it replaces (for 2 hypotheses: 2.5 times).
+# The layers feeding into the bottleneck, i.e. the 2048 unit layer and the concatenated segments, are folded anyway.
+FOLD_BOTTLENECKS = False
+
+
+# ops only passing on their (first) input in the forward pass, spliced out of inference graphs
+_PASS_THROUGH_OPS = {"Identity", "IdentityN", "StopGradient", "PreventGradient", "Snapshot"}
+
+# ops never folded into constants, as they either feed values in or belong to control flow
+_UNFOLDABLE_OPS = {"Placeholder", "PlaceholderWithDefault", "Const", "Switch", "Merge", "Enter", "Exit",
+                   "NextIteration", "LoopCond", "RefSwitch", "RefMerge", "RefEnter", "RefExit", "RefNextIteration"}
+
+# names of the Keras learning phase placeholder (K.learning_phase()), replaced by fix_training_flags
+_KERAS_LEARNING_PHASE_PATTERN = re.compile(r"(?:^|/)keras_learning_phase(?:_\d+)?$")
+
+
+def _node_name(tensor_name):
+    """Return the name of the node producing the tensor or control input tensor_name."""
+    return tensor_name.lstrip("^").split(":")[0]
+
+
+def _port(tensor_name):
+    """Return the output index of tensor_name ("name" or "name:index")."""
+    return int(tensor_name.split(":")[1]) if ":" in tensor_name else 0
+
+
+def _consumers(graph_def):
+    """Return a dict mapping each node name to the list of nodes having it as (data or control) input."""
+    consumers = {node.name: [] for node in graph_def.node}
+    for node in graph_def.node:
+        for i in node.input:
+            consumers[_node_name(i)].append(node)
+    return consumers
+
+
+def _copy_graph_def(nodes, library=None):
+    graph_def = graph_pb2.GraphDef()
+    graph_def.node.extend(nodes)
+    if library is not None:
+        graph_def.library.CopyFrom(library)
+    return graph_def
+
+
+def _const_node(name, value, dtype=tf.float32):
+    node = node_def_pb2.NodeDef(name=name, op="Const")
+    node.attr["dtype"].type = dtype.as_datatype_enum
+    node.attr["value"].tensor.CopyFrom(tensor_util.make_tensor_proto(value, dtype=dtype))
+    return node
+
+
+def fix_training_flags(graph_def, flag_names=(), value=False):
+    """Replace the training flags of a graph by constants.
+
+    The training flags are the Keras learning phase (K.learning_phase(), found by its name) and the boolean
+    placeholders named in flag_names, like the is_training placeholder of the MHP networks. Other boolean
+    placeholders (e.g. the flag of graph_lstm_recorder.GateActivationRecorder) are kept.
+
+    Args:
+      graph_def (GraphDef): The graph.
+      flag_names: The names of the boolean placeholders (nodes, not tensors) to replace besides the Keras learning
+        phase.
+      value (bool): The value the flags are fixed to.
+
+    Returns:
+      A copy of graph_def with the flags replaced by constants of the same name, and the list of their names.
+    """
+    flag_names = {_node_name(name) for name in flag_names}
+    nodes, names = [], []
+    for node in graph_def.node:
+        if node.op in ("Placeholder", "PlaceholderWithDefault") and \
+                node.attr["dtype"].type == tf.bool.as_datatype_enum and \
+                (node.name in flag_names or _KERAS_LEARNING_PHASE_PATTERN.search(node.name)):
+            node = _const_node(node.name, value, dtype=tf.bool)
+            names.append(node.name)
+        nodes.append(node)
+    return _copy_graph_def(nodes, graph_def.library), names
+
+
+def _constant_bool(graph_def_nodes, tensor_name):
+    """Return the value of the boolean tensor tensor_name if it is constant (following identities), else None."""
+    node = graph_def_nodes[_node_name(tensor_name)]
+    while node.op == "Identity":
+        node = graph_def_nodes[_node_name(node.input[0])]
+    if node.op == "Const" and node.attr["dtype"].type == tf.bool.as_datatype_enum:
+        return bool(tensor_util.MakeNdarray(node.attr["value"].tensor))
+    return None
+
+
+def prune_constant_branches(graph_def):
+    """Remove the branches of tf.cond not taken because of constant predicates, e.g. after fix_training_flags.
+
+    Every Switch with a constant predicate forwards its input to the taken branch, every node (transitively)
+    depending on its other output is removed, and every Merge left with a single input is replaced by an Identity
+    of it. While loops are not affected, as their predicates are not constant.
+
+    Args:
+      graph_def (GraphDef): The graph.
+
+    Returns:
+      A copy of graph_def with the branches removed.
+    """
+    nodes = {node.name: node for node in graph_def.node}
+    # tensor names of taken switch outputs -> tensor names forwarded to them, and untaken switch outputs
+    forwarded, untaken = {}, set()
+    for node in graph_def.node:
+        if node.op != "Switch":
+            continue
+        predicate = _constant_bool(nodes, node.input[1])
+        if predicate is None:
+            continue
+        taken, other = (1, 0) if predicate else (0, 1)
+        forwarded["%s:%i" % (node.name, taken)] = node.input[0]
+        untaken.add("%s:%i" % (node.name, other))
+        if taken == 0:
+            forwarded[node.name] = node.input[0]
+        else:
+            untaken.add(node.name)
+
+    # propagate deadness from untaken switch outputs to a fixed point (graphs may have cycles from while loops)
+    dead = set()
+    changed = True
+    while changed:
+        changed = False
+        for node in graph_def.node:
+            if node.name in dead:
+                continue
+            dead_inputs = [i in untaken or _node_name(i) in dead for i in node.input]
+            data_dead = [d for i, d in zip(node.input, dead_inputs) if not i.startswith("^")]
+            control_dead = [d for i, d in zip(node.input, dead_inputs) if i.startswith("^")]
+            if node.op == "Merge":
+                is_dead = all(data_dead) or any(control_dead)
+            else:
+                is_dead = any(dead_inputs)
+            if is_dead:
+                dead.add(node.name)
+                changed = True
+
+    pruned = []
+    for node in graph_def.node:
+        if node.name in dead:
+            continue
+        new_node = node_def_pb2.NodeDef()
+        new_node.CopyFrom(node)
+        live_inputs = [i for i in node.input if not (i in untaken or _node_name(i) in dead)]
+        if node.op == "Merge" and len(live_inputs) < len(node.input):
+            # only one data input can be left, as Merge is dead if all are
+            new_node = node_def_pb2.NodeDef(name=node.name, op="Identity", device=node.device)
+            new_node.attr["T"].CopyFrom(node.attr["T"])
+        del new_node.input[:]
+        new_node.input.extend(forwarded.get(i, i) for i in live_inputs)
+        pruned.append(new_node)
+    return _copy_graph_def(pruned, graph_def.library)
+
+
+def splice_pass_through_nodes(graph_def, protected_nodes=()):
+    """Splice out nodes only passing on their input in the forward pass, like identities and gradient wrappers.
+
+    Unlike graph_util.remove_training_nodes, this also removes the IdentityN nodes of tf.custom_gradient (as used by
+    lr_mult), and keeps nodes used as control inputs (like the pivots of tf.cond and tf.while_loop), nodes with control
+    inputs, and nodes forwarding control flow outputs, so control flow keeps working.
+
+    Args:
+      graph_def (GraphDef): The graph.
+      protected_nodes: Names of nodes to keep in any case, like input and output nodes.
+
+    Returns:
+      A copy of graph_def with the nodes spliced out.
+    """
+    nodes = {node.name: node for node in graph_def.node}
+    control_inputs = {_node_name(i) for node in graph_def.node for i in node.input if i.startswith("^")}
+    spliced = {}
+    for node in graph_def.node:
+        if node.op not in _PASS_THROUGH_OPS or node.name in protected_nodes or node.name in control_inputs:
+            continue
+        if not node.input or any(i.startswith("^") for i in node.input):
+            continue
+        if any(nodes[_node_name(i)].op in _UNFOLDABLE_OPS - {"Placeholder", "PlaceholderWithDefault", "Const"}
+               for i in node.input):
+            continue
+        # output k of IdentityN is its input k, that of all other pass-through ops is their first input
+        spliced[node.name] = list(node.input) if node.op == "IdentityN" else [node.input[0]]
+
+    def resolve(tensor_name):
+        while not tensor_name.startswith("^") and _node_name(tensor_name) in spliced:
+            tensor_name = spliced[_node_name(tensor_name)][_port(tensor_name)]
+        return tensor_name
+
+    kept = []
+    for node in graph_def.node:
+        if node.name in spliced:
+            continue
+        new_node = node_def_pb2.NodeDef()
+        new_node.CopyFrom(node)
+        del new_node.input[:]
+        new_node.input.extend(resolve(i) for i in node.input)
+        kept.append(new_node)
+    return _copy_graph_def(kept, graph_def.library)
+
+
+def _const_value(nodes, tensor_name):
+    node = nodes[_node_name(tensor_name)]
+    return tensor_util.MakeNdarray(node.attr["value"].tensor) if node.op == "Const" else None
+
+
+def _dense_layer(nodes, consumers, tensor_name):
+    """Match a linear layer (MatMul by a constant matrix, optionally followed by adding a constant bias) ending in the
+    node producing tensor_name.
+
+    Returns:
+      A tuple (input tensor name, kernel, bias or None, MatMul node, BiasAdd node or None), or None.
+    """
+    node = nodes[_node_name(tensor_name)]
+    bias_node, bias = None, None
+    if node.op == "BiasAdd" or (node.op in ("Add", "AddV2") and _const_value(nodes, node.input[1]) is not None):
+        bias = _const_value(nodes, node.input[1])
+        if bias is None or bias.ndim != 1 or len(consumers[_node_name(node.input[0])]) != 1:
+            return None
+        bias_node, node = node, nodes[_node_name(node.input[0])]
+    if node.op != "MatMul" or node.attr["transpose_a"].b or any(i.startswith("^") for i in node.input):
+        return None
+    kernel = _const_value(nodes, node.input[1])
+    if kernel is None or node.attr["transpose_b"].b:
+        return None
+    if bias is not None and bias.shape[0] != kernel.shape[1]:
+        return None
+    return node.input[0], kernel, bias, node, bias_node
+
+
+def _scaling(nodes, consumers, tensor_name):
+    """Match a multiplication by a constant scalar (like the one in multiple_hypotheses_extension.dense_mhp) producing
+    tensor_name.
+
+    Returns:
+      A tuple (input tensor name, scalar), or None.
+    """
+    node = nodes[_node_name(tensor_name)]
+    if node.op != "Mul" or len(node.input) != 2:
+        return None
+    for data, factor in (node.input, reversed(node.input)):
+        value = _const_value(nodes, factor)
+        if value is not None and value.ndim == 0 and len(consumers[_node_name(data)]) == 1:
+            return data, float(value)
+    return None
+
+
+def _dense_layer_nodes(output_name, input_name, kernel, bias, dtype):
+    """Return the nodes of a linear layer (MatMul [+ BiasAdd]) of input_name, its output node named output_name."""
+    kernel_node = _const_node(output_name + "/folded_kernel", kernel, dtype=dtype)
+    matmul_name = output_name if bias is None else output_name + "/folded_matmul"
+    matmul = node_def_pb2.NodeDef(name=matmul_name, op="MatMul", input=[input_name, kernel_node.name])
+    matmul.attr["T"].type = dtype.as_datatype_enum
+    new_nodes = [kernel_node, matmul]
+    if bias is not None:
+        bias_node = _const_node(output_name + "/folded_bias", bias, dtype=dtype)
+        bias_add = node_def_pb2.NodeDef(name=output_name, op="BiasAdd", input=[matmul_name, bias_node.name])
+        bias_add.attr["T"].type = dtype.as_datatype_enum
+        new_nodes += [bias_node, bias_add]
+    return new_nodes
+
+
+def fold_linear_layers(graph_def, output_nodes, fold_bottlenecks=False):
+    """Fold linear layers into one where possible, once all weights are constants.
+
+    Two kinds of folding are done:
+    - Parallel linear layers of the same input whose outputs are only stacked along axis 1 (like the hypotheses of
+      the MHP layer) are replaced by one layer computing all outputs, reshaped to the stacked shape.
+    - Consecutive linear layers x W1 + b1 -> (.) W2 + b2, optionally with a multiplication by a scalar s in between
+      and without activation (like the PCA bottleneck of the Region Ensemble network and the layer following it),
+      are replaced by x (s W1 W2) + (s b1 W2 + b2) if the output of the first is used by the second only.
+
+    Args:
+      graph_def (GraphDef): The graph, with all weights being constants.
+      output_nodes: Names of the nodes computing the outputs of the graph. They are never folded away, and nodes
+        not needed for computing them are removed.
+      fold_bottlenecks (bool): If False, consecutive layers are not folded if the folded layer needs more
+        multiply-adds than the two layers together, which is the case if the first reduces dimensionality.
+
+    Returns:
+      A copy of graph_def with the layers folded.
+    """
+    graph_def = graph_util.extract_sub_graph(graph_def, list(output_nodes))
+    nodes = {node.name: node for node in graph_def.node}
+
+    def replace(old_name, new_nodes):
+        for node in new_nodes:
+            nodes[node.name] = node
+        new_graph_def = _copy_graph_def([n for n in graph_def.node if n.name != old_name] + new_nodes,
+                                        graph_def.library)
+        return graph_util.extract_sub_graph(new_graph_def, list(output_nodes))
+
+    # parallel layers stacked along axis 1
+    consumers = _consumers(graph_def)
+    for node in list(graph_def.node):
+        if node.op != "Pack" or node.attr["axis"].i != 1 or len(node.input) < 2:
+            continue
+        layers = [_dense_layer(nodes, consumers, i) for i in node.input]
+        if any(layer is None for layer in layers) or len({layer[0] for layer in layers}) != 1 or \
+                len({layer[1].shape for layer in layers}) != 1 or \
+                any((layer[2] is None) != (layers[0][2] is None) for layer in layers) or \
+                any(len(consumers[_node_name(i)]) != 1 or _node_name(i) in output_nodes for i in node.input):
+            continue
+        dtype = tf.as_dtype(node.attr["T"].type)
+        kernel = np.concatenate([layer[1] for layer in layers], axis=1)
+        bias = None if layers[0][2] is None else np.concatenate([layer[2] for layer in layers])
+        merged_name = node.name + "/folded_parallel"
+        shape = _const_node(node.name + "/folded_shape", [-1, len(layers), layers[0][1].shape[1]], dtype=tf.int32)
+        reshape = node_def_pb2.NodeDef(name=node.name, op="Reshape", input=[merged_name, shape.name])
+        reshape.attr["T"].type = dtype.as_datatype_enum
+        reshape.attr["Tshape"].type = tf.int32.as_datatype_enum
+        graph_def = replace(node.name, _dense_layer_nodes(merged_name, layers[0][0], kernel, bias, dtype) +
+                            [shape, reshape])
+        consumers = _consumers(graph_def)
+
+    # consecutive layers, folded repeatedly until no more layers can be folded
+    folded = True
+    while folded:
+        folded = False
+        for node in graph_def.node:
+            second = _dense_layer(nodes, consumers, node.name)
+            if second is None:
+                continue
+            # only match complete layers, i.e. starting at the bias addition if there is one
+            if node.op == "MatMul" and len(consumers[node.name]) == 1:
+                layer = _dense_layer(nodes, consumers, consumers[node.name][0].name)
+                if layer is not None and layer[3].name == node.name:
+                    continue
+            scale, between = 1., second[0]
+            scaling = _scaling(nodes, consumers, between)
+            if scaling is not None:
+                between, scale = scaling
+            if len(consumers[_node_name(between)]) != 1 or _port(between) != 0 or \
+                    {_node_name(between), _node_name(second[0])} & set(output_nodes):
+                continue
+            first = _dense_layer(nodes, consumers, between)
+            if first is None:
+                continue
+            (input_name, w1, b1, _, _), (_, w2, b2, _, _) = first, second
+            if not fold_bottlenecks and w1.shape[0] * w2.shape[1] > w1.size + w2.size:
+                continue
+            kernel = scale * w1.dot(w2)
+            bias = None if b1 is None and b2 is None else \
+                (0 if b1 is None else scale * b1.dot(w2)) + (0 if b2 is None else b2)
+            dtype = tf.as_dtype(second[3].attr["T"].type)
+            graph_def = replace(node.name, _dense_layer_nodes(node.name, input_name, kernel, bias, dtype))
+            consumers = _consumers(graph_def)
+            folded = True
+            break
+    return graph_def
+
+
+def fold_constants(graph_def):
+    """Replace every stateless node computed from constants only by a constant holding its value.
+
+    Returns:
+      A copy of graph_def with the nodes folded. Nodes only needed for computing folded ones are left in the graph,
+      unused.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name="")
+    constant = set()
+    changed = True
+    while changed:
+        changed = False
+        for node in graph_def.node:
+            if node.name in constant or node.op in _UNFOLDABLE_OPS and node.op != "Const":
+                continue
+            op = graph.get_operation_by_name(node.name)
+            if node.op == "Const" or (node.input and not op.op_def.is_stateful and len(op.outputs) == 1 and
+                                      all(not i.startswith("^") and _node_name(i) in constant for i in node.input)):
+                constant.add(node.name)
+                changed = True
+
+    to_fold = [node.name for node in graph_def.node if node.name in constant and node.op != "Const"]
+    if not to_fold:
+        return graph_def
+    with tf.Session(graph=graph, config=tf.ConfigProto(allow_soft_placement=True)) as sess:
+        values = sess.run([graph.get_tensor_by_name(name + ":0") for name in to_fold])
+    folded = {name: (value, graph.get_tensor_by_name(name + ":0").dtype) for name, value in zip(to_fold, values)}
+    nodes = []
+    for node in graph_def.node:
+        if node.name in folded:
+            value, dtype = folded[node.name]
+            const = _const_node(node.name, value, dtype=dtype)
+            const.device = node.device
+            node = const
+        nodes.append(node)
+    return _copy_graph_def(nodes, graph_def.library)
+
+
+def freeze_inference_graph(sess, input_tensor, output_tensor, fold_bottlenecks=FOLD_BOTTLENECKS, training_flags=()):
+    """Create a frozen, inference-only graph computing output_tensor from input_tensor.
+
+    The weights currently held by the variables of sess are folded into constants, and everything not needed for
+    computing output_tensor is removed. Training flags (see fix_training_flags) are fixed to False, removing the
+    training branches of tf.cond, identities and gradient wrappers are spliced out, and linear layers are folded
+    (see fold_linear_layers).
+    Graph LSTM timesteps placeholders (glstm.timesteps_placeholder) needed for computing output_tensor are kept.
+
+    Args:
+      sess (Session): The session holding the weights, its graph being the training graph.
+      input_tensor (Tensor): The network input.
+      output_tensor (Tensor): The network output.
+      fold_bottlenecks (bool): Passed to fold_linear_layers.
+      training_flags: The boolean placeholders fixed to False besides the Keras learning phase, e.g. is_training.
+
+    Returns:
+      The GraphDef of the inference graph, with input and output tensors having the same names as in the training
+      graph.
+    """
+    protected = [input_tensor.op.name, output_tensor.op.name]
+    graph_def = graph_util.convert_variables_to_constants(sess, sess.graph.as_graph_def(), [output_tensor.op.name])
+    graph_def, _ = fix_training_flags(graph_def, [flag.name for flag in training_flags])
+    graph_def = prune_constant_branches(graph_def)
+    graph_def = splice_pass_through_nodes(graph_def, protected_nodes=protected)
+    graph_def = fold_constants(graph_def)
+    graph_def = fold_linear_layers(graph_def, [output_tensor.op.name], fold_bottlenecks=fold_bottlenecks)
+    if input_tensor.op.name not in {node.name for node in graph_def.node}:
+        raise ValueError("The output tensor %s does not depend on the input tensor %s"
+                         % (output_tensor.name, input_tensor.name))
+    return graph_def
+
+
+def save_inference_graph(filename, graph_def, input_tensor_name, output_tensor_name, timesteps_tensor_names=()):
+    """Store an inference graph as meta graph, with its input and output tensors in INFERENCE_COLLECTION.
+
+    Args:
+      filename (str): The path of the meta graph file.
+      graph_def (GraphDef): The inference graph, as returned by freeze_inference_graph.
+      input_tensor_name (str): The name of the input tensor.
+      output_tensor_name (str): The name of the output tensor.
+      timesteps_tensor_names: Names of Graph LSTM timesteps placeholders (glstm.timesteps_placeholder) of the
+        training graph. Those left in the inference graph are added to glstm.TIMESTEPS_COLLECTION.
+    """
+    node_names = {node.name for node in graph_def.node}
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name="")
+        tf.add_to_collection(INFERENCE_COLLECTION, graph.get_tensor_by_name(input_tensor_name))
+        tf.add_to_collection(INFERENCE_COLLECTION, graph.get_tensor_by_name(output_tensor_name))
+        for name in timesteps_tensor_names:
+            if _node_name(name) in node_names:
+                tf.add_to_collection(glstm.TIMESTEPS_COLLECTION, graph.get_tensor_by_name(name))
+        tf.train.export_meta_graph(filename=filename, graph=graph,
+                                   collection_list=[INFERENCE_COLLECTION, glstm.TIMESTEPS_COLLECTION])
+
+
+def load_inference_graph(filename):
+    """Import an inference graph stored by save_inference_graph into the default graph.
+
+    Returns:
+      A tuple (input_tensor, output_tensor).
+    """
+    tf.train.import_meta_graph(filename)
+    input_tensor, output_tensor = tf.get_collection(INFERENCE_COLLECTION)
+    return input_tensor, output_tensor
+
+
+def main():
+    prefix, model_name, epoch = get_prefix_model_name_optionally_epoch()
+
+    checkpoint_dir = r"/home/matthias-k/GraphLSTM_data/%s" % prefix
+    checkpoint_dir += r"/%s" % model_name
+
+    config = tf.ConfigProto(allow_soft_placement=True)
+    config.gpu_options.allow_growth = True
+    sess = tf.Session(config=config)
+
+    print("\n###   Exporting Model: %s   ###\n" % model_name)
+
+    with sess.as_default():
+        print("Loading meta graph …")
+        loader = tf.train.import_meta_graph(checkpoint_dir + "/%s.meta" % model_name)
+        if epoch is None:
+            print("Restoring weights for last epoch …")
+            checkpoint_path = tf.train.latest_checkpoint(checkpoint_dir)
+        else:
+            print("Restoring weights for epoch %i …" % epoch)
+            checkpoint_path = checkpoint_dir + "/%s-%i" % (model_name, epoch)
+        loader.restore(sess, checkpoint_path)
+        collection = tf.get_collection(COLLECTION)
+        input_tensor, output_tensor = collection[:2]
+        # MHP models store their is_training placeholder last (see validate.py)
+        training_flags = collection[6:7]
+
+        print("Freezing inference graph …")
+        training_node_count = len(sess.graph.as_graph_def().node)
+        graph_def = freeze_inference_graph(sess, input_tensor, output_tensor, training_flags=training_flags)
+
+    filename = inference_graph_path(checkpoint_path)
+    save_inference_graph(filename, graph_def, input_tensor.name, output_tensor.name,
+                         [t.name for t in tf.get_collection(glstm.TIMESTEPS_COLLECTION)])
+    print("Stored inference graph (%i of %i training graph nodes) at %s." % (len(graph_def.node), training_node_count,
+                                                                           filename))
+    print("For validation, run: python validate.py %s %s%s" % (prefix, model_name,
+                                                               "" if epoch is None else " %i" % epoch))
+
+
+if __name__ == "__main__":
+    main()
@@ -23,18 +23,34 @@ It also implements the operator needed for the cell's internal calculations.
 Constructing multi-layer networks is supported by calling the network several times.
 """
 import networkx as nx
+import numpy as np
+
+from collections import namedtuple
+from functools import partial
+from types import MappingProxyType
 
 from tensorflow.python.ops.rnn_cell_impl import LSTMStateTuple, RNNCell
+from tensorflow.python import pywrap_tensorflow
+from tensorflow.python.client import session
 from tensorflow.python.framework import ops
+from tensorflow.python.framework import tensor_shape
+from tensorflow.python.framework import tensor_util
 from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import control_flow_ops
+from tensorflow.python.ops import custom_gradient
+from tensorflow.python.ops import gradients_impl
 from tensorflow.python.ops import init_ops
 from tensorflow.python.ops import math_ops
 from tensorflow.python.ops import nn_ops
+from tensorflow.python.ops import state_ops
+from tensorflow.python.ops import tensor_array_ops
 from tensorflow.python.ops import variable_scope as vs
+from tensorflow.python.ops import variables
 from tensorflow.python.platform import tf_logging as logging
+from tensorflow.python.training import saver as saver_lib
 from tensorflow.python.util import nest
 from tensorflow.python.ops.rnn import dynamic_rnn
-from tensorflow import Tensor, float32
+from tensorflow import Tensor, float32, int32
 
 
 # identifiers for node attributes
@@ -86,21 +102,77 @@ _BIASES = {
     _B_C,
     _B_O}
 
+# packed weight names: the weights of all gates acting on the same operand, concatenated along the output axis
+_W_UFCO = "W_ufco"
+_U_UFCO = "U_ufco"
+_U_UCON = "U_ucon"
+_B_UFCO = "b_ufco"
+
+# packed weight -> per-gate weights it is made of, in the order they are concatenated
+# U_fn is applied to every neighbour's hidden state separately and thus cannot be packed with U_un, U_cn and U_on
+_PACKED_WEIGHTS = {
+    _W_UFCO: (_W_U, _W_F, _W_C, _W_O),
+    _U_UFCO: (_U_U, _U_F, _U_C, _U_O),
+    _U_UCON: (_U_UN, _U_CN, _U_ON),
+    _U_FN: (_U_FN,),
+    _B_UFCO: (_B_U, _B_F, _B_C, _B_O)}
+
 # templates for which weights should be shared between cells
 NONE_SHARED = set()
 ALL_SHARED = {*_WEIGHTS, *_UEIGHTS, *_NEIGHBOUR_UEIGHTS, *_BIASES}
 NEIGHBOUR_CONNECTIONS_SHARED = {*_NEIGHBOUR_UEIGHTS}
 
+# collection holding the runtime timesteps tensors created by timesteps_placeholder
+TIMESTEPS_COLLECTION = "graph_lstm_timesteps"
+
+# update schedules, i.e. the ways in which GraphLSTMNet can process its nodes
+# SEQUENTIAL_SCHEDULE: each node is processed by its own cell call, in order of decreasing confidence
+# LEVEL_SCHEDULE: nodes are grouped into waves of nodes not depending on each other, each wave being processed
+#   in one vectorised step. Results are identical to SEQUENTIAL_SCHEDULE.
+# SYNCHRONOUS_SCHEDULE: all nodes are processed in one vectorised step, each node seeing the states of its
+#   neighbours from the previous timestep only (Jacobi instead of Gauss-Seidel iteration, as in Eq. 2 of the
+#   Graph LSTM paper). Results differ from SEQUENTIAL_SCHEDULE, but variables are the same.
+# COLOURING_SCHEDULE: the graph is coloured such that no two neighbours share a colour, and each colour class is
+#   processed in one vectorised step, in order of decreasing mean confidence. Each node sees the states of its
+#   neighbours of earlier colour classes from the same timestep, and of later ones from the previous timestep.
+#   This needs far fewer steps than LEVEL_SCHEDULE on sparse graphs (e.g. 3 to 4 instead of up to 21 on the hand
+#   graph). Results differ from SEQUENTIAL_SCHEDULE, but variables are the same.
+SEQUENTIAL_SCHEDULE = "sequential"
+LEVEL_SCHEDULE = "level"
+SYNCHRONOUS_SCHEDULE = "synchronous"
+COLOURING_SCHEDULE = "colouring"
+
+_SCHEDULES = {SEQUENTIAL_SCHEDULE, LEVEL_SCHEDULE, SYNCHRONOUS_SCHEDULE, COLOURING_SCHEDULE}
+
+# name scopes of the gate computations, in GraphLSTMCell.call as well as in the vectorised update: input gate,
+# adaptive forget gates (one per neighbour), forget gate, output gate and memory gate (see Eq. 2 of the paper)
+GATE_SCOPES = ("g_u", "g_fij", "g_fi", "g_o", "g_c")
+
+# execution plan of a GraphLSTMNet, compiled once from its nxgraph by GraphLSTMNet.compile_plan
+#   node_order: node names in order of decreasing confidence
+#   index: node name -> _INDEX
+#   neighbours: node name -> tuple of the _INDEX values of its neighbours
+#   waves: tuple of _Waves for vectorised schedules, None for SEQUENTIAL_SCHEDULE
+#   confidence: tuple of the confidence values in _INDEX order if at least one of them is a Tensor (and the update
+#     order thus differs per sample), None otherwise
+_ExecutionPlan = namedtuple("_ExecutionPlan", ["nxgraph", "node_order", "index", "neighbours", "waves",
+                                               "confidence"])
+# nodes updated in one vectorised step: their names and _INDEX values, the padded _INDEX values of their neighbours,
+# and the number of actual neighbours per node (None if all nodes have the same, non-zero number of neighbours)
+_Wave = namedtuple("_Wave", ["nodes", "index", "neighbour_index", "neighbour_count"])
+
 
 def graph_lstm(inputs, nxgraph, num_units=None, state_is_tuple=True, shared_weights=ALL_SHARED, name=None,
                timesteps=1, dtype=float32,
-               normalize=False, residual_connection=False):
+               normalize=False, residual_connection=False, update_schedule=SEQUENTIAL_SCHEDULE,
+               cell_class=None, constant_input=False, stacked_weights=False, final_output_only=False,
+               packed_state=False, recompute_activations=False, activation_recorder=None):
     """Functional interface for a Graph LSTM Network.
     Returns the last time step of the output state.
 
     Args:
       inputs: Tensor input.
-      nxgraph: A networkx.Graph OR something a networkx.Graph can be built from.
+      nxgraph: A networkx.Graph, a GraphSpec, OR something a networkx.Graph can be built from.
       num_units (int): Required if building the nxgraph inside the GraphLSTMNet.
       state_is_tuple: If True, accepted and returned states are n-tuples, where
         `n = len(cells)`.  If False, the states are all
@@ -110,12 +182,41 @@ def graph_lstm(inputs, nxgraph, num_units=None, state_is_tuple=True, shared_weig
         Default: ALL_SHARED.
       name (string): The Tensorflow name of the Graph LSTM network. Must be given
         if more than one is used.
-      timesteps (int): Number of timesteps to be simulated. Default: 1.
+      timesteps: Number of timesteps to be simulated, an int or a scalar int32 Tensor,
+        e.g. as returned by timesteps_placeholder, which allows choosing the number of
+        timesteps at runtime without rebuilding the graph. Default: 1.
       dtype: dtype used for Tensorflow calculations. Default: tf.float32
       normalize: If True, automatically scales input into [-0.5,0.5] range
         (and back afterwards). Default: False.
       residual_connection: If True, a residual connection is added around the
         GraphLSTMNet. Default: False.
+      update_schedule: The way the GraphLSTMNet processes its nodes, one of
+        SEQUENTIAL_SCHEDULE, LEVEL_SCHEDULE, SYNCHRONOUS_SCHEDULE and COLOURING_SCHEDULE.
+        Default: SEQUENTIAL_SCHEDULE.
+      cell_class: The class of the cells if building the nxgraph inside the
+        GraphLSTMNet, e.g. PackedGraphLSTMCell. Default: GraphLSTMCell.
+      constant_input: If True, the input is passed to the GraphLSTMNet once
+        instead of being copied for every timestep, and for vectorised update
+        schedules its projections are computed only once (see
+        GraphLSTMNet.run_with_constant_input). Results and variables are the
+        same either way. Default: False.
+      stacked_weights: If True, the weights not shared between all cells are
+        stored as one variable per packed weight, stacked along a leading node
+        axis (see GraphLSTMNet). Requires a vectorised update schedule.
+        Default: False.
+      final_output_only: If True, only the output of the last timestep is kept
+        while running the GraphLSTMNet, instead of collecting the outputs of all
+        timesteps and discarding all but the last one. Implies constant_input.
+        Default: False.
+      packed_state: If True, the GraphLSTMNet keeps its state and output in one
+        tensor each instead of one tensor per node (see GraphLSTMNet). Results and
+        variables are the same either way. Default: False.
+      recompute_activations: If True, gate activations are recomputed in the
+        backward pass instead of being kept for it, trading time for memory when
+        training (see GraphLSTMNet). Requires a vectorised update schedule.
+        Default: False.
+      activation_recorder: (optional) A graph_lstm_recorder.GateActivationRecorder
+        sampling the gate activations of all nodes (see GraphLSTMNet). Default: None.
 
     Returns:
       The Graph LSTM output Tensor shaped [batch size, num_nodes, num_units].
@@ -128,7 +229,10 @@ def graph_lstm(inputs, nxgraph, num_units=None, state_is_tuple=True, shared_weig
     # build Graph LSTM Net
 
     graph_lstm_net = GraphLSTMNet(nxgraph, num_units=num_units, state_is_tuple=state_is_tuple,
-                                  shared_weights=shared_weights, name=name)
+                                  shared_weights=shared_weights, name=name, update_schedule=update_schedule,
+                                  cell_class=cell_class, stacked_weights=stacked_weights,
+                                  packed_state=packed_state, recompute_activations=recompute_activations,
+                                  activation_recorder=activation_recorder)
 
     # prepare input
 
@@ -140,23 +244,33 @@ def graph_lstm(inputs, nxgraph, num_units=None, state_is_tuple=True, shared_weig
     # normalize input
     if normalize:
         inputs, undo_scaling = normalize_for_graph_lstm(inputs)
-    # input dimensions of GraphLSTMNet: batch_size, max_time, number_of_nodes, input_size
-    # add time dimension
-    graphlstm_input_tensor = graph_lstm_net.reshape_input_for_dynamic_rnn(inputs,
-                                                                          timesteps=timesteps)
-
-    # wrap call to Graph LSTM into tf.dynamic_rnn
-
-    dynrnn_glstm_output_full, dynrnn_glstm_state = dynamic_rnn(graph_lstm_net,
-                                                               inputs=graphlstm_input_tensor,
-                                                               dtype=dtype)
+    if final_output_only:
+        # run Graph LSTM on the same input for every timestep, keeping only the output of the last timestep
+        output, _ = graph_lstm_net.run_with_constant_input(inputs, timesteps, dtype=dtype, final_output_only=True)
+    elif constant_input:
+        # run Graph LSTM on the same input for every timestep
+        dynrnn_glstm_output_full, dynrnn_glstm_state = graph_lstm_net.run_with_constant_input(inputs, timesteps,
+                                                                                              dtype=dtype)
+    else:
+        # input dimensions of GraphLSTMNet: batch_size, max_time, number_of_nodes, input_size
+        # add time dimension
+        graphlstm_input_tensor = graph_lstm_net.reshape_input_for_dynamic_rnn(inputs,
+                                                                              timesteps=timesteps)
+
+        # wrap call to Graph LSTM into tf.dynamic_rnn
+
+        dynrnn_glstm_output_full, dynrnn_glstm_state = dynamic_rnn(graph_lstm_net,
+                                                                   inputs=graphlstm_input_tensor,
+                                                                   dtype=dtype)
 
     # extract output
 
-    # reorder dimensions to [batch_size, max_time, number_of_nodes, output_size]
-    glstm_output_full = graph_lstm_net.transpose_output_from_cells_first_to_batch_first(dynrnn_glstm_output_full)
-    # extract last timestep from output
-    output = array_ops.unstack(glstm_output_full, axis=1)[-1]
+    if not final_output_only:
+        # reorder dimensions to [batch_size, max_time, number_of_nodes, output_size]
+        glstm_output_full = dynrnn_glstm_output_full if packed_state else \
+            graph_lstm_net.transpose_output_from_cells_first_to_batch_first(dynrnn_glstm_output_full)
+        # extract last timestep from output (the number of timesteps may only be known at runtime)
+        output = glstm_output_full[:, -1]
     # denormalize GraphLSTM output
     if normalize:
         output = undo_scaling(output)
@@ -167,6 +281,31 @@ def graph_lstm(inputs, nxgraph, num_units=None, state_is_tuple=True, shared_weig
     return output
 
 
+def timesteps_placeholder(default=1, name="graph_lstm_timesteps"):
+    """Create a scalar int32 placeholder for the number of timesteps, falling back to default if not fed.
+
+    Passing it as timesteps to graph_lstm (or GraphLSTMNet.reshape_input_for_dynamic_rnn and
+    GraphLSTMNet.run_with_constant_input) allows running one graph for any number of timesteps.
+    The placeholder is added to the collection TIMESTEPS_COLLECTION, so it can be retrieved
+    after importing a meta graph.
+
+    Example:
+        timesteps = timesteps_placeholder(2)
+        output = graph_lstm(inputs, nxgraph, timesteps=timesteps)
+        sess.run(output, feed_dict={timesteps: 4})
+
+    Args:
+      default (int): The number of timesteps if the placeholder is not fed. Default: 1.
+      name (str): The name of the placeholder. Default: "graph_lstm_timesteps".
+
+    Returns:
+      A scalar int32 Tensor.
+    """
+    timesteps = array_ops.placeholder_with_default(ops.convert_to_tensor(default, dtype=int32), [], name=name)
+    ops.add_to_collection(TIMESTEPS_COLLECTION, timesteps)
+    return timesteps
+
+
 def normalize_for_graph_lstm(tensor):
     """Normalizes Tensor to range [-0.5, 0.5].
 
@@ -261,6 +400,7 @@ class GraphLSTMCell(RNNCell):
         self._bias_initializer = bias_initializer
         self._weight_initializer = weight_initializer
         self._forget_bias_initializer = forget_bias_initializer
+        self._record_gates = None
 
     @property
     def state_size(self):
@@ -298,6 +438,30 @@ class GraphLSTMCell(RNNCell):
             return tuple([self.output_size])
         raise NotImplementedError("Inferring shape for non-standard Graph LSTM cell weights is not supported")
 
+    def _get_initializers(self, dtype):
+        """Return the bias, weight and forget bias initializers, falling back to the defaults if not given."""
+        bias_initializer = init_ops.random_uniform_initializer(-0.1, 0.1, dtype=dtype) \
+            if self._bias_initializer is None else self._bias_initializer
+        weight_initializer = init_ops.random_uniform_initializer(-0.1, 0.1, dtype=dtype) \
+            if self._weight_initializer is None else self._weight_initializer
+        forget_bias_initializer = init_ops.constant_initializer(1.0, dtype=dtype) \
+            if self._forget_bias_initializer is None else self._forget_bias_initializer
+        return bias_initializer, weight_initializer, forget_bias_initializer
+
+    @property
+    def has_elementwise_initializers(self):
+        """If the cell uses the default initializers, which initialize every entry independently and
+        can thus initialize the weights of many nodes at once."""
+        return self._bias_initializer is None and self._weight_initializer is None and \
+            self._forget_bias_initializer is None
+
+    def _get_packed_initializer(self, packed_name, dtype):
+        """Return the initializer of a packed weight, initializing each part like the corresponding per-gate weight."""
+        bias_initializer, weight_initializer, forget_bias_initializer = self._get_initializers(dtype)
+        return _packed_initializer([forget_bias_initializer if weight_name == _B_F else
+                                    bias_initializer if weight_name in _BIASES else weight_initializer
+                                    for weight_name in _PACKED_WEIGHTS[packed_name]])
+
     def _init_weights(self, inputs):
         """Initialize the weights.
 
@@ -309,12 +473,7 @@ class GraphLSTMCell(RNNCell):
           A dict of weight name:tensorflow-weight pairs.
         """
         dtype = inputs.dtype
-        bias_initializer = init_ops.random_uniform_initializer(-0.1, 0.1, dtype=dtype) \
-            if self._bias_initializer is None else self._bias_initializer
-        weight_initializer = init_ops.random_uniform_initializer(-0.1, 0.1, dtype=dtype) \
-            if self._weight_initializer is None else self._weight_initializer
-        forget_bias_initializer = init_ops.constant_initializer(1.0, dtype=dtype) \
-            if self._forget_bias_initializer is None else self._forget_bias_initializer
+        bias_initializer, weight_initializer, forget_bias_initializer = self._get_initializers(dtype)
 
         weight_dict = {}
 
@@ -366,7 +525,56 @@ class GraphLSTMCell(RNNCell):
 
         return weight_dict
 
-    def __call__(self, inputs, state, neighbour_states, shared_scope, shared_weights, *args, **kwargs):
+    def _get_or_init_weights(self, inputs):
+        """Return the weights of the cell, resolving them via `_init_weights` only on first use.
+
+        The resolved weight handles are cached per graph, variable scope, shared scope, set of shared
+        weights, dtype and input size, so calling the cell again (e.g. from another network build in the
+        same graph) does not look up all variables again.
+
+        Args:
+          inputs: `2-D` tensor with shape `[batch_size x input_size]`,
+            the input to the cell. Needed for calculating weight shapes.
+
+        Returns:
+          A dict of weight name:tensorflow-weight pairs.
+        """
+        cache_key = (ops.get_default_graph(), vs.get_variable_scope().name,
+                     getattr(self._shared_scope, "name", self._shared_scope), frozenset(self._shared_weights),
+                     inputs.dtype.base_dtype, inputs.get_shape()[-1].value)
+        weight_cache = getattr(self, "_weight_cache", None)
+        if weight_cache is None or weight_cache[0] != cache_key:
+            weight_cache = (cache_key, self._init_weights(inputs))
+            self._weight_cache = weight_cache
+        return weight_cache[1]
+
+    def get_weights(self, inputs, shared_scope, shared_weights):
+        """Create or fetch the weights of the cell without running it.
+
+        This is used by GraphLSTMNet when processing several cells in one
+        vectorised step. The weights are created in the same variable scopes
+        as when calling the cell, so checkpoints can be used interchangeably.
+
+        Args:
+          inputs: `2-D` tensor with shape `[batch_size x input_size]`,
+            the input to the cell. Needed for calculating weight shapes.
+          shared_scope: The tensorflow scope in which the shared variables reside.
+          shared_weights: The list of names of shared variables.
+
+        Returns:
+          A dict of weight name:tensorflow-weight pairs.
+        """
+        self._shared_scope = shared_scope
+        self._shared_weights = shared_weights
+        # enter the scope that the layer machinery would enter when calling the cell
+        self._set_scope(None)
+        with vs.variable_scope(self._scope, reuse=vs.AUTO_REUSE, auxiliary_name_scope=False):
+            weight_dict = self._get_or_init_weights(inputs)
+        self.built = True
+        return weight_dict
+
+    def __call__(self, inputs, state, neighbour_states, shared_scope, shared_weights, *args, record_gates=None,
+                 **kwargs):
         """Store neighbour_states and shared properties as cell variable and call superclass.
 
         `__call__` is the function called by tensorflow's `dynamic_rnn`.
@@ -385,6 +593,8 @@ class GraphLSTMCell(RNNCell):
           shared_scope: The tensorflow scope in which the shared variables reside.
           shared_weights: The list of names of shared variables.
           *args: additional positional arguments to be passed to `self.call`.
+          record_gates: (optional) A function recording the gate activations of this node, see
+            _with_recorded_gates. Default: None (no recording).
           **kwargs: additional keyword arguments to be passed to `self.call`.
             **Note**: kwarg `scope` is reserved for use by the layer.
 
@@ -396,6 +606,7 @@ class GraphLSTMCell(RNNCell):
         self._neighbour_states = neighbour_states
         self._shared_scope = shared_scope
         self._shared_weights = shared_weights
+        self._record_gates = record_gates
         return super(GraphLSTMCell, self).__call__(inputs, state, *args, **kwargs)
 
     def call(self, inputs, state):
@@ -417,7 +628,7 @@ class GraphLSTMCell(RNNCell):
         tanh = math_ops.tanh
 
         # initialize cell weights
-        weight_dict = self._init_weights(inputs)
+        weight_dict = self._get_or_init_weights(inputs)
 
         # Parameters of gates are concatenated into one multiply for efficiency.
         if self._state_is_tuple:
@@ -469,22 +680,27 @@ class GraphLSTMCell(RNNCell):
         b_c = weight_dict[_B_C]
         b_o = weight_dict[_B_O]
 
-        # Eq. 2
+        # Eq. 2 (each gate in its own name scope, see GATE_SCOPES)
         # input gate
         # g_u = sigmoid ( f_{i,t+1} * W_u + h_{i,t} * U_u + h^-_{i,t} * U_{un} + b_u )
-        g_u = sigmoid(_graphlstm_linear([w_u, u_u, u_un, b_u], [inputs, h_i, h_j_avg]))
+        with ops.name_scope("g_u"):
+            g_u = sigmoid(_graphlstm_linear([w_u, u_u, u_un, b_u], [inputs, h_i, h_j_avg]))
         # adaptive forget gate
         # g_fij = sigmoid ( f_{i,t+1} * W_f + h_{j,t} * U_fn + b_f ) for every neighbour j
-        g_fij = [sigmoid(_graphlstm_linear([w_f, u_fn, b_f], [inputs, h_j])) for h_j in h_j_all]
+        with ops.name_scope("g_fij"):
+            g_fij = [sigmoid(_graphlstm_linear([w_f, u_fn, b_f], [inputs, h_j])) for h_j in h_j_all]
         # forget gate
         # g_fi = sigmoid ( f_{i,t+1} * W_f + h_{i,t} * U_f + b_f )
-        g_fi = sigmoid(_graphlstm_linear([w_f, u_f, b_f], [inputs, h_i]))
+        with ops.name_scope("g_fi"):
+            g_fi = sigmoid(_graphlstm_linear([w_f, u_f, b_f], [inputs, h_i]))
         # output gate
         # g_o = sigmoid ( f_{i,t+1} * W_o + h_{i,t} * U_o + h^-_{i,t} * U_{on} + b_o )
-        g_o = sigmoid(_graphlstm_linear([w_o, u_o, u_on, b_o], [inputs, h_i, h_j_avg]))
+        with ops.name_scope("g_o"):
+            g_o = sigmoid(_graphlstm_linear([w_o, u_o, u_on, b_o], [inputs, h_i, h_j_avg]))
         # memory gate
         # g_c = tanh ( f_{i,t+1} * W_c + h_{i,t} * U_c + h^-_{i,t} * U_{cn} + b_c )
-        g_c = tanh(_graphlstm_linear([w_c, u_c, u_cn, b_c], [inputs, h_i, h_j_avg]))
+        with ops.name_scope("g_c"):
+            g_c = tanh(_graphlstm_linear([w_c, u_c, u_cn, b_c], [inputs, h_i, h_j_avg]))
 
         # new memory states
         # m_i_new = sum ( g_fij .* most recent state of each neighbouring node ) / number of neighbouring nodes ...
@@ -494,6 +710,10 @@ class GraphLSTMCell(RNNCell):
         # new hidden states
         # h_i_new = tanh ( g_o .* m_i_new )
         h_i_new = tanh(g_o * m_i_new)
+        if self._record_gates is not None:
+            # record a stack of this one node
+            h_i_new = _with_recorded_gates(self._record_gates, h_i_new, [
+                array_ops.expand_dims(g, 0) for g in (g_u, math_ops.reduce_mean(g_fij, axis=0), g_fi, g_o, g_c)])
 
         # Eq. 3 (return values)
         if self._state_is_tuple:
@@ -503,6 +723,443 @@ class GraphLSTMCell(RNNCell):
         return h_i_new, new_state
 
 
+class PackedGraphLSTMCell(GraphLSTMCell):
+    """Graph LSTM cell keeping the weights of all gates in packed variables.
+
+    Instead of one variable per gate and operand, the weights of all gates acting
+    on the same operand live in one variable, concatenated along the output axis
+    as defined by _PACKED_WEIGHTS (e.g. W_ufco = [W_u, W_f, W_c, W_o]).
+    All gates are thus computed by one matrix multiplication per operand,
+    and the adaptive forget gates of all neighbours by one multiplication with U_fn.
+    Results are identical to those of GraphLSTMCell.
+
+    As packed variables can only be shared as a whole, shared_weights must
+    contain either all or none of the weights making up a packed variable.
+    Checkpoints of GraphLSTMCell networks can be loaded via
+    `restore_from_per_gate_checkpoint`.
+    """
+
+    def __init__(self, num_units, state_is_tuple=True, bias_initializer=None, weight_initializer=None,
+                 forget_bias_initializer=None, reuse=None, name=None):
+        """Initialize the packed Graph LSTM cell.
+
+        Args:
+          See GraphLSTMCell. Each part of a packed variable is initialized
+            by the initializer of the corresponding per-gate variable.
+        """
+        # default to the scope name of GraphLSTMCell, so variable names only differ in their last part
+        super(PackedGraphLSTMCell, self).__init__(num_units, state_is_tuple=state_is_tuple,
+                                                  bias_initializer=bias_initializer,
+                                                  weight_initializer=weight_initializer,
+                                                  forget_bias_initializer=forget_bias_initializer,
+                                                  reuse=reuse, name="graph_lstm_cell" if name is None else name)
+
+    def _get_weight_shape(self, weight, inputs):
+        """Calculate the shape of a packed Graph LSTM weight.
+
+        The shape of a packed weight is the shape of its per-gate parts,
+        with the output axis multiplied by the number of parts.
+
+        Args:
+          weight: The name of the packed weight.
+          inputs: `2-D` tensor with shape `[batch_size x input_size]`,
+            the input to the cell.
+
+        Returns:
+          A tuple the shape of the weight.
+
+        Raises:
+          NotImplementedError: If a non-standard weight name is encountered.
+        """
+        if weight not in _PACKED_WEIGHTS:
+            raise NotImplementedError("Inferring shape for non-standard packed Graph LSTM cell weights is not "
+                                      "supported")
+        weight_names = _PACKED_WEIGHTS[weight]
+        part_shape = super(PackedGraphLSTMCell, self)._get_weight_shape(weight_names[0], inputs)
+        return tuple(part_shape[:-1]) + (part_shape[-1] * len(weight_names),)
+
+    def _shared_packed_weights(self):
+        """Return the names of the packed weights that are shared, as determined by self._shared_weights.
+
+        Raises:
+          ValueError: If only some of the weights making up a packed weight are shared.
+        """
+        return _shared_packed_weights(self._shared_weights, type(self).__name__)
+
+    def _init_weights(self, inputs):
+        """Initialize the packed weights.
+
+        Args:
+          inputs: `2-D` tensor with shape `[batch_size x input_size]`,
+            the input to the cell. Needed for calculating weight shapes.
+
+        Returns:
+          A dict of packed weight name:tensorflow-weight pairs.
+        """
+        dtype = inputs.dtype
+        shared_packed_weights = self._shared_packed_weights()
+        weight_dict = {}
+
+        def get_packed_variable(packed_name):
+            return vs.get_variable(
+                name=packed_name, shape=self._get_weight_shape(packed_name, inputs),
+                dtype=dtype,
+                initializer=self._get_packed_initializer(packed_name, dtype))
+
+        # initialize shared weights
+        with vs.variable_scope(self._shared_scope) as scope:
+            for packed_name in shared_packed_weights:
+                if packed_name == _B_UFCO:
+                    with vs.variable_scope(scope) as bias_scope:
+                        bias_scope.set_partitioner(None)
+                        weight_dict[packed_name] = get_packed_variable(packed_name)
+                else:
+                    weight_dict[packed_name] = get_packed_variable(packed_name)
+
+        # initialize local weights
+        for packed_name in _PACKED_WEIGHTS:
+            if packed_name not in shared_packed_weights:
+                weight_dict[packed_name] = get_packed_variable(packed_name)
+
+        return weight_dict
+
+    @staticmethod
+    def _update(input_terms, m_i, h_i, m_j, h_j, weights, record_gates=None):
+        """Update a stack of nodes, see _graphlstm_update."""
+        return _graphlstm_update(input_terms, m_i, h_i, m_j, h_j, weights, record_gates=record_gates)
+
+    def call(self, inputs, state):
+        """Run one step of the packed GraphLSTM cell.
+
+        Args:
+          inputs: `2-D` tensor with shape `[batch_size x input_size]`.
+          state: An `LSTMStateTuple` of state tensors, each shaped
+            `[batch_size x self.state_size]`, if `state_is_tuple` has been set to
+            `True`.  Otherwise, a `Tensor` shaped
+            `[batch_size x 2 * self.state_size]`.
+
+        Returns:
+          A tuple, containing the new hidden state and the new state (either a
+            `LSTMStateTuple` or a concatenated state, depending on
+            `state_is_tuple`).
+        """
+        # initialize cell weights
+        weight_dict = self._get_or_init_weights(inputs)
+
+        if self._state_is_tuple:
+            m_i, h_i = state
+        else:
+            m_i, h_i = array_ops.split(value=state, num_or_size_splits=2, axis=1)
+
+        if not hasattr(self, "_neighbour_states"):
+            raise LookupError("Could not find variable 'self._neighbour_states' during 'PackedGraphLSTMCell.call'.\n"
+                              "This likely means 'call' was called directly, instead of through '__call__' (which "
+                              "should be the case when called from inside the tensorflow framework).")
+        # extract two vectors of n ms and n hs from state vector of n (m,h) tuples
+        if self._state_is_tuple:
+            m_j_all, h_j_all = zip(*self._neighbour_states)
+        else:
+            m_j_all, h_j_all = zip(*[array_ops.split(value=s, num_or_size_splits=2, axis=1)
+                                     for s in self._neighbour_states])
+
+        # run the vectorised update on a stack of this one node
+        packed_weights = _pack_weights([weight_dict])
+        input_terms = _graphlstm_input_terms(array_ops.expand_dims(inputs, 0), packed_weights)
+        m_i_new, h_i_new = self._update(input_terms,
+                                        array_ops.expand_dims(m_i, 0),
+                                        array_ops.expand_dims(h_i, 0),
+                                        array_ops.expand_dims(array_ops.stack(m_j_all), 0),
+                                        array_ops.expand_dims(array_ops.stack(h_j_all), 0),
+                                        packed_weights, record_gates=self._record_gates)
+        m_i_new = m_i_new[0]
+        h_i_new = h_i_new[0]
+
+        # Eq. 3 (return values)
+        if self._state_is_tuple:
+            new_state = LSTMStateTuple(m_i_new, h_i_new)
+        else:
+            new_state = array_ops.concat([m_i_new, h_i_new], 1)
+        return h_i_new, new_state
+
+
+class FusedGraphLSTMCell(PackedGraphLSTMCell):
+    """Packed Graph LSTM cell with an explicitly calculated gradient.
+
+    Instead of differentiating each of the operations of a Graph LSTM update,
+    the gradient of the whole update is calculated from its gate activations
+    (see _fused_graphlstm_update), which yields a much smaller gradient graph
+    and keeps fewer intermediate tensors for the backward pass.
+    Variables and results are identical to those of PackedGraphLSTMCell.
+    Networks made of FusedGraphLSTMCells use the explicit gradient for
+    vectorised update schedules as well.
+    """
+
+    @staticmethod
+    def _update(input_terms, m_i, h_i, m_j, h_j, weights, record_gates=None):
+        """Update a stack of nodes, see _fused_graphlstm_update."""
+        return _fused_graphlstm_update(input_terms, m_i, h_i, m_j, h_j, weights, record_gates=record_gates)
+
+
+class GraphSpec(object):
+    """Array-based GraphLSTMNet graph, an alternative to a networkx graph for big or many graphs.
+
+    The neighbours of the nodes are given in compressed sparse row (CSR) format: the neighbours of the node at
+    position p are the nodes at the positions neighbour_indices[neighbour_offsets[p]:neighbour_offsets[p + 1]].
+    Like the _INDEX and _CONFIDENCE node attributes of a networkx graph, index[p] and confidence[p] hold the
+    index and confidence value of the node at position p. The graph is validated by vectorised checks when it
+    is created, and all nodes get cells of the same class and number of units, created on first use. Networks
+    with vectorised update schedules and stacked weights thus do not create one cell per node at all.
+    """
+
+    def __init__(self, neighbour_offsets, neighbour_indices, num_units, index=None, confidence=None,
+                 node_names=None, cell_class=None, allow_selfloops=False, **graphlstmcell_kwargs):
+        """Create and validate a GraphSpec.
+
+        Args:
+          neighbour_offsets: An int array [number_of_nodes + 1], starting at 0 and ending at
+            the number of neighbour entries.
+          neighbour_indices: An int array holding the positions of the neighbours of all nodes, node after node.
+            Every edge must be listed in both directions, and only once per direction.
+          num_units (int): The number of units of the cells.
+          index: (optional) An int array [number_of_nodes] holding the _INDEX of each node, a permutation of
+            0 ... number_of_nodes - 1. Default: the positions.
+          confidence: (optional) A float array [number_of_nodes] holding the confidence value of each node.
+            Only static confidence values are supported. Default: 0 for all nodes.
+          node_names: (optional) The names of the nodes, determining the scopes of per-cell weights.
+            Default: the positions.
+          cell_class: The class of the cells, e.g. PackedGraphLSTMCell. Default: GraphLSTMCell.
+          allow_selfloops (bool): If the graph may contain selfloops (default: False).
+          **graphlstmcell_kwargs: optional keyword arguments that will get passed
+            to the cell constructor.
+
+        Raises:
+          TypeError: If num_units is not an int.
+          ValueError: If the arrays do not describe a valid undirected graph of at least one node,
+            or num_units is not positive.
+        """
+        offsets = np.asarray(neighbour_offsets, dtype=np.int64)
+        indices = np.asarray(neighbour_indices, dtype=np.int64).reshape([-1])
+        if offsets.ndim != 1 or len(offsets) < 2:
+            raise ValueError("neighbour_offsets must be a vector of number of nodes + 1 entries for at least one node, "
+                             "but found shape %r." % (offsets.shape,))
+        num_nodes = len(offsets) - 1
+        if offsets[0] != 0 or offsets[-1] != len(indices) or np.any(np.diff(offsets) < 0):
+            raise ValueError("neighbour_offsets must increase monotonically from 0 to the number of neighbour "
+                             "entries (%i), but found %r." % (len(indices), offsets))
+        if len(indices) and (indices.min() < 0 or indices.max() >= num_nodes):
+            raise ValueError("neighbour_indices must be positions in [0, %i), but found values in [%i, %i]."
+                             % (num_nodes, indices.min(), indices.max()))
+        rows = np.repeat(np.arange(num_nodes), np.diff(offsets))
+        if not allow_selfloops and np.any(rows == indices):
+            raise ValueError("The graph has %i selfloops. If this is expected, consider creating the GraphSpec with "
+                             "allow_selfloops=True.\nPositions of nodes with selfloops: %r"
+                             % (np.sum(rows == indices), sorted(set(rows[rows == indices]))))
+        keys = np.sort(rows * num_nodes + indices)
+        if np.any(keys[1:] == keys[:-1]):
+            raise ValueError("neighbour_indices must list every neighbour of a node only once.")
+        if not np.array_equal(keys, np.sort(indices * num_nodes + rows)):
+            raise ValueError("The graph must be undirected, i.e. every edge must be listed in both directions.")
+        index = np.arange(num_nodes) if index is None else np.asarray(index)
+        if index.shape != (num_nodes,) or not np.issubdtype(index.dtype, np.integer) or \
+                not np.array_equal(np.sort(index), np.arange(num_nodes)):
+            raise ValueError("index must contain the indices ranging from 0 to number of nodes - 1 (%i), but saw\n%r"
+                             % (num_nodes - 1, index))
+        confidence = np.zeros(num_nodes) if confidence is None else np.asarray(confidence, dtype=np.float64)
+        if confidence.shape != (num_nodes,):
+            raise ValueError("confidence must hold one value per node (%i), but found shape %r."
+                             % (num_nodes, confidence.shape))
+        node_names = tuple(range(num_nodes)) if node_names is None else tuple(node_names)
+        if len(node_names) != num_nodes or len(set(node_names)) != num_nodes:
+            raise ValueError("node_names must hold %i distinct names, but found %i names of which %i are distinct."
+                             % (num_nodes, len(node_names), len(set(node_names))))
+        if not isinstance(num_units, int):
+            raise TypeError("num_units must be of type 'int', but found '%s': %s" % (type(num_units), num_units))
+        if num_units < 1:
+            raise ValueError("num_units must be a positive integer, but found: %i" % num_units)
+
+        for array in (offsets, indices, index, confidence):
+            array.setflags(write=False)
+        self.neighbour_offsets = offsets
+        self.neighbour_indices = indices
+        self.index = index.astype(np.int64)
+        self.index.setflags(write=False)
+        self.confidence = confidence
+        self.node_names = node_names
+        self.num_units = num_units
+        self.cell_class = GraphLSTMCell if cell_class is None else cell_class
+        self._graphlstmcell_kwargs = graphlstmcell_kwargs
+        self._positions = None
+        self._cells = {}
+        self._prototype_cell = None
+
+    @classmethod
+    def from_edges(cls, edges, num_units, confidence_dict=None, index_dict=None, is_sorted=False, **kwargs):
+        """Create a GraphSpec from a list of edges between named nodes, e.g. HAND_GRAPH_HANDS2017.
+
+        Nodes are positioned in order of first appearance, the way a networkx.Graph built from the
+        edges would list them. Edges listed twice (in either direction) are only counted once.
+
+        Args:
+          edges: A list of pairs of node names.
+          num_units (int): The number of units of the cells.
+          confidence_dict (dict): (optional) The confidence values of the nodes, as for
+            GraphLSTMNet.create_nxgraph. Nodes not listed get a confidence of 0.
+          index_dict (dict): (optional) The indices of all nodes, as for GraphLSTMNet.create_nxgraph.
+          is_sorted (bool): If True, the indices are assigned in order of the positions. If False,
+            they correspond to the order given by sorted() (default). Ignored if index_dict is given.
+          **kwargs: Passed to the GraphSpec constructor.
+
+        Raises:
+          KeyError: If confidence_dict or index_dict holds a node not contained in edges.
+          TypeError, ValueError: If the GraphSpec cannot be constructed.
+        """
+        node_names = tuple(dict.fromkeys(n for edge in edges for n in edge))
+        position = {node_name: p for p, node_name in enumerate(node_names)}
+        edge_array = np.asarray([(position[n_i], position[n_j]) for n_i, n_j in edges], dtype=np.int64)
+        return cls._from_edge_array(node_names, edge_array.reshape([-1, 2]), num_units, confidence_dict,
+                                    index_dict, is_sorted, **kwargs)
+
+    @classmethod
+    def from_nxgraph(cls, nxgraph, num_units, confidence_dict=None, index_dict=None, is_sorted=False, **kwargs):
+        """Create a GraphSpec from a networkx.Graph.
+
+        Nodes keep the order of nxgraph, and neighbours the order networkx lists them in, so networks built
+        from both yield the same results. The _INDEX and _CONFIDENCE attributes of the nodes are used if
+        present (e.g. for graphs created by GraphLSTMNet.create_nxgraph), their cells are not.
+
+        Args:
+          nxgraph (networkx.Graph): The graph.
+          num_units (int): The number of units of the cells.
+          confidence_dict, index_dict, is_sorted: As for from_edges, overriding the node attributes if given.
+          **kwargs: Passed to the GraphSpec constructor.
+
+        Raises:
+          KeyError: If confidence_dict or index_dict holds a node not contained in nxgraph.
+          TypeError, ValueError: If the GraphSpec cannot be constructed.
+        """
+        node_names = tuple(nxgraph)
+        position = {node_name: p for p, node_name in enumerate(node_names)}
+        if confidence_dict is None:
+            confidence_dict = {n: d[_CONFIDENCE] for n, d in nxgraph.nodes(data=True) if _CONFIDENCE in d}
+        if index_dict is None and all(_INDEX in d for _, d in nxgraph.nodes(data=True)):
+            index_dict = {n: d[_INDEX] for n, d in nxgraph.nodes(data=True)}
+        neighbour_lists = [[position[n_j] for n_j in nxgraph.adj[node_name]] for node_name in node_names]
+        offsets = np.cumsum([0] + [len(neighbours) for neighbours in neighbour_lists])
+        indices = np.asarray([p for neighbours in neighbour_lists for p in neighbours], dtype=np.int64)
+        return cls._from_neighbours(node_names, offsets, indices, num_units, confidence_dict, index_dict, is_sorted,
+                                    **kwargs)
+
+    @classmethod
+    def _from_edge_array(cls, node_names, edges, num_units, confidence_dict, index_dict, is_sorted, **kwargs):
+        """Create a GraphSpec from an array [number_of_edges, 2] of node positions."""
+        num_nodes = len(node_names)
+        # both directions of each edge, in the order networkx would add them to the adjacency of each node
+        senders = edges[:, ::-1].reshape([-1])
+        receivers = edges.reshape([-1])
+        _, first = np.unique(receivers * num_nodes + senders, return_index=True)
+        first.sort()
+        senders, receivers = senders[first], receivers[first]
+        order = np.argsort(receivers, kind="mergesort")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(receivers, minlength=num_nodes))])
+        return cls._from_neighbours(node_names, offsets, senders[order], num_units, confidence_dict, index_dict,
+                                    is_sorted, **kwargs)
+
+    @classmethod
+    def _from_neighbours(cls, node_names, offsets, indices, num_units, confidence_dict, index_dict, is_sorted,
+                         **kwargs):
+        """Create a GraphSpec from CSR arrays, converting confidence_dict and index_dict into arrays."""
+        position = {node_name: p for p, node_name in enumerate(node_names)}
+        confidence = np.zeros(len(node_names))
+        for node_name, c in (confidence_dict or {}).items():
+            if isinstance(c, Tensor):
+                raise TypeError("GraphSpec only supports static confidence values, but the confidence of node "
+                                "'%s' is a Tensor." % node_name)
+            try:
+                confidence[position[node_name]] = c
+            except KeyError as e:
+                raise KeyError("Node '%s' in confidence_dict does not exist in the graph." % node_name) from e
+        if index_dict is not None:
+            if len(index_dict) != len(node_names):
+                raise ValueError("index_dict must have as many entries as the graph has nodes (%i), but found %i"
+                                 % (len(node_names), len(index_dict)))
+            index = np.zeros(len(node_names), dtype=np.int64)
+            for node_name, i in index_dict.items():
+                try:
+                    index[position[node_name]] = i
+                except KeyError as e:
+                    raise KeyError("Node '%s' in index_dict does not exist in the graph." % node_name) from e
+        elif is_sorted:
+            index = None
+        else:
+            index = np.empty(len(node_names), dtype=np.int64)
+            index[[position[n] for n in sorted(node_names)]] = np.arange(len(node_names))
+        return cls(offsets, indices, num_units, index=index, confidence=confidence, node_names=node_names, **kwargs)
+
+    def __len__(self):
+        return len(self.node_names)
+
+    def __iter__(self):
+        return iter(self.node_names)
+
+    def number_of_nodes(self):
+        return len(self.node_names)
+
+    @property
+    def prototype_cell(self):
+        """A cell configured like the cells of all nodes, for querying sizes and initializers."""
+        if self._prototype_cell is None:
+            self._prototype_cell = self.cell_class(self.num_units, name="graph_lstm_cell",
+                                                   **self._graphlstmcell_kwargs)
+        return self._prototype_cell
+
+    @property
+    def has_elementwise_initializers(self):
+        """If the cells use the default initializers, which initialize every entry independently and
+        can thus initialize the weights of all nodes at once."""
+        return not any(self._graphlstmcell_kwargs.get(k) is not None
+                       for k in ("bias_initializer", "weight_initializer", "forget_bias_initializer"))
+
+    def cell(self, node_name):
+        """Return the cell of a node, creating it on first use.
+
+        Raises:
+          KeyError: If the node does not exist.
+        """
+        if node_name not in self._cells:
+            if self._positions is None:
+                self._positions = {n: p for p, n in enumerate(self.node_names)}
+            if node_name not in self._positions:
+                raise KeyError("Node '%s' does not exist in the GraphSpec." % (node_name,))
+            self._cells[node_name] = self.cell_class(self.num_units, name="graph_lstm_cell_" + str(node_name),
+                                                     **self._graphlstmcell_kwargs)
+        return self._cells[node_name]
+
+    def levels(self):
+        """Return the wave of each node (by position) under LEVEL_SCHEDULE, see GraphLSTMNet.level_schedule."""
+        return _csr_levels(self.neighbour_offsets, self.neighbour_indices, self.node_order())
+
+    def colours(self):
+        """Return the colour class of each node (by position) under COLOURING_SCHEDULE, in the order the classes
+        are updated, see GraphLSTMNet.colouring_schedule."""
+        return _csr_colours(self.neighbour_offsets, self.neighbour_indices, self.node_order(), self.confidence)
+
+    def node_order(self):
+        """Return the positions of the nodes in order of decreasing confidence, ties broken by lower position."""
+        return np.argsort(-self.confidence, kind="mergesort")
+
+    def neighbour_index(self):
+        """Return the padded neighbour index array and the degree vector in _INDEX order,
+        see GraphLSTMNet.neighbour_index."""
+        degrees = np.diff(self.neighbour_offsets)
+        neighbour_index = np.zeros([len(self), max(degrees)], dtype=np.int32)
+        rows = np.repeat(self.index, degrees)
+        columns = np.arange(len(self.neighbour_indices)) - np.repeat(self.neighbour_offsets[:-1], degrees)
+        neighbour_index[rows, columns] = self.index[self.neighbour_indices]
+        ordered_degrees = np.empty(len(self), dtype=np.int32)
+        ordered_degrees[self.index] = degrees
+        return neighbour_index, ordered_degrees
+
+
 class GraphLSTMNet(RNNCell):
     """GraphLSTM Network composed of multiple simple cells.
 
@@ -529,20 +1186,32 @@ class GraphLSTMNet(RNNCell):
 
         Args:
           node (any): The node whose GraphLSTMCell object will be returned.
-          nxgraph (networkx.Graph): The graph from which the node will be extracted.
+          nxgraph (networkx.Graph or GraphSpec): The graph from which the node will be extracted.
             Defaults to self._nxgraph .
         """
         if nxgraph is None:
             nxgraph = self._nxgraph
-        elif not isinstance(nxgraph, nx.classes.graph.Graph):
+        elif not isinstance(nxgraph, (nx.classes.graph.Graph, GraphSpec)):
             raise TypeError(
-                "nxgraph must be a Graph of package networkx, but saw: %s." % nxgraph)
+                "nxgraph must be a Graph of package networkx or a GraphSpec, but saw: %s." % nxgraph)
 
+        if isinstance(nxgraph, GraphSpec):
+            return nxgraph.cell(node)
         return nxgraph.nodes[node][_CELL]
 
+    def _cells(self):
+        """Return the cells of all nodes, for checking their types and sizes.
+
+        The nodes of a GraphSpec all share its prototype cell here, so that their cells need not be created.
+        """
+        if isinstance(self._nxgraph, GraphSpec):
+            return [self._nxgraph.prototype_cell] * len(self._nxgraph)
+        return [self._cell(n) for n in self._nxgraph]
+
     @staticmethod
     def create_nxgraph(list_or_nxgraph, num_units=None, confidence_dict=None, index_dict=None, is_sorted=False,
-                       verify=True, ignore_cell_type=False, allow_selfloops=False, **graphlstmcell_kwargs):
+                       verify=True, ignore_cell_type=False, allow_selfloops=False, cell_class=None,
+                       **graphlstmcell_kwargs):
         """Return a GraphLSTM Network graph (composed of GraphLSTMCells).
 
         Args:
@@ -554,7 +1223,10 @@ class GraphLSTMNet(RNNCell):
           confidence_dict (dict): Holds the confidence values for the nodes that should
             start off with a confidence value different from 0. Optional.
             Format: {node_name_1: confidence_1, ...}
-            NOTE: currently, the confidence value is only read once, at network creation
+            Confidence values are either numbers or Tensors shaped [batch_size] (or scalar),
+            e.g. the negative per-joint MHP variance. The latter make GraphLSTMNet update
+            the nodes in a separate order for every sample (see GraphLSTMNet.compile_plan).
+            NOTE: the confidence values are only read once, at network creation
             time. Specifying a confidence_dict when creating the graph is thus the only
             way to determine the GraphLSTM update order.
           index_dict (dict): Holds the index values for all nodes if the indices should
@@ -570,6 +1242,8 @@ class GraphLSTMNet(RNNCell):
             (default: False).
           allow_selfloops (bool): If the verification should allow for selfloops
             in the graph (default: False).
+          cell_class: The class of the cells to be created, e.g. PackedGraphLSTMCell
+            (default: GraphLSTMCell).
           **graphlstmcell_kwargs: optional keyword arguments that will get passed
             to the GraphLSTMCell constructor.
 
@@ -589,9 +1263,6 @@ class GraphLSTMNet(RNNCell):
             if not isinstance(confidence_dict, dict):
                 raise TypeError("confidence_dict must be of type 'dict', but found '%s'." % type(confidence_dict))
             for node_name, confidence in confidence_dict.items():
-                if isinstance(confidence, Tensor):
-                    raise NotImplementedError("Support for dynamic confidence values is currently not implemented. "
-                                              "Please use python float values instead of Tensors.")
                 try:
                     nxgraph.nodes[node_name][_CONFIDENCE] = confidence if isinstance(confidence, Tensor) else float(
                         confidence)
@@ -619,6 +1290,8 @@ class GraphLSTMNet(RNNCell):
             for index, node_name in enumerate(sorted(nxgraph) if not is_sorted else nxgraph):
                 nxgraph.nodes[node_name][_INDEX] = index
         # register cells
+        if cell_class is None:
+            cell_class = GraphLSTMCell
         num_units_type_checked_flag = False
         for node_name, node_dict in nxgraph.nodes(data=True):
             if _CELL not in node_dict:
@@ -632,8 +1305,8 @@ class GraphLSTMNet(RNNCell):
                     if num_units < 1:
                         raise ValueError("num_units must be a positive integer, but found: %i" % num_units)
                     num_units_type_checked_flag = True
-                nxgraph.nodes[node_name][_CELL] = GraphLSTMCell(num_units, name="graph_lstm_cell_" + str(node_name),
-                                                                **graphlstmcell_kwargs)
+                nxgraph.nodes[node_name][_CELL] = cell_class(num_units, name="graph_lstm_cell_" + str(node_name),
+                                                             **graphlstmcell_kwargs)
         if verify and not GraphLSTMNet.is_valid_nxgraph(nxgraph, raise_errors=False, ignore_cell_type=ignore_cell_type,
                                                         allow_selfloops=allow_selfloops):
             logging.warn("Created nxgraph did not pass validity test. "
@@ -695,8 +1368,8 @@ class GraphLSTMNet(RNNCell):
                                     % node_name)
                 else:
                     index_list.append(nxgraph.nodes[node_name][_INDEX])
-                if not isinstance(nxgraph.nodes[node_name][_CONFIDENCE], float):
-                    raise TypeError("_CONFIDENCE attribute should always be float, but is not for node '%s'"
+                if not isinstance(nxgraph.nodes[node_name][_CONFIDENCE], (float, Tensor)):
+                    raise TypeError("_CONFIDENCE attribute should always be float or Tensor, but is not for node '%s'"
                                     % node_name)
             if sorted(index_list) != list(range(len(index_list))):
                 raise ValueError("The values of all _INDEX attributes have to form a well-sorted list, "
@@ -710,6 +1383,208 @@ class GraphLSTMNet(RNNCell):
         else:
             return True
 
+    @staticmethod
+    def level_schedule(nxgraph):
+        """Group the nodes of a GraphLSTMNet graph into waves of independent updates.
+
+        Nodes are visited in order of decreasing confidence, as in the sequential
+        update. Each node is placed in the wave directly after the latest wave
+        containing one of its already visited neighbours. Nodes within a wave
+        thus never neighbour each other, and processing the waves one after another,
+        each wave seeing the states produced by all previous waves, yields the same
+        result as processing the nodes one after another.
+
+        Args:
+          nxgraph (networkx.Graph): A valid GraphLSTMNet graph.
+
+        Returns:
+          A list of waves, each being a list of node names in order of decreasing confidence.
+        """
+        node_order = [node_name for node_name, _ in sorted(nxgraph.nodes(data=True),
+                                                           key=lambda x: x[1][_CONFIDENCE], reverse=True)]
+        level = {}
+        for node_name in node_order:
+            level[node_name] = 1 + max([level[n] for n in nx.all_neighbors(nxgraph, node_name) if n in level],
+                                       default=-1)
+        waves = [[] for _ in range(max(level.values()) + 1)]
+        for node_name in node_order:
+            waves[level[node_name]].append(node_name)
+        return waves
+
+    @staticmethod
+    def colouring_schedule(nxgraph):
+        """Group the nodes of a GraphLSTMNet graph into colour classes of independent updates.
+
+        Nodes are visited in order of decreasing confidence, and each node is given the
+        lowest colour none of its already visited neighbours has (greedy colouring).
+        Nodes of one colour thus never neighbour each other. The colour classes are ordered
+        by decreasing mean confidence of their nodes (ties are broken by lower colour), so
+        confident nodes are generally updated first, as in the sequential update.
+
+        Args:
+          nxgraph (networkx.Graph): A valid GraphLSTMNet graph.
+
+        Returns:
+          A list of colour classes, each being a list of node names in order of decreasing confidence.
+        """
+        node_order = [node_name for node_name, _ in sorted(nxgraph.nodes(data=True),
+                                                           key=lambda x: x[1][_CONFIDENCE], reverse=True)]
+        colour = {}
+        for node_name in node_order:
+            neighbour_colours = {colour[n] for n in nx.all_neighbors(nxgraph, node_name) if n in colour}
+            colour[node_name] = min(set(range(len(neighbour_colours) + 1)) - neighbour_colours)
+        classes = [[] for _ in range(max(colour.values()) + 1)]
+        for node_name in node_order:
+            classes[colour[node_name]].append(node_name)
+        return sorted(classes, key=lambda nodes: -np.mean([nxgraph.nodes[n][_CONFIDENCE] for n in nodes]))
+
+    @staticmethod
+    def neighbour_index(nxgraph):
+        """Convert the adjacency of a GraphLSTMNet graph into a padded neighbour index array and a degree vector.
+
+        Row i of the neighbour index array lists the _INDEX values of the neighbours of the node
+        with _INDEX i, padded with zeros to the maximum degree. The degree vector holds the number
+        of actual neighbours per row. Together, they allow gathering the states of all neighbours
+        of any set of nodes in one step.
+
+        Args:
+          nxgraph (networkx.Graph): A valid GraphLSTMNet graph.
+
+        Returns:
+          A tuple (neighbour_index, degrees) of int32 numpy arrays shaped
+            [number_of_nodes, maximum degree] and [number_of_nodes].
+        """
+        index = {node_name: node_dict[_INDEX] for node_name, node_dict in nxgraph.nodes(data=True)}
+        neighbour_lists = [[index[n_j] for n_j in nx.all_neighbors(nxgraph, node_name)]
+                           for node_name in sorted(nxgraph, key=index.get)]
+        degrees = np.asarray([len(neighbours) for neighbours in neighbour_lists], dtype=np.int32)
+        neighbour_index = np.zeros([len(neighbour_lists), max(degrees)], dtype=np.int32)
+        for i, neighbours in enumerate(neighbour_lists):
+            neighbour_index[i, :len(neighbours)] = neighbours
+        return neighbour_index, degrees
+
+    def compile_plan(self):
+        """Compile the execution plan of the network from its nxgraph.
+
+        The plan holds everything `call` needs to know about the graph: the update order,
+        the index of each node, the indices of its neighbours, and, for vectorised update
+        schedules, the waves of nodes with their index arrays. SYNCHRONOUS_SCHEDULE has a
+        single wave holding all nodes in _INDEX order.
+
+        If at least one confidence value is a Tensor, the update order is determined per sample
+        when running the network: for each sample, nodes are updated one after another in order of
+        decreasing confidence (ties are broken by lower _INDEX), each seeing the new states of the
+        neighbours updated before. All samples are processed at once, so the plan has a single wave
+        holding all nodes in _INDEX order, and node_order is _INDEX order. This requires all cells
+        to be GraphLSTMCells. SYNCHRONOUS_SCHEDULE does not depend on the update order and ignores
+        the confidence values. COLOURING_SCHEDULE needs static confidence values for ordering its
+        colour classes. The plan is compiled when the network is created and whenever a different
+        nxgraph is assigned, so `call` does not need to query networkx. Changes made to the nxgraph
+        in place (other than exchanging cells) only take effect after calling this method.
+
+        For a GraphSpec, the plan is compiled from its arrays, without going through networkx.
+
+        Raises:
+          KeyError: If a node misses the _CONFIDENCE or _INDEX attribute.
+          ValueError: If update_schedule is COLOURING_SCHEDULE, but a confidence value is a Tensor.
+        """
+        if isinstance(self._nxgraph, GraphSpec):
+            self._compile_spec_plan()
+            return
+        nxgraph = self._nxgraph
+        index = {node_name: nxgraph.nodes[node_name][_INDEX] for node_name in nxgraph}
+        confidence = None
+        if any(isinstance(nxgraph.nodes[n][_CONFIDENCE], Tensor) for n in nxgraph):
+            node_order = tuple(sorted(nxgraph, key=index.get))
+            if self._update_schedule == COLOURING_SCHEDULE:
+                raise ValueError("COLOURING_SCHEDULE requires static confidence values, but found Tensors.")
+            if self._update_schedule != SYNCHRONOUS_SCHEDULE:
+                confidence = tuple(nxgraph.nodes[n][_CONFIDENCE] for n in node_order)
+        else:
+            node_order = tuple(sorted(nxgraph, key=lambda n: nxgraph.nodes[n][_CONFIDENCE], reverse=True))
+        neighbours = {node_name: tuple(index[n_j] for n_j in nx.all_neighbors(nxgraph, node_name))
+                      for node_name in node_order}
+
+        waves = None
+        if self._update_schedule != SEQUENTIAL_SCHEDULE or confidence is not None:
+            if confidence is not None or self._update_schedule == SYNCHRONOUS_SCHEDULE:
+                wave_lists = [sorted(nxgraph, key=index.get)]
+            elif self._update_schedule == COLOURING_SCHEDULE:
+                wave_lists = self.colouring_schedule(nxgraph)
+            else:
+                wave_lists = self.level_schedule(nxgraph)
+            waves = self._compile_waves(wave_lists, index, *self.neighbour_index(nxgraph))
+
+        self._plan = _ExecutionPlan(nxgraph, node_order, MappingProxyType(index), MappingProxyType(neighbours), waves,
+                                    confidence)
+
+    def _compile_spec_plan(self):
+        """Compile the execution plan of the network from its GraphSpec, see compile_plan."""
+        spec = self._nxgraph
+        names = spec.node_names
+        index = dict(zip(names, spec.index.tolist()))
+        node_order = tuple(names[p] for p in spec.node_order())
+        neighbour_lists = np.split(spec.index[spec.neighbour_indices], spec.neighbour_offsets[1:-1])
+        neighbours = {node_name: tuple(n.tolist()) for node_name, n in zip(names, neighbour_lists)}
+
+        waves = None
+        if self._update_schedule in (LEVEL_SCHEDULE, COLOURING_SCHEDULE):
+            levels = spec.levels() if self._update_schedule == LEVEL_SCHEDULE else spec.colours()
+            wave_lists = [[] for _ in range(levels.max() + 1)]
+            for node_name, level in zip(node_order, levels[spec.node_order()].tolist()):
+                wave_lists[level].append(node_name)
+            waves = self._compile_waves(wave_lists, index, *spec.neighbour_index())
+        elif self._update_schedule == SYNCHRONOUS_SCHEDULE:
+            by_index = np.empty(len(spec), dtype=np.int64)
+            by_index[spec.index] = np.arange(len(spec))
+            waves = self._compile_waves([[names[p] for p in by_index]], index, *spec.neighbour_index())
+
+        self._plan = _ExecutionPlan(spec, node_order, MappingProxyType(index), MappingProxyType(neighbours), waves,
+                                    None)
+
+    @staticmethod
+    def _compile_waves(wave_lists, index, neighbour_index, degrees):
+        """Build the _Waves of a plan from lists of node names, the _INDEX of each node,
+        and the padded neighbour index array and degree vector (see neighbour_index)."""
+        waves = []
+        for wave_nodes in wave_lists:
+            wave_index = np.asarray([index[n] for n in wave_nodes], dtype=np.int32)
+            wave_degrees = degrees[wave_index]
+            # padding only needs to be masked if the degrees differ within the wave
+            uniform_degree = min(wave_degrees) != 0 and min(wave_degrees) == max(wave_degrees)
+            wave = _Wave(tuple(wave_nodes), wave_index, neighbour_index[wave_index, :max(wave_degrees)],
+                         None if uniform_degree else wave_degrees)
+            for array in wave[1:]:
+                if array is not None:
+                    array.setflags(write=False)
+            waves.append(wave)
+        return tuple(waves)
+
+    def parallelism(self):
+        """Report how many vectorised steps the update schedule takes per timestep.
+
+        SEQUENTIAL_SCHEDULE, as well as any schedule following confidence Tensors (see compile_plan),
+        takes one step per node.
+
+        Returns:
+          A dict holding the update_schedule, the number of nodes, the number of steps per timestep,
+          the wave_sizes (the number of nodes updated in each step), and the mean_wave_size.
+        """
+        plan = self._get_plan()
+        num_nodes = len(plan.node_order)
+        if plan.waves is None or plan.confidence is not None:
+            wave_sizes = [1] * num_nodes
+        else:
+            wave_sizes = [len(wave.nodes) for wave in plan.waves]
+        return {"update_schedule": self._update_schedule, "nodes": num_nodes, "steps": len(wave_sizes),
+                "wave_sizes": wave_sizes, "mean_wave_size": num_nodes / len(wave_sizes)}
+
+    def _get_plan(self):
+        """Return the execution plan, recompiling it if a different nxgraph has been assigned in the meantime."""
+        if self._plan.nxgraph is not self._nxgraph:
+            self.compile_plan()
+        return self._plan
+
     def reshape_input_for_dynamic_rnn(self, input_tensor, timesteps=None):
         """Reshape a time-dimension free Tensor to input shape required
         by GraphLSTMNet, optionally adding time dimension.
@@ -724,14 +1599,19 @@ class GraphLSTMNet(RNNCell):
 
         Args:
           input_tensor: The tensor to be reshaped.
-          timesteps (int): (optional) The number of timesteps to be included in the tensor. Default: None.
+          timesteps: (optional) The number of timesteps to be included in the tensor, an int or a scalar
+            int32 Tensor. Default: None.
 
         Returns:
           The reshaped input tensor [batch_size,[ timesteps,] number_of_nodes, input_size].
         """
-        shaped_tensor = array_ops.reshape(input_tensor, shape=[-1, len(self.output_size), self.output_size[0]])
-        if timesteps is not None:
+        shaped_tensor = array_ops.reshape(input_tensor, shape=[-1, self._nxgraph.number_of_nodes(),
+                                                               self._cells()[0].output_size])
+        if isinstance(timesteps, int):
             return array_ops.stack([shaped_tensor] * timesteps, axis=1)
+        if timesteps is not None:
+            return array_ops.tile(array_ops.expand_dims(shaped_tensor, 1),
+                                  array_ops.stack([1, timesteps, 1, 1]))
         return shaped_tensor
 
     @staticmethod
@@ -767,11 +1647,14 @@ class GraphLSTMNet(RNNCell):
                              % (len(output.shape), output.shape))
         return array_ops.transpose(output, perm)
 
-    def __init__(self, nxgraph, num_units=None, state_is_tuple=True, shared_weights=ALL_SHARED, name=None):
+    def __init__(self, nxgraph, num_units=None, state_is_tuple=True, shared_weights=ALL_SHARED, name=None,
+                 update_schedule=SEQUENTIAL_SCHEDULE, cell_class=None, stacked_weights=False, packed_state=False,
+                 recompute_activations=False, activation_recorder=None):
         """Create a Graph LSTM Network composed of a graph of GraphLSTMCells.
 
         Args:
-          nxgraph: A networkx.Graph OR something a networkx.Graph can be built from.
+          nxgraph: A networkx.Graph, a GraphSpec, OR something a networkx.Graph can be built from.
+            A GraphSpec brings its own cells, so num_units and cell_class are ignored for it.
           num_units (int): Required if building the nxgraph inside the GraphLSTMNet.
           state_is_tuple: If True, accepted and returned states are n-tuples, where
             `n = len(cells)`.  If False, the states are all
@@ -781,18 +1664,78 @@ class GraphLSTMNet(RNNCell):
             Default: ALL_SHARED.
           name (string): The Tensorflow name of the Graph LSTM network. Must be given
             if more than one is used.
+          update_schedule: The way the nodes are processed. SEQUENTIAL_SCHEDULE calls
+            each cell separately, LEVEL_SCHEDULE processes waves of independent nodes
+            in one vectorised step each (only supported for GraphLSTMCells).
+            Both yield the same results and use the same variables.
+            SYNCHRONOUS_SCHEDULE updates all nodes in one vectorised step from the
+            neighbour states of the previous timestep (only supported for GraphLSTMCells).
+            It uses the same variables, but yields different results.
+            COLOURING_SCHEDULE updates one colour class of independent nodes per vectorised
+            step (see colouring_schedule), which also yields different results with the same
+            variables, and requires static confidence values. See parallelism for the number
+            of steps per timestep. Default: SEQUENTIAL_SCHEDULE.
+          cell_class: The class of the cells if building the nxgraph inside the
+            GraphLSTMNet, e.g. PackedGraphLSTMCell. Default: GraphLSTMCell.
+          stacked_weights: If True, the network holds the weights instead of its cells:
+            weights shared between all cells are stored packed (see PackedGraphLSTMCell)
+            in the scope `shared_weights`, all others are stored as one variable per packed
+            weight in the scope `stacked_weights`, shaped [number_of_nodes, in, out]
+            (biases: [number_of_nodes, out]) with nodes in _INDEX order. The weights of all
+            nodes are then applied by batched matrix multiplications. Requires a vectorised
+            update_schedule, and shared_weights to share all or none of the weights making up
+            a packed weight. Checkpoints of networks with per-cell weights can be converted by
+            convert_checkpoint_to_stacked_weights. Default: False.
+          packed_state: If True, accepted and returned states are single tensors
+            [batch_size, number_of_nodes, 2, num_units], holding memory and hidden state
+            of each node in _INDEX order, and the output is a single tensor
+            [batch_size, number_of_nodes, num_units]. tf.nn.dynamic_rnn then only tracks
+            one state and one output tensor per timestep, and returns outputs shaped
+            [batch_size, max_time, number_of_nodes, num_units]. Requires all cells to have
+            LSTMStateTuple states of the same number of units, and `state_is_tuple`.
+            Default: False.
+          recompute_activations: If True, the gate activations of a timestep are not kept
+            for the backward pass, but recomputed from the timestep's states when its gradients
+            are calculated. Gradient memory then grows by the states instead of by all
+            activations of all nodes per timestep, at the cost of running each timestep's
+            forward pass twice when training. Results and variables are the same either way.
+            Requires a vectorised update_schedule. Default: False.
+          activation_recorder: (optional) A graph_lstm_recorder.GateActivationRecorder. If given,
+            the gate activations of all nodes are passed to it in every timestep, for every
+            update schedule and class of GraphLSTMCell, and written to disk in the runs it samples.
+            The activations of other cells (with the sequential update schedule) are not recorded.
+            Requires static confidence values, and cannot be combined with
+            recompute_activations or run_until_converged. Default: None.
 
         Raises:
           ValueError: If nxgraph is not valid, or at least one of the cells
-            returns a state tuple but the flag `state_is_tuple` is `False`.
+            returns a state tuple but the flag `state_is_tuple` is `False`,
+            or if update_schedule is unknown or does not support stacked_weights
+            or recompute_activations, or if packed_state is set but `state_is_tuple` is not,
+            or if update_schedule is COLOURING_SCHEDULE but a confidence value is a Tensor,
+            or if activation_recorder is given with recompute_activations or confidence Tensors.
         """
         super(GraphLSTMNet, self).__init__(name=name)
+        if update_schedule not in _SCHEDULES:
+            raise ValueError("Unknown update_schedule '%s', expected one of %s."
+                             % (update_schedule, sorted(_SCHEDULES)))
+        if packed_state and not state_is_tuple:
+            raise ValueError("packed_state requires the cells' states to be tuples, but state_is_tuple is not set.")
+        if stacked_weights and update_schedule == SEQUENTIAL_SCHEDULE:
+            raise ValueError("stacked_weights requires a vectorised update_schedule, but found '%s'."
+                             % update_schedule)
+        if recompute_activations and update_schedule == SEQUENTIAL_SCHEDULE:
+            raise ValueError("recompute_activations requires a vectorised update_schedule, but found '%s'."
+                             % update_schedule)
+        if recompute_activations and activation_recorder is not None:
+            raise ValueError("activation_recorder cannot be used with recompute_activations, which runs the "
+                             "forward pass twice.")
         if not nxgraph:
             raise ValueError("Must specify nxgraph for GraphLSTMNet.")
-        # check if nxgraph is a valid GraphLSTM graph, create one if not
-        if not self.is_valid_nxgraph(nxgraph, raise_errors=False):
+        # check if nxgraph is a valid GraphLSTM graph, create one if not (GraphSpecs are validated on creation)
+        if not isinstance(nxgraph, GraphSpec) and not self.is_valid_nxgraph(nxgraph, raise_errors=False):
             try:
-                nxgraph = self.create_nxgraph(nxgraph, num_units, verify=False)
+                nxgraph = self.create_nxgraph(nxgraph, num_units, verify=False, cell_class=cell_class)
             except ValueError as e:
                 if "Must specify num_units" in str(e):
                     raise ValueError("Must specify num_units when building nxgraph inside GraphLSTMNet.init.") from None
@@ -807,42 +1750,52 @@ class GraphLSTMNet(RNNCell):
         self._nxgraph = nxgraph
         self._state_is_tuple = state_is_tuple
         self._shared_weights = shared_weights
+        self._update_schedule = update_schedule
+        self._stacked_weights = stacked_weights
+        self._packed_state = packed_state
+        self._recompute_activations = recompute_activations
+        self._activation_recorder = activation_recorder
+        self.compile_plan()
+        if activation_recorder is not None and self._plan.confidence is not None:
+            raise ValueError("activation_recorder requires static confidence values, but found Tensors.")
         if not state_is_tuple:
-            if any(nest.is_sequence(self._cell(n).state_size) for n in self._nxgraph):
+            if any(nest.is_sequence(cell.state_size) for cell in self._cells()):
                 raise ValueError("Some cells return tuples of states, but the flag "
                                  "state_is_tuple is not set.  State sizes are: %s"
-                                 % str([self._cell(n).state_size for n in self._nxgraph]))
+                                 % str([cell.state_size for cell in self._cells()]))
 
     @property
     def state_size(self):
+        if self._packed_state:
+            return tensor_shape.TensorShape([self._nxgraph.number_of_nodes(), 2, self._num_units_for_packed_state()])
         if self._state_is_tuple:
-            return tuple(self._cell(n).state_size for n in self._nxgraph)
+            return tuple(cell.state_size for cell in self._cells())
         else:
-            return sum([self._cell(n).state_size for n in self._nxgraph])
+            return sum([cell.state_size for cell in self._cells()])
 
     @property
     def output_size(self):
-        return tuple(self._cell(n).output_size for n in self._nxgraph)
+        if self._packed_state:
+            return tensor_shape.TensorShape([self._nxgraph.number_of_nodes(), self._num_units_for_packed_state()])
+        return tuple(cell.output_size for cell in self._cells())
 
     def zero_state(self, batch_size, dtype):
         with ops.name_scope(type(self).__name__ + "ZeroState", values=[batch_size]):
+            if self._packed_state:
+                return array_ops.zeros(array_ops.stack([batch_size, *self.state_size.as_list()]), dtype=dtype)
             if self._state_is_tuple:
-                return tuple(self._cell(n).zero_state(batch_size, dtype) for n in self._nxgraph)
+                return tuple(cell.zero_state(batch_size, dtype) for cell in self._cells())
             else:
                 # We know here that state_size of each cell is not a tuple and
                 # presumably does not contain TensorArrays or anything else fancy
                 return super(GraphLSTMNet, self).zero_state(batch_size, dtype)
 
-    def call(self, inputs, state):
-        """Run this Graph LSTM on inputs, starting from state.
+    def _check_inputs(self, inputs):
+        """Check if input dimensions match expectation, i.e. [batch_size, number_of_nodes, inputs_size].
 
-        Args:
-          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
-            The index of each node in this tensor must correspond to the node attribute 'index'.
-          state: A tuple or tensor of states for each node.
+        Raises:
+          ValueError: If they don't.
         """
-
-        # check if input dimensions match expectation
         if len(inputs.shape) != 3:
             raise ValueError("Input shape mismatch: expected tensor of 3 dimensions "
                              "(batch_size, cell_count, input_size), but saw %i: "
@@ -851,12 +1804,42 @@ class GraphLSTMNet(RNNCell):
             raise ValueError("Number of nodes in GraphLSTMNet input (%d) does not match number of graph nodes (%d)" %
                              (inputs.shape[-2], self._nxgraph.number_of_nodes()))
 
+    def call(self, inputs, state):
+        """Run this Graph LSTM on inputs, starting from state.
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
+            The index of each node in this tensor must correspond to the node attribute 'index'.
+          state: A tuple or tensor of states for each node.
+        """
+
+        self._check_inputs(inputs)
+
+        plan = self._get_plan()
+        if plan.waves is not None:
+            return self._call_vectorised(inputs, state, plan)
+        if self._packed_state:
+            # unpack once, run the cells on tuple states, and pack again
+            graph_output, new_states = self._call_sequential(inputs, self._packed_to_tuple_state(state), plan)
+            return array_ops.stack(graph_output, axis=1), self._tuple_to_packed_state(new_states)
+        return self._call_sequential(inputs, state, plan)
+
+    def _call_sequential(self, inputs, state, plan):
+        """Run this Graph LSTM on inputs, calling the cells one by one in the order of the plan.
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
+          state: A tuple or concatenated tensor of states for each node.
+          plan: The execution plan.
+
+        Returns:
+          The output tuple and new state in the format of `state`.
+        """
         new_states = [None] * self._nxgraph.number_of_nodes()
         graph_output = [None] * self._nxgraph.number_of_nodes()
 
         # iterate over cells in graph, starting with highest confidence value
-        for it, (node_name, node_obj) in enumerate(sorted(self._nxgraph.nodes(data=True),
-                                                          key=lambda x: x[1][_CONFIDENCE], reverse=True)):
+        for it, node_name in enumerate(plan.node_order):
 
             # initialize scope for weights shared between all cells
             with vs.variable_scope("shared_weights", reuse=True if it > 0 else None) as shared_scope:
@@ -864,9 +1847,9 @@ class GraphLSTMNet(RNNCell):
 
             with vs.variable_scope("node_%s" % node_name):
                 # extract GraphLSTMCell object from graph node
-                cell = node_obj[_CELL]
+                cell = self._cell(node_name)
                 # extract node index for state vector addressing
-                i = node_obj[_INDEX]
+                i = plan.index[node_name]
                 # extract state of current cell
                 if self._state_is_tuple:
                     if not nest.is_sequence(state):
@@ -881,8 +1864,7 @@ class GraphLSTMNet(RNNCell):
 
                 # extract and collect states of neighbouring cells
                 neighbour_states_array = []
-                for neighbour_name in nx.all_neighbors(self._nxgraph, node_name):
-                    n_i = self._nxgraph.node[neighbour_name][_INDEX]
+                for n_i in plan.neighbours[node_name]:
                     # use updated state if node has been visited
                     # TODO: think about giving old _and_ new states to node for 100% paper fidelity
                     if new_states[n_i] is not None:
@@ -899,8 +1881,11 @@ class GraphLSTMNet(RNNCell):
                 # extract input of current cell from input tuple
                 cur_inp = inputs[:, i]
                 # run current cell
+                # only GraphLSTMCells record their gates, other cells do not take record_gates
+                record_kwargs = {} if self._activation_recorder is None or not isinstance(cell, GraphLSTMCell) else \
+                    {"record_gates": partial(self._activation_recorder.record, [i])}
                 cur_output, new_state = cell(cur_inp, cur_state, neighbour_states,
-                                             shared_scope, self._shared_weights)
+                                             shared_scope, self._shared_weights, **record_kwargs)
                 # store cell output and state in graph vector
                 graph_output[i] = cur_output
                 new_states[i] = new_state
@@ -912,6 +1897,930 @@ class GraphLSTMNet(RNNCell):
 
         return graph_output, new_states
 
+    def _call_vectorised(self, inputs, state, plan):
+        """Run this Graph LSTM on inputs, processing each wave of nodes in one vectorised step.
+
+        The states of all nodes are packed into tensors of shape [number_of_nodes, batch_size, num_units].
+        For each wave, inputs, states and neighbour states of its nodes are gathered from these tensors,
+        all gates of all nodes of the wave are computed at once, and the new states are written back.
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
+          state: A tuple or tensor of states for each node.
+          plan: The execution plan holding the waves. The nodes of a wave are updated simultaneously,
+            each seeing the states of its neighbours as left by the previous waves.
+
+        Returns:
+          The output and new state, in the same format as returned by `call`.
+
+        Raises:
+          TypeError: If not all cells are GraphLSTMCells.
+          ValueError: If the cells differ in their number of units.
+        """
+        m, h = self._pack_state(state)
+        x = array_ops.transpose(inputs, [1, 0, 2])
+        node_weights, wave_weights = self._get_weights(x[0], plan)
+        m, h = self._timestep(m, h, plan, wave_weights,
+                              self._wave_input_terms(x, plan, wave_weights, node_weights),
+                              self._dynamic_update_order(plan, array_ops.shape(inputs)[0]))
+        return self._unpack_state(m, h)
+
+    def _num_units_for_vectorised_update(self):
+        """Check if all cells support the vectorised update and return their common number of units.
+
+        Raises:
+          TypeError: If not all cells are GraphLSTMCells.
+          ValueError: If the cells differ in their number of units.
+        """
+        cells = self._cells()
+        for node_name, cell in zip(self._nxgraph, cells):
+            if not isinstance(cell, GraphLSTMCell):
+                raise TypeError("Update schedule '%s' requires all cells to be GraphLSTMCells, but cell of node '%s' "
+                                "is of type %s." % (self._update_schedule, node_name, type(cell)))
+        num_units_set = {cell.output_size for cell in cells}
+        if len(num_units_set) != 1:
+            raise ValueError("Update schedule '%s' requires all cells to have the same number of units, but found %r."
+                             % (self._update_schedule, sorted(num_units_set)))
+        return num_units_set.pop()
+
+    def _num_units_for_packed_state(self):
+        """Check if all cells support the packed state and return their common number of units.
+
+        Raises:
+          ValueError: If the cells differ in their number of units or do not have LSTMStateTuple states.
+        """
+        cells = self._cells()
+        num_units_set = {cell.output_size for cell in cells}
+        state_size_set = {cell.state_size for cell in cells}
+        if len(num_units_set) != 1 or len(state_size_set) != 1 or \
+                tuple(state_size_set.pop()) != (next(iter(num_units_set)),) * 2:
+            raise ValueError("packed_state requires all cells to have LSTMStateTuple states of the same number of "
+                             "units, but found output sizes %r and state sizes %r."
+                             % ([cell.output_size for cell in cells], [cell.state_size for cell in cells]))
+        return num_units_set.pop()
+
+    def _packed_to_tuple_state(self, state):
+        """Convert a packed state [batch_size, number_of_nodes, 2, num_units] to a tuple of LSTMStateTuples."""
+        num_nodes = self._nxgraph.number_of_nodes()
+        m, h = array_ops.unstack(state, num=2, axis=2)
+        return tuple(LSTMStateTuple(m_i, h_i) for m_i, h_i in zip(array_ops.unstack(m, num=num_nodes, axis=1),
+                                                                   array_ops.unstack(h, num=num_nodes, axis=1)))
+
+    @staticmethod
+    def _tuple_to_packed_state(state):
+        """Convert a tuple of LSTMStateTuples to a packed state [batch_size, number_of_nodes, 2, num_units]."""
+        return array_ops.stack([array_ops.stack([s[0] for s in state], axis=1),
+                                array_ops.stack([s[1] for s in state], axis=1)], axis=2)
+
+    def _pack_state(self, state):
+        """Pack a state as accepted by `call` into memory and hidden state tensors of shape
+        [number_of_nodes, batch_size, num_units]."""
+        num_nodes = self._nxgraph.number_of_nodes()
+        num_units = self._num_units_for_vectorised_update()
+        if self._packed_state:
+            m, h = array_ops.unstack(array_ops.transpose(state, [2, 1, 0, 3]), num=2)
+        elif self._state_is_tuple:
+            if not nest.is_sequence(state):
+                raise ValueError(
+                    "Expected state to be a tuple of length %d, but received: %s" %
+                    (len(self.state_size), state))
+            m = array_ops.stack([s[0] for s in state])
+            h = array_ops.stack([s[1] for s in state])
+        else:
+            m, h = array_ops.unstack(array_ops.transpose(array_ops.reshape(state, [-1, num_nodes, 2, num_units]),
+                                                         [2, 1, 0, 3]))
+        return m, h
+
+    def _unpack_state(self, m, h):
+        """Unpack memory and hidden state tensors of shape [number_of_nodes, batch_size, num_units]
+        into the output and state format returned by `call`."""
+        num_nodes = self._nxgraph.number_of_nodes()
+        if self._packed_state:
+            return array_ops.transpose(h, [1, 0, 2]), array_ops.transpose(array_ops.stack([m, h]), [2, 1, 0, 3])
+        graph_output = tuple(array_ops.unstack(h, num=num_nodes))
+        if self._state_is_tuple:
+            new_states = tuple(LSTMStateTuple(m_i, h_i) for m_i, h_i in zip(array_ops.unstack(m, num=num_nodes),
+                                                                             graph_output))
+        else:
+            new_states = array_ops.reshape(array_ops.transpose(array_ops.stack([m, h]), [2, 1, 0, 3]),
+                                           [-1, num_nodes * 2 * h.get_shape()[-1].value])
+        return graph_output, new_states
+
+    def _get_weights(self, weight_shape_input, plan):
+        """Create or fetch the weights of all cells and pack them per wave.
+
+        Per-cell weights are created in the same order and scopes as the sequential update does,
+        so that the weights shared between all cells are initialized by the cell with the highest confidence.
+
+        Args:
+          weight_shape_input: A tensor of dimensions [batch_size, inputs_size], needed for calculating weight shapes.
+          plan: The execution plan holding the waves.
+
+        Returns:
+          A pair (node_weights, wave_weights). node_weights holds the packed weights of all nodes in _INDEX order
+          if the network holds stacked weights, and is None otherwise. wave_weights is a list holding the packed
+          weights (see _pack_weights) of each wave.
+        """
+        if self._stacked_weights:
+            node_weights = self._get_stacked_weights(weight_shape_input, plan)
+            # the input terms are calculated from node_weights, so the waves only need the weights acting on states
+            shared_packed_weights = self._shared_packed_weights
+            return node_weights, [{name: w if name in shared_packed_weights else
+                                   _gather_wave(w, wave, len(plan.node_order))
+                                   for name, w in node_weights.items() if name not in (_W_UFCO, _B_UFCO)}
+                                  for wave in plan.waves]
+
+        weight_dicts = {}
+        for it, node_name in enumerate(plan.node_order):
+            with vs.variable_scope("shared_weights", reuse=True if it > 0 else None) as shared_scope:
+                pass
+            with vs.variable_scope("node_%s" % node_name):
+                weight_dicts[node_name] = self._cell(node_name).get_weights(weight_shape_input, shared_scope,
+                                                                            self._shared_weights)
+        return None, [_pack_weights([weight_dicts[n] for n in wave.nodes]) for wave in plan.waves]
+
+    @property
+    def _shared_packed_weights(self):
+        return _shared_packed_weights(self._shared_weights, type(self).__name__)
+
+    def _get_stacked_weights(self, weight_shape_input, plan):
+        """Create or fetch the packed weights of all nodes, stacked along a leading node axis unless shared.
+
+        Each node's slice is initialized like the corresponding packed weight of its cell,
+        weights shared between all cells are initialized by the cell with the highest confidence.
+
+        Args:
+          weight_shape_input: A tensor of dimensions [batch_size, inputs_size], needed for calculating weight shapes.
+          plan: The execution plan.
+
+        Returns:
+          A dict of packed weight name:tensorflow-weight pairs, shaped as described in _pack_weights.
+        """
+        num_units = self._num_units_for_vectorised_update()
+        dtype = weight_shape_input.dtype
+        shared_packed_weights = self._shared_packed_weights
+        if isinstance(self._nxgraph, GraphSpec):
+            # all cells are configured alike, so the prototype cell stands in for them
+            cells = self._cells()
+            first_cell = self._nxgraph.prototype_cell
+        else:
+            cells = [self._cell(n) for n in sorted(plan.node_order, key=plan.index.get)]
+            first_cell = self._cell(plan.node_order[0])
+        shapes = {_W_UFCO: [weight_shape_input.get_shape()[-1].value, 4 * num_units],
+                  _U_UFCO: [num_units, 4 * num_units],
+                  _U_UCON: [num_units, 3 * num_units],
+                  _U_FN: [num_units, num_units],
+                  _B_UFCO: [4 * num_units]}
+
+        weight_dict = {}
+        for packed_name in _PACKED_WEIGHTS:
+            with vs.variable_scope("shared_weights" if packed_name in shared_packed_weights else "stacked_weights") \
+                    as scope:
+                if packed_name == _B_UFCO or packed_name not in shared_packed_weights:
+                    scope.set_partitioner(None)
+                if packed_name in shared_packed_weights:
+                    weight_dict[packed_name] = vs.get_variable(
+                        name=packed_name, shape=shapes[packed_name], dtype=dtype,
+                        initializer=first_cell._get_packed_initializer(packed_name, dtype))
+                elif isinstance(self._nxgraph, GraphSpec) and self._nxgraph.has_elementwise_initializers:
+                    # the default initializers initialize all nodes at once, instead of stacking one slice per node
+                    weight_dict[packed_name] = vs.get_variable(
+                        name=packed_name, shape=[len(cells)] + shapes[packed_name], dtype=dtype,
+                        initializer=first_cell._get_packed_initializer(packed_name, dtype))
+                else:
+                    weight_dict[packed_name] = vs.get_variable(
+                        name=packed_name, shape=[len(cells)] + shapes[packed_name], dtype=dtype,
+                        initializer=_stacked_initializer([cell._get_packed_initializer(packed_name, dtype)
+                                                          for cell in cells]))
+        return weight_dict
+
+    @staticmethod
+    def _wave_input_terms(x, plan, wave_weights, node_weights=None):
+        """Calculate the input terms f_{i,t+1} * W + b of all gates of the nodes of each wave.
+
+        Args:
+          x: The inputs of all nodes, shaped [number_of_nodes, batch_size, inputs_size].
+          plan: The execution plan holding the waves.
+          wave_weights: The packed weights of each wave, as returned by _get_weights.
+          node_weights: (optional) The packed weights of all nodes, as returned by _get_weights.
+            If given, the input terms of all nodes are calculated at once and then split into waves.
+
+        Returns:
+          A list holding the input terms of each wave, shaped [nodes in wave, batch_size, 4 * num_units].
+        """
+        with ops.name_scope("input_terms"):
+            if node_weights is not None:
+                input_terms = _graphlstm_input_terms(x, node_weights)
+                return [_gather_wave(input_terms, wave, len(plan.node_order)) for wave in plan.waves]
+            return [_graphlstm_input_terms(_gather_wave(x, wave, len(plan.node_order)), weights)
+                    for wave, weights in zip(plan.waves, wave_weights)]
+
+    @staticmethod
+    def _dynamic_update_order(plan, batch_size):
+        """Determine the update order of each sample from the confidence Tensors of the plan, and the row indices
+        _dynamic_step needs for processing the samples in that order.
+
+        The states of all samples are addressed as rows of a tensor [batch_size * number_of_nodes, ...],
+        row b * number_of_nodes + i holding node i of sample b. All indices only depend on the update order,
+        and are thus calculated once, outside of the time loop if possible.
+
+        Args:
+          plan: The execution plan.
+          batch_size: The batch size, a scalar int32 Tensor.
+
+        Returns:
+          None if the plan has static confidence values. Otherwise, a tuple of int32 Tensors holding for
+          each step k of the update:
+            the nodes updated in step k, i.e. the k-th node of each sample's update order, shaped
+              [number_of_nodes, batch_size],
+            the rows of these nodes, shaped [number_of_nodes, batch_size],
+            the rows of their neighbours, shaped [number_of_nodes, batch_size, maximum degree].
+        """
+        if plan.confidence is None:
+            return None
+        num_nodes = len(plan.confidence)
+        with ops.name_scope("update_order"):
+            confidence = array_ops.stack([array_ops.broadcast_to(math_ops.cast(c, float32), [batch_size])
+                                          for c in plan.confidence], axis=1)
+            # top_k puts the lower index first among equal values
+            node = array_ops.transpose(nn_ops.top_k(confidence, k=num_nodes, sorted=True).indices)
+            sample_offset = math_ops.range(batch_size) * num_nodes
+            row = sample_offset + node
+            neighbour_row = array_ops.reshape(sample_offset, [1, -1, 1]) + array_ops.gather(
+                plan.waves[0].neighbour_index, node)
+            return node, row, neighbour_row
+
+    def _update_function(self):
+        """Return the function updating a stack of nodes: _fused_graphlstm_update if all cells are
+        FusedGraphLSTMCells, _graphlstm_update otherwise."""
+        if all(isinstance(cell, FusedGraphLSTMCell) for cell in self._cells()):
+            return _fused_graphlstm_update
+        return _graphlstm_update
+
+    def _timestep(self, m, h, plan, wave_weights, wave_input_terms, update_order=None):
+        """Run _vectorised_step, recomputing its activations in the backward pass if recompute_activations is set.
+
+        Arguments and return values are the same as for _vectorised_step.
+        """
+        update = self._update_function()
+        if not self._recompute_activations:
+            return self._vectorised_step(m, h, plan, wave_weights, wave_input_terms, update_order, update,
+                                         self._activation_recorder)
+        return _recompute_in_backward_pass(
+            lambda m, h, wave_weights, wave_input_terms: self._vectorised_step(m, h, plan, wave_weights,
+                                                                               wave_input_terms, update_order, update),
+            m, h, wave_weights, wave_input_terms)
+
+    @staticmethod
+    def _vectorised_step(m, h, plan, wave_weights, wave_input_terms, update_order=None, update=None,
+                         activation_recorder=None):
+        """Update the packed memory and hidden states of all nodes once, wave by wave.
+
+        Args:
+          m: The memory states of all nodes, shaped [number_of_nodes, batch_size, num_units].
+          h: The hidden states of all nodes, shaped [number_of_nodes, batch_size, num_units].
+          plan: The execution plan holding the waves.
+          wave_weights: The packed weights of each wave, as returned by _get_weights.
+          wave_input_terms: The input terms of each wave, as returned by _wave_input_terms.
+          update_order: The update order and row indices as returned by _dynamic_update_order,
+            required if the plan has dynamic confidence values.
+          update: The function updating a stack of nodes, _graphlstm_update (default) or _fused_graphlstm_update.
+          activation_recorder: (optional) The recorder of the gate activations of each wave, see
+            graph_lstm_recorder.GateActivationRecorder. Not supported for dynamic confidence values.
+
+        Returns:
+          The new memory and hidden states of all nodes.
+        """
+        if update is None:
+            update = _graphlstm_update
+        if plan.confidence is not None:
+            return GraphLSTMNet._dynamic_step(m, h, plan, wave_weights[0], wave_input_terms[0], update_order, update)
+        num_nodes = len(plan.node_order)
+        for wave, weights, input_terms in zip(plan.waves, wave_weights, wave_input_terms):
+            with ops.name_scope("wave"):
+                m_i_new, h_i_new = update(input_terms,
+                                          _gather_wave(m, wave, num_nodes),
+                                          _gather_wave(h, wave, num_nodes),
+                                          array_ops.gather(m, wave.neighbour_index),
+                                          array_ops.gather(h, wave.neighbour_index),
+                                          weights,
+                                          None if wave.neighbour_count is None else
+                                          ops.convert_to_tensor(wave.neighbour_count),
+                                          record_gates=None if activation_recorder is None else
+                                          partial(activation_recorder.record, wave.index))
+
+                if _wave_covers_all_nodes(wave, num_nodes):
+                    # synchronous update: all rows are replaced at once
+                    m, h = m_i_new, h_i_new
+                    continue
+                # write back: every node keeps its row, except for the nodes of this wave, which get the new one
+                write_back_index = np.arange(num_nodes, dtype=np.int32)
+                write_back_index[wave.index] = num_nodes + np.arange(len(wave.nodes), dtype=np.int32)
+                m = array_ops.gather(array_ops.concat([m, m_i_new], 0), write_back_index)
+                h = array_ops.gather(array_ops.concat([h, h_i_new], 0), write_back_index)
+        return m, h
+
+    @staticmethod
+    def _dynamic_step(m, h, plan, weights, input_terms, update_order, update):
+        """Update the packed memory and hidden states of all nodes once, in a separate order for every sample.
+
+        In step k, the k-th node of every sample's update order is updated, all samples at once:
+        states, neighbour states, input terms and weights are gathered per sample, the samples are
+        treated as a stack of nodes with a batch size of 1, and the new states are scattered back.
+        To do so with plain gathers and scatters, the states are flattened into
+        [batch_size * number_of_nodes, 2 * num_units].
+
+        Args:
+          m: The memory states of all nodes, shaped [number_of_nodes, batch_size, num_units].
+          h: The hidden states of all nodes, shaped [number_of_nodes, batch_size, num_units].
+          plan: The execution plan holding a single wave of all nodes in _INDEX order.
+          weights: The packed weights of all nodes, as returned by _get_weights for that wave.
+          input_terms: The input terms of all nodes, shaped [number_of_nodes, batch_size, 4 * num_units].
+          update_order: The update order and row indices, as returned by _dynamic_update_order.
+          update: The function updating a stack of nodes, see _vectorised_step.
+
+        Returns:
+          The new memory and hidden states of all nodes.
+        """
+        wave = plan.waves[0]
+        num_nodes = len(plan.node_order)
+        batch_size = array_ops.shape(m)[1]
+        weights = {name: w for name, w in weights.items() if name not in (_W_UFCO, _B_UFCO)}
+
+        def flatten(t):
+            return array_ops.reshape(array_ops.transpose(t, [1, 0, 2]), [-1, t.get_shape()[2].value])
+
+        # memory and hidden states are always gathered together, so they are concatenated to save gathers
+        num_units = m.get_shape()[2].value
+        mh, input_terms = flatten(array_ops.concat([m, h], axis=2)), flatten(input_terms)
+        for node, row, neighbour_row in zip(*[array_ops.unstack(t, num=num_nodes) for t in update_order]):
+            with ops.name_scope("dynamic_step"):
+                m_i, h_i = array_ops.split(array_ops.expand_dims(array_ops.gather(mh, row), 1), 2, axis=2)
+                m_j, h_j = array_ops.split(array_ops.expand_dims(array_ops.gather(mh, neighbour_row), 2), 2, axis=3)
+                # the samples are the stacked nodes: [batch_size, 1, ...]
+                m_i_new, h_i_new = update(
+                    array_ops.expand_dims(array_ops.gather(input_terms, row), 1), m_i, h_i, m_j, h_j,
+                    {name: w if w.get_shape().ndims == 2 else array_ops.gather(w, node)
+                     for name, w in weights.items()},
+                    None if wave.neighbour_count is None else array_ops.gather(wave.neighbour_count, node))
+
+                mh = array_ops.tensor_scatter_update(mh, array_ops.expand_dims(row, 1),
+                                                     array_ops.concat([m_i_new, h_i_new], 2)[:, 0])
+
+        m, h = array_ops.split(array_ops.reshape(mh, [batch_size, num_nodes, 2 * num_units]), 2, axis=2)
+        return array_ops.transpose(m, [1, 0, 2]), array_ops.transpose(h, [1, 0, 2])
+
+    def run_with_constant_input(self, inputs, timesteps, initial_state=None, dtype=None, scope=None,
+                                final_output_only=False):
+        """Run this Graph LSTM for several timesteps, feeding the same input at every timestep.
+
+        This is equivalent to
+        `tf.nn.dynamic_rnn(net, net.reshape_input_for_dynamic_rnn(inputs, timesteps=timesteps), ...)`,
+        but the input is passed once instead of being copied for every timestep. For vectorised
+        update schedules, the input terms f_{i,t+1} * W + b of all gates are identical in every
+        timestep and are thus computed once, outside of the time loop. Variables are created in
+        the same scopes as by tf.nn.dynamic_rnn, so checkpoints can be used interchangeably.
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
+          timesteps: The number of timesteps to be simulated, an int or a scalar int32 Tensor.
+          initial_state: (optional) The initial state, as accepted by `call`.
+            Default: the zero state.
+          dtype: The dtype of the zero state. Required if initial_state is not given.
+          scope: VariableScope for the created subgraph. Default: "rnn".
+          final_output_only: If True, only the output of the last timestep is kept, instead of
+            collecting the outputs of all timesteps. Default: False.
+
+        Returns:
+          A pair (outputs, final_state) in the format returned by tf.nn.dynamic_rnn:
+          outputs is a tuple holding one tensor [batch_size, timesteps, output_size] per node
+          (for packed_state, a single tensor [batch_size, timesteps, number_of_nodes, output_size]),
+          final_state is the state after the last timestep.
+          If final_output_only is set, outputs is replaced by the output of the last timestep,
+          shaped [batch_size, number_of_nodes, output_size].
+
+        Raises:
+          ValueError: If neither initial_state nor dtype is given.
+        """
+        inputs = ops.convert_to_tensor(inputs)
+        if initial_state is None:
+            if dtype is None:
+                raise ValueError("If no initial_state is provided, dtype must be specified")
+            initial_state = self.zero_state(array_ops.shape(inputs)[0], dtype)
+
+        with vs.variable_scope(scope or "rnn"):
+            plan = self._get_plan()
+            if plan.waves is None:
+                # nothing to hoist for cells called one by one, but the input is still passed only once
+                if final_output_only:
+                    # carry the last output through the loop instead of collecting all outputs
+                    def final_output_step(output_and_state):
+                        output, new_state = self(inputs, output_and_state[1])
+                        return [], (output if self._packed_state else array_ops.stack(output, axis=1), new_state)
+                    initial_output = array_ops.zeros([array_ops.shape(inputs)[0], self._nxgraph.number_of_nodes(),
+                                                      self._cells()[0].output_size],
+                                                     dtype=inputs.dtype)
+                    _, (output, final_state) = _time_loop(final_output_step, (initial_output, initial_state),
+                                                          timesteps, 0, inputs.dtype)
+                    return output, final_state
+
+                def step(state):
+                    output, new_state = self(inputs, state)
+                    return [output] if self._packed_state else output, new_state
+                outputs, final_state = _time_loop(step, initial_state, timesteps,
+                                                  1 if self._packed_state else len(plan.node_order), inputs.dtype)
+                if self._packed_state:
+                    # [timesteps, batch_size, number_of_nodes, num_units] -> [batch_size, timesteps, ...]
+                    return array_ops.transpose(outputs[0], [1, 0, 2, 3]), final_state
+                return tuple(array_ops.transpose(o, [1, 0, 2]) for o in outputs), final_state
+
+            # enter the scope that the layer machinery would enter when calling the network
+            self._set_scope(None)
+            with vs.variable_scope(self._scope, reuse=vs.AUTO_REUSE, auxiliary_name_scope=False) as net_scope, \
+                    ops.name_scope(net_scope.original_name_scope):
+                self._check_inputs(inputs)
+                x = array_ops.transpose(inputs, [1, 0, 2])
+                node_weights, wave_weights = self._get_weights(x[0], plan)
+                wave_input_terms = self._wave_input_terms(x, plan, wave_weights, node_weights)
+                update_order = self._dynamic_update_order(plan, array_ops.shape(inputs)[0])
+
+                def vectorised_step(packed_state):
+                    m, h = self._timestep(packed_state[0], packed_state[1], plan, wave_weights,
+                                          wave_input_terms, update_order)
+                    return [] if final_output_only else [h], (m, h)
+                outputs, (m, h) = _time_loop(vectorised_step, self._pack_state(initial_state), timesteps,
+                                             0 if final_output_only else 1, inputs.dtype)
+                self.built = True
+                if final_output_only:
+                    # the output of the last timestep is its hidden state
+                    return array_ops.transpose(h, [1, 0, 2]), self._unpack_state(m, h)[1]
+                outputs = outputs[0]
+                if self._packed_state:
+                    # [timesteps, number_of_nodes, batch_size, num_units] -> [batch_size, timesteps, number_of_nodes, ...]
+                    return array_ops.transpose(outputs, [2, 0, 1, 3]), self._unpack_state(m, h)[1]
+                # [timesteps, number_of_nodes, batch_size, num_units] -> number_of_nodes x [batch_size, timesteps, ...]
+                outputs = tuple(array_ops.unstack(array_ops.transpose(outputs, [1, 2, 0, 3]),
+                                                  num=len(plan.node_order)))
+                return outputs, self._unpack_state(m, h)[1]
+
+    def run_until_converged(self, inputs, max_timesteps, tolerance, initial_state=None, dtype=None, scope=None):
+        """Run this Graph LSTM on a constant input until the hidden states of each sample have converged.
+
+        Every timestep, only the samples that have not converged yet are gathered and updated.
+        A sample has converged once no component of its hidden state changed by `tolerance`
+        or more in its last timestep; it keeps its output and state from then on.
+        Every sample runs for at least one and at most max_timesteps timesteps, and its results
+        are the same as those of `run_with_constant_input` with that sample's number of timesteps.
+        Variables are created in the same scopes as by `run_with_constant_input`.
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size].
+          max_timesteps: The maximum number of timesteps, an int or a scalar int32 Tensor.
+          tolerance: The largest change of a hidden state component that counts as converged,
+            a float or a scalar Tensor.
+          initial_state: (optional) The initial state, as accepted by `call`.
+            Default: the zero state.
+          dtype: The dtype of the zero state. Required if initial_state is not given.
+          scope: VariableScope for the created subgraph. Default: "rnn".
+
+        Returns:
+          A tuple (output, final_state, timesteps): the output of each sample's last timestep,
+          shaped [batch_size, number_of_nodes, output_size], the state after it, and the number of
+          timesteps each sample ran for, an int32 tensor shaped [batch_size].
+
+        Raises:
+          ValueError: If neither initial_state nor dtype is given,
+            or if the nodes have per-sample (Tensor) confidences, or if the network has an activation_recorder.
+        """
+        inputs = ops.convert_to_tensor(inputs)
+        batch_size = array_ops.shape(inputs)[0]
+        if initial_state is None:
+            if dtype is None:
+                raise ValueError("If no initial_state is provided, dtype must be specified")
+            initial_state = self.zero_state(batch_size, dtype)
+
+        with vs.variable_scope(scope or "rnn"):
+            plan = self._get_plan()
+            if plan.confidence is not None:
+                raise ValueError("run_until_converged does not support per-sample (Tensor) confidences.")
+            if self._activation_recorder is not None:
+                raise ValueError("run_until_converged does not support activation_recorder, as it updates only the "
+                                 "samples that have not converged yet.")
+
+            # the hidden states before the first timestep
+            m, h = self._pack_state(initial_state)
+            initial_output = array_ops.transpose(h, [1, 0, 2])
+
+            if plan.waves is None:
+                # the state is kept as accepted by `call`, with the samples along the first axis
+                def update(index, state):
+                    output, new_state = self(array_ops.gather(inputs, index),
+                                             nest.map_structure(lambda s: array_ops.gather(s, index), state))
+                    return output if self._packed_state else array_ops.stack(output, axis=1), new_state
+                return self._converge_loop(update, initial_output, initial_state, batch_size, 0,
+                                           max_timesteps, tolerance)
+
+            # enter the scope that the layer machinery would enter when calling the network
+            self._set_scope(None)
+            with vs.variable_scope(self._scope, reuse=vs.AUTO_REUSE, auxiliary_name_scope=False) as net_scope, \
+                    ops.name_scope(net_scope.original_name_scope):
+                self._check_inputs(inputs)
+                x = array_ops.transpose(inputs, [1, 0, 2])
+                node_weights, wave_weights = self._get_weights(x[0], plan)
+                # the input terms are identical in every timestep, so they are computed once for all samples
+                wave_input_terms = self._wave_input_terms(x, plan, wave_weights, node_weights)
+
+                def vectorised_update(index, packed_state):
+                    m, h = self._timestep(array_ops.gather(packed_state[0], index, axis=1),
+                                          array_ops.gather(packed_state[1], index, axis=1), plan, wave_weights,
+                                          [array_ops.gather(t, index, axis=1) for t in wave_input_terms])
+                    return array_ops.transpose(h, [1, 0, 2]), (m, h)
+                output, (m, h), timesteps = self._converge_loop(vectorised_update, initial_output, (m, h),
+                                                                batch_size, 1, max_timesteps, tolerance)
+                self.built = True
+                return output, self._unpack_state(m, h)[1], timesteps
+
+    @staticmethod
+    def _converge_loop(update, initial_output, initial_state, batch_size, batch_axis, max_timesteps, tolerance):
+        """Update the samples that have not converged yet in a tf.while_loop, until all have converged.
+
+        Args:
+          update: A function mapping the indices of the samples to update and the state of all samples
+            to the new output [samples to update, number_of_nodes, num_units] and new state of those samples.
+          initial_output: The hidden states before the first timestep, shaped [batch_size, number_of_nodes,
+            num_units].
+          initial_state: The state before the first timestep, a (nested structure of) tensor(s) holding
+            the samples along batch_axis.
+          batch_size: The number of samples.
+          batch_axis (int): The axis of the state tensors that holds the samples.
+          max_timesteps: The maximum number of timesteps.
+          tolerance: The largest change of a hidden state component that counts as converged.
+
+        Returns:
+          A tuple (output, final_state, timesteps), as returned by run_until_converged.
+        """
+        def body(time, active, timesteps, output, state):
+            index = math_ops.cast(array_ops.where(active)[:, 0], int32)
+            new_output, new_state = update(index, state)
+            change = math_ops.reduce_max(math_ops.abs(new_output - array_ops.gather(output, index)), axis=[1, 2])
+
+            # write back: every sample keeps its row, except for the updated ones, which get the new one
+            # (tf.tensor_scatter_update fails on loop variables it cannot overwrite in place)
+            updated = array_ops.scatter_nd(array_ops.expand_dims(index, 1), math_ops.range(array_ops.size(index)) + 1,
+                                           [batch_size])
+            write_back_index = array_ops.where(updated > 0, batch_size + updated - 1, math_ops.range(batch_size))
+
+            def write_back(full, updates, axis=0):
+                return array_ops.gather(array_ops.concat([full, updates], axis), write_back_index, axis=axis)
+            return (time + 1,
+                    math_ops.logical_and(active, write_back(array_ops.zeros_like(active), change >= tolerance)),
+                    timesteps + math_ops.cast(active, int32),
+                    write_back(output, new_output),
+                    nest.map_structure(lambda s, new_s: write_back(s, new_s, batch_axis), state, new_state))
+
+        _, _, timesteps, output, final_state = control_flow_ops.while_loop(
+            lambda time, active, *_: math_ops.logical_and(time < max_timesteps, math_ops.reduce_any(active)),
+            body,
+            (0, array_ops.fill([batch_size], True), array_ops.zeros([batch_size], int32),
+             initial_output, initial_state))
+        return output, final_state, timesteps
+
+    def run_streaming(self, inputs, stream_index, max_streams, timesteps=1, reset=None, dtype=float32, scope=None):
+        """Run this Graph LSTM on the current frame of several streams, starting from each stream's last state.
+
+        The state of every stream is kept in a local variable between calls (session runs), so consecutive,
+        highly correlated frames of a stream, e.g. of a live depth camera, continue refining the state left
+        by the previous frame instead of starting from the zero state, which allows running fewer timesteps
+        per frame. The state of a stream is updated whenever the returned output is evaluated.
+
+        Example:
+            frame = tf.placeholder(tf.float32, [None, number_of_nodes, input_size])
+            stream_index = tf.placeholder(tf.int32, [None])
+            reset = tf.placeholder_with_default(tf.zeros_like(stream_index, tf.bool), [None])
+            output = net.run_streaming(frame, stream_index, max_streams=4, reset=reset)
+            sess.run(tf.local_variables_initializer())
+            for frames, new_clip in ...:
+                sess.run(output, feed_dict={frame: frames, stream_index: [0, 1, 2, 3], reset: new_clip})
+
+        Args:
+          inputs: A tensor of dimensions [batch_size, number_of_nodes, inputs_size], holding the current frame
+            of each stream in the batch.
+          stream_index: An int32 tensor [batch_size] holding the stream of each sample, in [0, max_streams).
+            Each stream may occur at most once per batch.
+          max_streams (int): The number of streams a state is kept for.
+          timesteps: The number of timesteps per frame, an int or a scalar int32 Tensor. Default: 1.
+          reset: (optional) A bool tensor [batch_size]. Samples for which it is True start from the zero state,
+            e.g. for the first frame of a new clip. Default: no stream is reset.
+          dtype: The dtype of the stored states. Default: tf.float32.
+          scope: VariableScope for the created subgraph. Default: "rnn".
+
+        Returns:
+          The output of the last timestep, shaped [batch_size, number_of_nodes, output_size].
+          Evaluating it stores the final state of each stream in the batch.
+        """
+        inputs = ops.convert_to_tensor(inputs)
+        with vs.variable_scope(scope or "rnn"):
+            # the states of all streams, packed as [max_streams, number_of_nodes, 2, num_units],
+            # in the scope of the network's variables; a local variable, as they are no model parameters
+            self._set_scope(None)
+            with vs.variable_scope(self._scope, reuse=vs.AUTO_REUSE, auxiliary_name_scope=False):
+                stream_state = vs.get_variable("stream_state", [max_streams, self._nxgraph.number_of_nodes(), 2,
+                                                                self._num_units_for_vectorised_update()],
+                                               dtype=dtype, initializer=init_ops.zeros_initializer(),
+                                               trainable=False, collections=[ops.GraphKeys.LOCAL_VARIABLES])
+
+            initial_state = array_ops.gather(stream_state, stream_index)
+            if reset is not None:
+                initial_state = array_ops.where(reset, array_ops.zeros_like(initial_state), initial_state)
+            m, h = array_ops.unstack(array_ops.transpose(initial_state, [2, 1, 0, 3]), num=2)
+            output, final_state = self.run_with_constant_input(inputs, timesteps,
+                                                               initial_state=self._unpack_state(m, h)[1],
+                                                               scope=vs.get_variable_scope(), final_output_only=True)
+
+            m, h = self._pack_state(final_state)
+            store_state = state_ops.scatter_update(stream_state, stream_index,
+                                                   array_ops.transpose(array_ops.stack([m, h]), [2, 1, 0, 3]))
+            with ops.control_dependencies([store_state]):
+                return array_ops.identity(output)
+
+
+def restore_from_per_gate_checkpoint(sess, checkpoint_path, var_list=None):
+    """Restore variables from a checkpoint, assembling packed weights from per-gate weights.
+
+    This allows loading checkpoints of networks made of GraphLSTMCells into networks
+    made of PackedGraphLSTMCells. Variables found in the checkpoint under their own name
+    are restored as they are. Packed weights not found in the checkpoint are assembled by
+    concatenating the per-gate weights they are made of (see _PACKED_WEIGHTS), which
+    are expected in the same scope, e.g. `.../graph_lstm_cell_Wrist/W_ufco` is assembled
+    from `.../graph_lstm_cell_Wrist/W_u`, `.../W_f`, `.../W_c` and `.../W_o`.
+
+    Args:
+      sess: The session in which the variables are restored.
+      checkpoint_path: The path of the checkpoint, as passed to tf.train.Saver.restore.
+      var_list: (optional) The variables to restore. Default: all global variables.
+
+    Raises:
+      KeyError: If a variable can neither be found nor assembled from the checkpoint.
+    """
+    if var_list is None:
+        var_list = variables.global_variables()
+    reader = pywrap_tensorflow.NewCheckpointReader(checkpoint_path)
+
+    feed_dict = {}
+    for var in var_list:
+        var_name = var.op.name
+        if reader.has_tensor(var_name):
+            value = reader.get_tensor(var_name)
+        else:
+            scope_name, _, weight_name = var_name.rpartition("/")
+            part_names = [scope_name + "/" + w for w in _PACKED_WEIGHTS.get(weight_name, ())]
+            if not part_names or not all(reader.has_tensor(n) for n in part_names):
+                raise KeyError("Variable '%s' can neither be found in nor be assembled from checkpoint '%s'."
+                               % (var_name, checkpoint_path))
+            value = np.concatenate([reader.get_tensor(n) for n in part_names], axis=-1)
+        # feed the value to the initializer, as done by tf.Variable.load
+        feed_dict[var.initializer.inputs[1]] = value
+    sess.run([var.initializer for var in var_list], feed_dict=feed_dict)
+
+
+def convert_checkpoint_to_stacked_weights(checkpoint_path, output_checkpoint_path, nxgraph, net_scopes,
+                                          index_dict=None):
+    """Convert a checkpoint of GraphLSTMNets with per-cell weights for GraphLSTMNets with stacked_weights.
+
+    The weights of the given networks are read per node (see read_packed_weights) and written packed, those
+    shared between all cells to `<net_scope>/shared_weights/<packed name>`, all others stacked along a leading
+    node axis in _INDEX order to `<net_scope>/stacked_weights/<packed name>`. All other variables are copied as
+    they are, except for optimizer slots of the converted weights, which are dropped.
+
+    Args:
+      checkpoint_path: The path of the checkpoint, as passed to tf.train.Saver.restore.
+      output_checkpoint_path: The path of the converted checkpoint, as passed to tf.train.Saver.save.
+      nxgraph: The graph of the networks, or something a GraphLSTMNet graph can be created from.
+        Its indices must be the ones used for training.
+      net_scopes: The variable scope of a GraphLSTMNet, e.g. "rnn/GLSTM_layer_1", or a list of such scopes.
+      index_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+
+    Returns:
+      The path of the converted checkpoint, as returned by tf.train.Saver.save.
+
+    Raises:
+      KeyError: If a weight of a node cannot be found in the checkpoint.
+    """
+    if isinstance(net_scopes, str):
+        net_scopes = [net_scopes]
+    reader = pywrap_tensorflow.NewCheckpointReader(checkpoint_path)
+    nxgraph = GraphLSTMNet.create_nxgraph(nxgraph, num_units=1, index_dict=index_dict, verify=False)
+    node_names = sorted(nxgraph, key=lambda n: nxgraph.nodes[n][_INDEX])
+
+    values = {}
+    converted_variables = set()
+    for net_scope in net_scopes:
+        packed_weights, source_variables = read_packed_weights(reader, net_scope, node_names)
+        converted_variables |= source_variables
+        for packed_name, value in packed_weights.items():
+            is_shared = value.ndim == (1 if packed_name == _B_UFCO else 2)
+            values["%s/%s/%s" % (net_scope, "shared_weights" if is_shared else "stacked_weights", packed_name)] = value
+    for var_name in reader.get_variable_to_shape_map():
+        if var_name not in converted_variables and var_name.rpartition("/")[0] not in converted_variables:
+            values.setdefault(var_name, reader.get_tensor(var_name))
+
+    with ops.Graph().as_default():
+        # feed the values to the initializers, so they are not stored in the graph
+        var_dict = {}
+        feed_dict = {}
+        for var_name, value in values.items():
+            value = np.asarray(value)
+            initial_value = array_ops.placeholder(value.dtype, value.shape)
+            var_dict[var_name] = variables.Variable(initial_value, trainable=False)
+            feed_dict[initial_value] = value
+        with session.Session() as sess:
+            sess.run([var.initializer for var in var_dict.values()], feed_dict=feed_dict)
+            return saver_lib.Saver(var_list=var_dict).save(sess, output_checkpoint_path, write_meta_graph=False)
+
+
+def read_packed_weights(reader, net_scope, node_names):
+    """Read the weights of a GraphLSTMNet from a checkpoint as packed weights.
+
+    Stacked weights (see GraphLSTMNet) are read as they are. Otherwise, the packed weights of each node
+    are looked up in its node scope and, failing that, in the scope of the shared weights, packed
+    weights missing in both being assembled from their per-gate parts (see _PACKED_WEIGHTS).
+    If all nodes use the same variables for a packed weight, it is shared and returned once.
+
+    Args:
+      reader: A checkpoint reader, as returned by tf.train.NewCheckpointReader.
+      net_scope (str): The variable scope of the GraphLSTMNet, e.g. "rnn/GLSTM_layer_1".
+      node_names: The names of all nodes of the network, in _INDEX order.
+
+    Returns:
+      A pair (packed_weights, source_variables). packed_weights is a dict of packed weight name:numpy array pairs,
+      shaped as described in _pack_weights. source_variables is the set of names of the checkpoint variables read.
+
+    Raises:
+      KeyError: If a weight of a node can neither be found in its node scope nor in the shared scope.
+    """
+    variable_names = list(reader.get_variable_to_shape_map())
+    shared_scope = net_scope + "/shared_weights"
+
+    def find_variable(scope, weight_name):
+        matches = [n for n in variable_names if n.startswith(scope + "/") and n.rpartition("/")[2] == weight_name]
+        if len(matches) > 1:
+            raise KeyError("Found several variables named '%s' in scope '%s': %r" % (weight_name, scope, matches))
+        return matches[0] if matches else None
+
+    def find_parts(node_name, packed_name):
+        node_scope = net_scope + "/node_%s" % node_name
+        for scope in (node_scope, shared_scope):
+            packed_variable = find_variable(scope, packed_name)
+            if packed_variable is not None:
+                return (packed_variable,)
+        parts = []
+        for weight_name in _PACKED_WEIGHTS[packed_name]:
+            part = find_variable(node_scope, weight_name) or find_variable(shared_scope, weight_name)
+            if part is None:
+                raise KeyError("Weight '%s' of node '%s' can neither be found in scope '%s' nor in scope '%s'."
+                               % (weight_name, node_name, node_scope, shared_scope))
+            parts.append(part)
+        return tuple(parts)
+
+    packed_weights = {}
+    source_variables = set()
+    for packed_name in _PACKED_WEIGHTS:
+        stacked_variable = net_scope + "/stacked_weights/" + packed_name
+        if reader.has_tensor(stacked_variable):
+            packed_weights[packed_name] = reader.get_tensor(stacked_variable)
+            source_variables.add(stacked_variable)
+            continue
+        node_parts = [find_parts(node_name, packed_name) for node_name in node_names]
+        if all(parts == node_parts[0] for parts in node_parts):
+            node_parts = node_parts[:1]
+        values = [np.concatenate([reader.get_tensor(part) for part in parts], axis=-1) for parts in node_parts]
+        packed_weights[packed_name] = values[0] if len(values) == 1 else np.stack(values)
+        source_variables.update(part for parts in node_parts for part in parts)
+    return packed_weights, source_variables
+
+
+def _csr_levels(offsets, indices, node_order):
+    """Return the wave of each node under LEVEL_SCHEDULE, given the neighbours in CSR format.
+
+    Nodes are visited in node_order, and each node is placed in the wave directly after the latest wave
+    holding one of its already visited neighbours (see GraphLSTMNet.level_schedule).
+
+    Args:
+      offsets: An int array [number_of_nodes + 1], the neighbours of node p being indices[offsets[p]:offsets[p + 1]].
+      indices: An int array holding the neighbours of all nodes.
+      node_order: The nodes in the order they are visited.
+
+    Returns:
+      An int32 array holding the wave of each node.
+    """
+    level = np.full(len(offsets) - 1, -1, dtype=np.int32)
+    for node in node_order:
+        # unvisited neighbours are at level -1
+        level[node] = 1 + level[indices[offsets[node]:offsets[node + 1]]].max(initial=-1)
+    return level
+
+
+def _csr_colours(offsets, indices, node_order, confidence):
+    """Return the colour class of each node under COLOURING_SCHEDULE, given the neighbours in CSR format.
+
+    Nodes are visited in node_order, and each node is given the lowest colour none of its already visited
+    neighbours has. The colours are then renumbered in order of decreasing mean confidence, ties broken by
+    lower colour (see GraphLSTMNet.colouring_schedule).
+
+    Args:
+      offsets: An int array [number_of_nodes + 1], the neighbours of node p being indices[offsets[p]:offsets[p + 1]].
+      indices: An int array holding the neighbours of all nodes.
+      node_order: The nodes in the order they are visited.
+      confidence: A float array holding the confidence value of each node.
+
+    Returns:
+      An int32 array holding the colour class of each node.
+    """
+    colour = np.full(len(offsets) - 1, -1, dtype=np.int32)
+    for node in node_order:
+        # unvisited neighbours have colour -1, which is never free
+        taken = np.zeros(offsets[node + 1] - offsets[node] + 1, dtype=bool)
+        neighbour_colours = colour[indices[offsets[node]:offsets[node + 1]]]
+        taken[neighbour_colours[(neighbour_colours >= 0) & (neighbour_colours < len(taken))]] = True
+        colour[node] = np.argmin(taken)
+    num_colours = colour.max() + 1
+    mean_confidence = [np.mean(confidence[colour == c]) for c in range(num_colours)]
+    rank = np.empty(num_colours, dtype=np.int32)
+    rank[np.argsort(np.negative(mean_confidence), kind="mergesort")] = np.arange(num_colours)
+    return rank[colour]
+
+
+def _wave_covers_all_nodes(wave, num_nodes):
+    """Return if a wave holds all nodes in _INDEX order, i.e. if its rows are the rows of the full graph."""
+    return len(wave.index) == num_nodes and np.array_equal(wave.index, np.arange(num_nodes))
+
+
+def _gather_wave(params, wave, num_nodes):
+    """Gather the rows of the nodes of a wave from params shaped [number_of_nodes, ...]."""
+    return params if _wave_covers_all_nodes(wave, num_nodes) else array_ops.gather(params, wave.index)
+
+
+def _recompute_in_backward_pass(f, *args):
+    """Call f, keeping only its arguments instead of all of its intermediate tensors for the backward pass.
+
+    The gradients of f are calculated by running f on the same arguments again, once the gradients
+    of its outputs are known. Tensors used by f that are not passed as arguments (e.g. indices)
+    get no gradients, and f must not read any variables.
+
+    Args:
+      f: A function of args returning a (nested structure of) tensor(s).
+      *args: The arguments of f, (nested structures of) float tensors.
+
+    Returns:
+      The output of f.
+    """
+    flat_args = nest.flatten(args)
+
+    @custom_gradient.custom_gradient
+    def recomputed(*flat_args):
+        output = f(*nest.pack_sequence_as(args, list(flat_args)))
+
+        def grad(*output_grads):
+            # recompute the forward pass only once the output gradients are known, i.e. during the backward pass
+            with ops.control_dependencies(output_grads):
+                recompute_args = [array_ops.identity(a) for a in flat_args]
+            recomputed_output = f(*nest.pack_sequence_as(args, recompute_args))
+            return gradients_impl.gradients(nest.flatten(recomputed_output), recompute_args, grad_ys=output_grads)
+        return output, grad
+
+    return recomputed(*flat_args)
+
+
+def _time_loop(step, initial_state, timesteps, num_outputs, dtype):
+    """Run a step function for a number of timesteps in a tf.while_loop.
+
+    Args:
+      step: A function mapping a state to a pair (outputs, new_state), outputs being a sequence
+        of num_outputs tensors.
+      initial_state: The state before the first timestep, a (nested structure of) tensor(s).
+      timesteps: The number of timesteps.
+      num_outputs (int): The number of outputs of step.
+      dtype: The dtype of the outputs.
+
+    Returns:
+      A pair (outputs, final_state), where outputs holds the outputs of all timesteps,
+        stacked along a new first axis.
+    """
+    output_tas = tuple(tensor_array_ops.TensorArray(dtype, size=timesteps) for _ in range(num_outputs))
+
+    def body(time, output_tas, state):
+        outputs, new_state = step(state)
+        output_tas = tuple(ta.write(time, o) for ta, o in zip(output_tas, outputs))
+        return time + 1, output_tas, new_state
+
+    _, output_tas, final_state = control_flow_ops.while_loop(lambda time, *_: time < timesteps, body,
+                                                             (0, output_tas, initial_state))
+    outputs = [ta.stack() for ta in output_tas]
+    for output in outputs:
+        output.set_shape(tensor_shape.TensorShape([tensor_util.constant_value(ops.convert_to_tensor(timesteps))])
+                         .concatenate(output.get_shape()[1:]))
+    return outputs, final_state
+
 
 # calculates terms like W * f + U * h + b
 def _graphlstm_linear(weights, args):
@@ -966,3 +2875,379 @@ def _graphlstm_linear(weights, args):
         res = nn_ops.bias_add(res, b)
 
     return res
+
+
+def _pack_weights(weight_dicts):
+    """Pack the per-gate weights of several cells for updating them in one vectorised step.
+
+    The weights of all gates acting on the same operand are concatenated along their output axis,
+      as defined by _PACKED_WEIGHTS. Packed weights made of weights shared between all cells stay
+      as they are, otherwise the weights of the individual cells are stacked along a new leading axis.
+      Cells already holding packed weights (see PackedGraphLSTMCell) contribute these directly.
+
+    Args:
+      weight_dicts: a list of dicts of weight name:tensorflow-weight pairs, one per cell,
+        as returned by GraphLSTMCell.get_weights.
+
+    Returns:
+      A dict of packed weight name:Tensor pairs. The Tensors are shaped [in, out] (biases: [out])
+        if shared, or [number of cells, in, out] (biases: [number of cells, out]) if not.
+    """
+    packed_weights = {}
+    for packed_name, weight_names in _PACKED_WEIGHTS.items():
+        # the weights each cell's part of the packed weight is made of
+        sources = [(d[packed_name],) if packed_name in d else tuple(d[w] for w in weight_names)
+                   for d in weight_dicts]
+        if all(len(s) == len(sources[0]) and all(w is w_0 for w, w_0 in zip(s, sources[0])) for s in sources):
+            parts = list(sources[0])
+        elif all(len(s) == len(weight_names) for s in sources):
+            parts = [array_ops.stack(weights) for weights in zip(*sources)]
+        else:
+            parts = [array_ops.stack([s[0] if len(s) == 1 else array_ops.concat(s, axis=-1) for s in sources])]
+        packed_weights[packed_name] = parts[0] if len(parts) == 1 else array_ops.concat(parts, axis=-1)
+    return packed_weights
+
+
+def _shared_packed_weights(shared_weights, owner_name):
+    """Return the names of the packed weights that are shared, given the names of the shared (per-gate or packed)
+    weights.
+
+    Args:
+      shared_weights: The names of the weights shared between all cells.
+      owner_name (str): The name of the class requesting the packed weights, for error messages.
+
+    Raises:
+      ValueError: If only some of the weights making up a packed weight are shared.
+    """
+    shared_packed_weights = set()
+    for packed_name, weight_names in _PACKED_WEIGHTS.items():
+        shared_parts = [w for w in weight_names if w in shared_weights]
+        if packed_name in shared_weights or len(shared_parts) == len(weight_names):
+            shared_packed_weights.add(packed_name)
+        elif shared_parts:
+            raise ValueError("%s can only share all or none of the weights %s making up its packed weight %s, "
+                             "but shared_weights contains only %s."
+                             % (owner_name, list(weight_names), packed_name, shared_parts))
+    return shared_packed_weights
+
+
+def _packed_initializer(initializers):
+    """Return an initializer for a packed weight, initializing each of its parts by its own initializer.
+
+    Args:
+      initializers: a list of initializers, one per part, in the order the parts are concatenated.
+
+    Returns:
+      An initializer producing the concatenation of the parts along the last axis.
+    """
+    def _initializer(shape, dtype=None, partition_info=None):
+        part_shape = list(shape[:-1]) + [shape[-1] // len(initializers)]
+        return array_ops.concat([initializer(part_shape, dtype=dtype, partition_info=partition_info)
+                                 for initializer in initializers], axis=-1)
+    return _initializer
+
+
+def _stacked_initializer(initializers):
+    """Return an initializer for a stacked weight, initializing the slice of each node by its own initializer.
+
+    Args:
+      initializers: a list of initializers, one per node, in the order the nodes are stacked.
+
+    Returns:
+      An initializer producing the stack of the slices along the first axis.
+    """
+    def _initializer(shape, dtype=None, partition_info=None):
+        return array_ops.stack([initializer(list(shape[1:]), dtype=dtype, partition_info=partition_info)
+                                for initializer in initializers])
+    return _initializer
+
+
+def _create_packed_weights(num_nodes, input_size, num_units, shared_packed_weights, cell, dtype):
+    """Create or fetch the packed weights of a stack of nodes in the current variable scope.
+
+    The weights are shaped and scoped as those of a GraphLSTMNet with stacked_weights: packed weights shared
+    between all nodes are held once in the scope `shared_weights`, all others are stacked along a leading node
+    axis in the scope `stacked_weights`. Stacked weights are initialized at once if cell uses the default
+    initializers, which initialize every entry independently, and otherwise slice by slice like the weights of
+    separate cells, as shape-dependent initializers (e.g. glorot_uniform) would count the node axis in their fans.
+
+    Args:
+      num_nodes (int): The number of nodes.
+      input_size (int): The size of the inputs of each node.
+      num_units (int): The number of units of each node.
+      shared_packed_weights: The names of the packed weights shared between all nodes.
+      cell (GraphLSTMCell): The cell providing the initializers.
+      dtype: The dtype of the weights.
+
+    Returns:
+      A dict of packed weight name:tensorflow-weight pairs, shaped as described in _pack_weights.
+    """
+    shapes = {_W_UFCO: [input_size, 4 * num_units],
+              _U_UFCO: [num_units, 4 * num_units],
+              _U_UCON: [num_units, 3 * num_units],
+              _U_FN: [num_units, num_units],
+              _B_UFCO: [4 * num_units]}
+    weights = {}
+    for packed_name in _PACKED_WEIGHTS:
+        shared = packed_name in shared_packed_weights
+        with vs.variable_scope("shared_weights" if shared else "stacked_weights") as scope:
+            if packed_name == _B_UFCO or not shared:
+                scope.set_partitioner(None)
+            initializer = cell._get_packed_initializer(packed_name, dtype)
+            if not shared and not cell.has_elementwise_initializers:
+                initializer = _stacked_initializer([initializer] * num_nodes)
+            weights[packed_name] = vs.get_variable(
+                packed_name, shape=shapes[packed_name] if shared else [num_nodes] + shapes[packed_name],
+                dtype=dtype, initializer=initializer)
+    return weights
+
+
+def _node_linear(x, w):
+    """Linear map x * w for a stack of nodes.
+
+    Args:
+      x: a Tensor shaped [nodes, ..., in].
+      w: a Tensor shaped [in, out] if shared between all nodes, or [nodes, in, out] otherwise.
+
+    Returns:
+      A Tensor shaped [nodes, ..., out].
+    """
+    x_shape = array_ops.shape(x)
+    in_size = w.get_shape()[-2].value
+    out_size = w.get_shape()[-1].value
+    if w.get_shape().ndims == 2:
+        res = math_ops.matmul(array_ops.reshape(x, [-1, in_size]), w)
+    else:
+        res = math_ops.matmul(array_ops.reshape(x, [x_shape[0], -1, in_size]), w)
+    res = array_ops.reshape(res, array_ops.concat([x_shape[:-1], [out_size]], 0))
+    res.set_shape(x.get_shape()[:-1].concatenate(out_size))
+    return res
+
+
+def _node_bias(b, ndims):
+    """Reshape a bias shaped [out] or [nodes, out] to be broadcastable against a Tensor of ndims dimensions."""
+    if b.get_shape().ndims == 1:
+        return b
+    return array_ops.reshape(b, [-1] + [1] * (ndims - 2) + [b.get_shape()[-1].value])
+
+
+def _graphlstm_input_terms(inputs, weights):
+    """Calculate f_{i,t+1} * W + b for the gates u, f, c and o of a stack of nodes.
+
+    Args:
+      inputs: a Tensor shaped [nodes, batch_size, input_size].
+      weights: a dict of packed weights as returned by _pack_weights.
+
+    Returns:
+      A Tensor shaped [nodes, batch_size, 4 * num_units].
+    """
+    return _node_linear(inputs, weights[_W_UFCO]) + _node_bias(weights[_B_UFCO], 3)
+
+
+def _neighbour_mask_and_divisor(neighbour_count, h_j):
+    """Return the mask of the actual neighbours, broadcastable against h_j [nodes, neighbours, batch_size, ...],
+    and the divisor of their sums, broadcastable against the states [nodes, batch_size, ...], given the
+    neighbour_count of _graphlstm_update."""
+    neighbour_mask = array_ops.sequence_mask(neighbour_count, maxlen=array_ops.shape(h_j)[1], dtype=h_j.dtype)
+    neighbour_divisor = math_ops.cast(math_ops.maximum(neighbour_count, 1), h_j.dtype)
+    if neighbour_count.get_shape().ndims == 2:
+        # [nodes, batch_size, neighbours] -> [nodes, neighbours, batch_size, 1]
+        return array_ops.expand_dims(array_ops.transpose(neighbour_mask, [0, 2, 1]), -1), \
+            array_ops.expand_dims(neighbour_divisor, -1)
+    return array_ops.expand_dims(array_ops.expand_dims(neighbour_mask, -1), -1), \
+        array_ops.reshape(neighbour_divisor, [-1, 1, 1])
+
+
+def _with_recorded_gates(record_gates, h_i_new, gates):
+    """Make the new hidden states depend on recording the gate activations, so the recording runs in every timestep,
+    and in order of the timesteps.
+
+    Args:
+      record_gates: A function taking a list of the activations of the gates in GATE_SCOPES, each shaped
+        [nodes, batch_size, num_units] (the adaptive forget gates g_fij averaged over the neighbours), and
+        returning the op recording them, e.g. graph_lstm_recorder.GateActivationRecorder.record with the _INDEX
+        values of the nodes bound.
+      h_i_new: The new hidden states of the nodes.
+      gates: The list of gate activations.
+    """
+    with ops.control_dependencies([record_gates(list(gates))]):
+        return array_ops.identity(h_i_new)
+
+
+def _graphlstm_update(input_terms, m_i, h_i, m_j, h_j, weights, neighbour_count=None, record_gates=None):
+    """Run one Graph LSTM update for a stack of nodes.
+
+    This is the vectorised equivalent of GraphLSTMCell.call, with nodes stacked along the first axis.
+      All gates acting on the same operand are computed by one matrix multiplication.
+
+    Args:
+      input_terms: the input terms of all gates, as returned by _graphlstm_input_terms.
+        As they do not depend on the state, they can be reused for constant inputs.
+      m_i: the memory states of the nodes, shaped [nodes, batch_size, num_units].
+      h_i: the hidden states of the nodes, shaped [nodes, batch_size, num_units].
+      m_j: the most recent memory states of the neighbours of each node,
+        shaped [nodes, neighbours, batch_size, num_units].
+      h_j: the most recent hidden states of the neighbours of each node,
+        shaped [nodes, neighbours, batch_size, num_units].
+      weights: a dict of packed weights as returned by _pack_weights.
+      neighbour_count: (optional) an int32 Tensor shaped [nodes], holding the number of actual
+        neighbours of each node, or shaped [nodes, batch_size] if it differs between samples.
+        Neighbours beyond that count are padding and get masked. If None, all neighbours are actual neighbours.
+      record_gates: (optional) A function recording the gate activations of the nodes, see _with_recorded_gates.
+
+    Returns:
+      The new memory and hidden states, each shaped [nodes, batch_size, num_units].
+    """
+    sigmoid = math_ops.sigmoid
+    tanh = math_ops.tanh
+
+    # f_{i,t+1} * W + b and h_{i,t} * U for gates u, f, c, o
+    u_terms, f_terms, c_terms, o_terms = array_ops.split(input_terms + _node_linear(h_i, weights[_U_UFCO]),
+                                                         4, axis=-1)
+
+    if neighbour_count is not None:
+        neighbour_mask, neighbour_divisor = _neighbour_mask_and_divisor(neighbour_count, h_j)
+
+    def neighbour_mean(t):
+        if neighbour_count is None:
+            return math_ops.reduce_mean(t, axis=1)
+        return math_ops.reduce_sum(t * neighbour_mask, axis=1) / neighbour_divisor
+
+    # Eq. 1: averaged hidden states for neighbouring nodes h^-_{i,t}
+    h_j_avg = neighbour_mean(h_j)
+    un_terms, cn_terms, on_terms = array_ops.split(_node_linear(h_j_avg, weights[_U_UCON]), 3, axis=-1)
+
+    # Eq. 2 (each gate in its own name scope, see GATE_SCOPES; the packed matrix multiplications above are shared
+    # between gates)
+    # input gate
+    with ops.name_scope("g_u"):
+        g_u = sigmoid(u_terms + un_terms)
+    # adaptive forget gate, for all neighbours at once
+    # g_fij = sigmoid ( f_{i,t+1} * W_f + h_{j,t} * U_fn + b_f )
+    with ops.name_scope("g_fij"):
+        g_fij = sigmoid(array_ops.expand_dims(array_ops.split(input_terms, 4, axis=-1)[1], 1)
+                        + _node_linear(h_j, weights[_U_FN]))
+    # forget gate
+    with ops.name_scope("g_fi"):
+        g_fi = sigmoid(f_terms)
+    # output gate
+    with ops.name_scope("g_o"):
+        g_o = sigmoid(o_terms + on_terms)
+    # memory gate
+    with ops.name_scope("g_c"):
+        g_c = tanh(c_terms + cn_terms)
+
+    # new memory states
+    m_i_new = neighbour_mean(g_fij * m_j) + g_fi * m_i + g_u * g_c
+
+    # new hidden states
+    h_i_new = tanh(g_o * m_i_new)
+    if record_gates is not None:
+        h_i_new = _with_recorded_gates(record_gates, h_i_new, (g_u, neighbour_mean(g_fij), g_fi, g_o, g_c))
+
+    return m_i_new, h_i_new
+
+
+def _node_linear_grad(x, w, grad):
+    """Gradients of _node_linear(x, w) with respect to x and w, given the gradient of its result.
+
+    Args:
+      x: a Tensor shaped [nodes, ..., in].
+      w: a Tensor shaped [in, out] if shared between all nodes, or [nodes, in, out] otherwise.
+      grad: the gradient of the result, shaped [nodes, ..., out].
+
+    Returns:
+      A pair (x_grad, w_grad) shaped like x and w.
+    """
+    in_size = w.get_shape()[-2].value
+    out_size = w.get_shape()[-1].value
+    x_grad = _node_linear(grad, array_ops.matrix_transpose(w) if w.get_shape().ndims == 3 else array_ops.transpose(w))
+    if w.get_shape().ndims == 2:
+        w_grad = math_ops.matmul(array_ops.reshape(x, [-1, in_size]), array_ops.reshape(grad, [-1, out_size]),
+                                 transpose_a=True)
+    else:
+        num_nodes = array_ops.shape(x)[0]
+        w_grad = math_ops.matmul(array_ops.reshape(x, [num_nodes, -1, in_size]),
+                                 array_ops.reshape(grad, [num_nodes, -1, out_size]), transpose_a=True)
+    return x_grad, w_grad
+
+
+def _fused_graphlstm_update(input_terms, m_i, h_i, m_j, h_j, weights, neighbour_count=None, record_gates=None):
+    """Run one Graph LSTM update for a stack of nodes, with an explicitly calculated gradient.
+
+    Arguments and results are the same as for _graphlstm_update. Instead of differentiating
+    each of its operations, the gradient is calculated from the gate activations in one step,
+    so the backward pass only keeps the gates and the new memory state.
+    """
+    sigmoid = math_ops.sigmoid
+    tanh = math_ops.tanh
+    u_ufco, u_ucon, u_fn = weights[_U_UFCO], weights[_U_UCON], weights[_U_FN]
+
+    if neighbour_count is not None:
+        neighbour_mask, neighbour_divisor = _neighbour_mask_and_divisor(neighbour_count, h_j)
+
+    def neighbour_mean(t):
+        if neighbour_count is None:
+            return math_ops.reduce_mean(t, axis=1)
+        return math_ops.reduce_sum(t * neighbour_mask, axis=1) / neighbour_divisor
+
+    def neighbour_mean_grad(grad, like):
+        """Gradient of neighbour_mean for a result gradient grad, shaped like the neighbour tensor like."""
+        grad = array_ops.expand_dims(grad, 1)
+        if neighbour_count is None:
+            return grad / math_ops.cast(array_ops.shape(like)[1], like.dtype) + array_ops.zeros_like(like)
+        return grad * neighbour_mask / array_ops.expand_dims(neighbour_divisor, 1) + array_ops.zeros_like(like)
+
+    @custom_gradient.custom_gradient
+    def update(input_terms, m_i, h_i, m_j, h_j, u_ufco, u_ucon, u_fn):
+        # forward pass as in _graphlstm_update, all gates at once
+        u_terms, f_terms, c_terms, o_terms = array_ops.split(input_terms + _node_linear(h_i, u_ufco), 4, axis=-1)
+        h_j_avg = neighbour_mean(h_j)
+        un_terms, cn_terms, on_terms = array_ops.split(_node_linear(h_j_avg, u_ucon), 3, axis=-1)
+        with ops.name_scope("g_u"):
+            g_u = sigmoid(u_terms + un_terms)
+        with ops.name_scope("g_fij"):
+            g_fij = sigmoid(array_ops.expand_dims(array_ops.split(input_terms, 4, axis=-1)[1], 1)
+                            + _node_linear(h_j, u_fn))
+        with ops.name_scope("g_fi"):
+            g_fi = sigmoid(f_terms)
+        with ops.name_scope("g_o"):
+            g_o = sigmoid(o_terms + on_terms)
+        with ops.name_scope("g_c"):
+            g_c = tanh(c_terms + cn_terms)
+        m_i_new = neighbour_mean(g_fij * m_j) + g_fi * m_i + g_u * g_c
+        h_i_new = tanh(g_o * m_i_new)
+        if record_gates is not None:
+            h_i_new = _with_recorded_gates(record_gates, h_i_new, (g_u, neighbour_mean(g_fij), g_fi, g_o, g_c))
+
+        def grad(m_i_new_grad, h_i_new_grad):
+            if m_i_new_grad is None:
+                m_i_new_grad = array_ops.zeros_like(m_i_new)
+            if h_i_new_grad is None:
+                h_i_new_grad = array_ops.zeros_like(h_i_new)
+            # gradient of the memory state, directly and through the hidden state h = tanh(g_o * m)
+            output_grad = h_i_new_grad * (1 - h_i_new * h_i_new)
+            m_grad = m_i_new_grad + output_grad * g_o
+            # gradients before the gates' activation functions
+            u_grad = m_grad * g_c * g_u * (1 - g_u)
+            fi_grad = m_grad * m_i * g_fi * (1 - g_fi)
+            c_grad = m_grad * g_u * (1 - g_c * g_c)
+            o_grad = output_grad * m_i_new * g_o * (1 - g_o)
+            m_j_grad = neighbour_mean_grad(m_grad, m_j)
+            fij_grad = m_j_grad * m_j * g_fij * (1 - g_fij)
+            m_j_grad *= g_fij
+
+            ufco_grad = array_ops.concat([u_grad, fi_grad, c_grad, o_grad], -1)
+            ucon_grad = array_ops.concat([u_grad, c_grad, o_grad], -1)
+            h_i_grad, u_ufco_grad = _node_linear_grad(h_i, u_ufco, ufco_grad)
+            h_j_avg_grad, u_ucon_grad = _node_linear_grad(h_j_avg, u_ucon, ucon_grad)
+            h_j_grad, u_fn_grad = _node_linear_grad(h_j, u_fn, fij_grad)
+            h_j_grad += neighbour_mean_grad(h_j_avg_grad, h_j)
+            # the forget gate input term enters g_fi and every g_fij
+            num_units = m_i.get_shape()[-1].value
+            input_terms_grad = ufco_grad + array_ops.pad(math_ops.reduce_sum(fij_grad, axis=1),
+                                                         [[0, 0], [0, 0], [num_units, 2 * num_units]])
+            return input_terms_grad, m_grad * g_fi, h_i_grad, m_j_grad, h_j_grad, u_ufco_grad, u_ucon_grad, u_fn_grad
+        return (m_i_new, h_i_new), grad
+
+    return update(input_terms, m_i, h_i, m_j, h_j, u_ufco, u_ucon, u_fn)
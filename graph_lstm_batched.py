@@ -0,0 +1,228 @@
+"""Graph LSTM for batches of different graphs.
+
+graph_lstm.GraphLSTMNet is tied to one graph. This module provides BatchedGraphLSTMNet, which runs a batch of
+samples that each have their own graph (e.g. left and right hands, hands of datasets with 14, 16 and 21 joints, or
+per-image superpixel graphs) in one vectorised step, instead of one TensorFlow subgraph per topology. The graphs
+are given as a GraphBatch: their neighbour lists padded to the largest graph and degree, with per-sample node
+counts. Its arrays can be fed at runtime, so one TensorFlow graph runs any batch of graphs.
+Its weights are those of a GraphLSTMNet with stacked_weights, in the same scopes (relative to the network scope).
+"""
+from collections import namedtuple
+
+import networkx as nx
+import numpy as np
+import tensorflow as tf
+
+import graph_lstm as glstm
+
+
+class GraphBatch(namedtuple("GraphBatch", ["node_counts", "neighbour_index", "degrees", "levels"])):
+    """A batch of graphs, padded to a common number of nodes and neighbours.
+
+    Nodes are addressed by their _INDEX, nodes at or beyond the node count of a sample are padding. For sample b:
+      node_counts[b]: the number of nodes,
+      neighbour_index[b, i]: the _INDEX values of the neighbours of node i, padded with zeros to the maximum degree,
+      degrees[b, i]: the number of neighbours of node i (0 for padding),
+      levels[b, i]: the wave of node i (-1 for padding) under LEVEL_SCHEDULE (see GraphLSTMNet.level_schedule),
+        or under COLOURING_SCHEDULE (see GraphLSTMNet.colouring_schedule), depending on from_graphs.
+    The fields are numpy arrays (see from_graphs) or int32 Tensors (see placeholders).
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_graphs(cls, graphs, max_nodes=None, update_schedule=glstm.LEVEL_SCHEDULE):
+        """Create a GraphBatch from one graph per sample.
+
+        Args:
+          graphs: A list of graphs, each a graph_lstm.GraphSpec, or a networkx.Graph or edge list it is created
+            from with default indices and confidence values (see GraphSpec.from_nxgraph and GraphSpec.from_edges).
+          max_nodes (int): (optional) The number of nodes to pad to. Default: the number of nodes of the
+            largest graph.
+          update_schedule: The schedule the levels are computed for, LEVEL_SCHEDULE or COLOURING_SCHEDULE.
+            Default: LEVEL_SCHEDULE.
+
+        Returns:
+          A GraphBatch of numpy arrays.
+
+        Raises:
+          ValueError: If a graph has more than max_nodes nodes, or update_schedule is not supported.
+        """
+        if update_schedule not in (glstm.LEVEL_SCHEDULE, glstm.COLOURING_SCHEDULE):
+            raise ValueError("Expected update_schedule '%s' or '%s', but found '%s'."
+                             % (glstm.LEVEL_SCHEDULE, glstm.COLOURING_SCHEDULE, update_schedule))
+        # the cells of the specs are not used, so any number of units will do
+        specs = [g if isinstance(g, glstm.GraphSpec) else
+                 glstm.GraphSpec.from_nxgraph(g, 1) if isinstance(g, nx.Graph) else glstm.GraphSpec.from_edges(g, 1)
+                 for g in graphs]
+        node_counts = np.asarray([len(spec) for spec in specs], dtype=np.int32)
+        max_nodes = max(node_counts) if max_nodes is None else max_nodes
+        if max(node_counts) > max_nodes:
+            raise ValueError("max_nodes is %i, but found a graph of %i nodes." % (max_nodes, max(node_counts)))
+        neighbour_indices, degrees = zip(*[spec.neighbour_index() for spec in specs])
+        max_degree = max(n.shape[1] for n in neighbour_indices)
+        batch = cls(node_counts, np.zeros([len(specs), max_nodes, max_degree], dtype=np.int32),
+                    np.zeros([len(specs), max_nodes], dtype=np.int32),
+                    np.full([len(specs), max_nodes], -1, dtype=np.int32))
+        for b, (spec, neighbour_index, spec_degrees) in enumerate(zip(specs, neighbour_indices, degrees)):
+            batch.neighbour_index[b, :len(spec), :neighbour_index.shape[1]] = neighbour_index
+            batch.degrees[b, :len(spec)] = spec_degrees
+            batch.levels[b, spec.index] = spec.levels() if update_schedule == glstm.LEVEL_SCHEDULE else spec.colours()
+        return batch
+
+    @classmethod
+    def placeholders(cls, max_nodes=None, name="graph_batch"):
+        """Create a GraphBatch of int32 placeholders, for feeding a GraphBatch of numpy arrays (see feed_dict).
+
+        Args:
+          max_nodes (int): (optional) The static number of nodes to pad to.
+          name (str): The name scope of the placeholders. Default: "graph_batch".
+        """
+        with tf.name_scope(name):
+            return cls(tf.placeholder(tf.int32, [None], name="node_counts"),
+                       tf.placeholder(tf.int32, [None, max_nodes, None], name="neighbour_index"),
+                       tf.placeholder(tf.int32, [None, max_nodes], name="degrees"),
+                       tf.placeholder(tf.int32, [None, max_nodes], name="levels"))
+
+    def feed_dict(self, values):
+        """Return a feed_dict feeding the GraphBatch values into these placeholders."""
+        return dict(zip(self, values))
+
+
+class BatchedGraphLSTMNet(object):
+    """Graph LSTM network running every sample of a batch on its own graph.
+
+    All nodes share one number of units. As for graph_lstm.GraphLSTMNet with stacked_weights, the weights of all
+    gates acting on the same operand are packed into one weight, held once in the scope `shared_weights` if shared
+    between all nodes, or stacked along a leading node axis (one slice per _INDEX) in the scope `stacked_weights`
+    otherwise. Neighbour states are gathered per sample from the padded neighbour lists of its graph and averaged
+    over its actual neighbours only. Padding nodes (beyond the node count of a sample) keep their state and output
+    zeros.
+    """
+
+    def __init__(self, num_units, shared_weights=glstm.ALL_SHARED, name=None, update_schedule=glstm.LEVEL_SCHEDULE,
+                 bias_initializer=None, weight_initializer=None, forget_bias_initializer=None):
+        """Create a batched Graph LSTM network.
+
+        Args:
+          num_units (int): The number of units of each node.
+          shared_weights: A list of the weights that will be shared between all nodes, as for GraphLSTMNet.
+            Must contain either all or none of the weights making up a packed weight. Default: ALL_SHARED.
+          name (string): The Tensorflow name of the network. Default: "batched_graph_lstm_net".
+          update_schedule: LEVEL_SCHEDULE (or SEQUENTIAL_SCHEDULE) updates the nodes of each sample wave by wave,
+            yielding the same results as the sequential update of GraphLSTMNet. COLOURING_SCHEDULE updates them
+            colour class by colour class, for GraphBatches created with the same schedule (which holds the waves).
+            SYNCHRONOUS_SCHEDULE updates all nodes at once from the neighbour states of the previous timestep.
+            Default: LEVEL_SCHEDULE.
+          bias_initializer: The initializer of the biases. Default: uniform in [-0.1, 0.1).
+          weight_initializer: The initializer of the weights. Default: uniform in [-0.1, 0.1).
+          forget_bias_initializer: The initializer of the forget gate bias b_f. Default: constant 1.
+
+        Raises:
+          ValueError: If update_schedule is unknown, or only some of the weights making up a packed weight are shared.
+        """
+        if update_schedule not in glstm._SCHEDULES:
+            raise ValueError("Unknown update_schedule '%s', expected one of %s."
+                             % (update_schedule, sorted(glstm._SCHEDULES)))
+        self.num_units = num_units
+        self._name = "batched_graph_lstm_net" if name is None else name
+        self._update_schedule = glstm.LEVEL_SCHEDULE if update_schedule == glstm.SEQUENTIAL_SCHEDULE else \
+            update_schedule
+        self._shared_packed_weights = glstm._shared_packed_weights(shared_weights, type(self).__name__)
+        # only used for its initializers
+        self._initializer_cell = glstm.GraphLSTMCell(num_units, bias_initializer=bias_initializer,
+                                                     weight_initializer=weight_initializer,
+                                                     forget_bias_initializer=forget_bias_initializer)
+
+    def zero_state(self, batch_size, max_nodes, dtype=tf.float32):
+        """Return the zero state, shaped [batch_size, max_nodes, 2, num_units] like the packed state of
+        GraphLSTMNet, holding memory and hidden state of each node."""
+        return tf.zeros(tf.stack([batch_size, max_nodes, 2, self.num_units]), dtype=dtype)
+
+    def _timestep(self, m, h, input_terms, weights, graph_batch):
+        """Update all nodes of all samples once, all at once or wave by wave depending on the update schedule.
+
+        Args:
+          m, h: The memory and hidden states, shaped [max_nodes, batch_size, num_units].
+          input_terms: The input terms of all nodes, shaped [max_nodes, batch_size, 4 * num_units].
+          weights: The packed weights.
+          graph_batch: The GraphBatch of int32 Tensors.
+        """
+        batch_size = tf.shape(m)[1]
+        # rows of the states flattened to [max_nodes * batch_size, num_units] holding the neighbours of each node,
+        # shaped [max_nodes, max_degree, batch_size]
+        neighbour_rows = tf.transpose(graph_batch.neighbour_index, [1, 2, 0]) * batch_size + tf.range(batch_size)
+        neighbour_count = tf.transpose(graph_batch.degrees)
+
+        def update(m, h):
+            m_j = tf.gather(tf.reshape(m, [-1, self.num_units]), neighbour_rows)
+            h_j = tf.gather(tf.reshape(h, [-1, self.num_units]), neighbour_rows)
+            return glstm._graphlstm_update(input_terms, m, h, m_j, h_j, weights, neighbour_count)
+
+        # only the first node_counts nodes of each sample are updated, shaped [max_nodes, batch_size]
+        actual_nodes = tf.transpose(tf.sequence_mask(graph_batch.node_counts, tf.shape(m)[0]))
+
+        def write_back(selected, m, h, m_new, h_new):
+            selected = tf.broadcast_to(tf.expand_dims(tf.logical_and(selected, actual_nodes), -1), tf.shape(m))
+            return tf.where(selected, m_new, m), tf.where(selected, h_new, h)
+
+        levels = tf.transpose(graph_batch.levels)
+        if self._update_schedule == glstm.SYNCHRONOUS_SCHEDULE:
+            return write_back(levels >= 0, m, h, *update(m, h))
+
+        # the waves differ between samples, so every wave updates all nodes and keeps the new states of its own
+        def wave_step(wave, m, h):
+            return (wave + 1,) + tuple(write_back(tf.equal(levels, wave), m, h, *update(m, h)))
+
+        _, m, h = tf.while_loop(lambda wave, m, h: wave <= tf.reduce_max(levels), wave_step, (0, m, h),
+                                name="waves")
+        return m, h
+
+    def __call__(self, inputs, graph_batch, timesteps=1, initial_state=None, scope=None):
+        """Run the network on the same inputs for a number of timesteps.
+
+        Args:
+          inputs: A Tensor shaped [batch_size, max_nodes, input_size], node i of each sample being the node with
+            _INDEX i of its graph. max_nodes must be static if not all weights are shared.
+          graph_batch: A GraphBatch of numpy arrays or int32 Tensors, holding the graph of each sample.
+          timesteps: The number of timesteps, an int or a scalar int32 Tensor
+            (e.g. as returned by graph_lstm.timesteps_placeholder). Default: 1.
+          initial_state: (optional) The state to start from, shaped [batch_size, max_nodes, 2, num_units]
+            as returned by zero_state. Default: the zero state.
+          scope: (optional) The variable scope of the network. Default: the network's name.
+
+        Returns:
+          A pair (output, state): the output of the last timestep, shaped [batch_size, max_nodes, num_units],
+            and the state after it, shaped as the initial state. Nodes beyond the node count of a sample are
+            padding: they are not updated and keep their initial state, and their output is zero.
+
+        Raises:
+          ValueError: If max_nodes is not static, but not all weights are shared.
+        """
+        with tf.variable_scope(scope or self._name):
+            inputs = tf.convert_to_tensor(inputs)
+            graph_batch = GraphBatch(*[tf.convert_to_tensor(t, dtype=tf.int32) for t in graph_batch])
+            max_nodes = inputs.get_shape()[1].value
+            if max_nodes is None and len(self._shared_packed_weights) < len(glstm._PACKED_WEIGHTS):
+                raise ValueError("%s needs a static number of nodes for weights not shared between all nodes, but "
+                                 "found inputs shaped %s." % (type(self).__name__, inputs.get_shape()))
+            if initial_state is None:
+                initial_state = self.zero_state(tf.shape(inputs)[0], tf.shape(inputs)[1], inputs.dtype)
+            weights = glstm._create_packed_weights(max_nodes, inputs.get_shape()[-1].value, self.num_units,
+                                                   self._shared_packed_weights, self._initializer_cell, inputs.dtype)
+            # the input terms do not change between timesteps
+            x = tf.transpose(inputs, [1, 0, 2])
+            input_terms = glstm._graphlstm_input_terms(x, weights)
+            m, h = tf.unstack(tf.transpose(initial_state, [2, 1, 0, 3]), num=2)
+
+            def step(time, m, h):
+                return (time + 1,) + tuple(self._timestep(m, h, input_terms, weights, graph_batch))
+
+            _, m, h = tf.while_loop(lambda time, m, h: time < timesteps, step, (0, m, h), name="timesteps")
+            m.set_shape(x.get_shape()[:-1].concatenate(self.num_units))
+            h.set_shape(m.get_shape())
+            # padding nodes output zeros
+            output = tf.transpose(h, [1, 0, 2])
+            actual_nodes = tf.sequence_mask(graph_batch.node_counts, tf.shape(output)[1])
+            output = tf.where(tf.broadcast_to(tf.expand_dims(actual_nodes, -1), tf.shape(output)), output,
+                              tf.zeros_like(output))
+            return output, tf.transpose(tf.stack([m, h]), [2, 1, 0, 3])
@@ -0,0 +1,350 @@
+# NumPy implementation of the Graph LSTM forward pass, for running trained Graph LSTM refinement stages
+# without Tensorflow, e.g. on stored RegEn/MHP predictions
+#
+# CALL SIGNATURE:
+# python graph_lstm_numpy.py model.npz predictions.npy [ output.npy ]
+#
+# model.npz is created from a checkpoint by export_npz (which is the only function here needing Tensorflow).
+# predictions.npy holds network outputs of shape [ samples, 21, 3 ] (or [ samples, 63 ]), or MHP outputs of shape
+# [ samples, hypotheses, 21, 3 ], of which the mean over all hypotheses is refined.
+# The refined predictions are written to output.npy (default: predictions_graphlstm.npy).
+"""NumPy Graph LSTM inference.
+
+This module provides a vectorised NumPy forward pass equivalent to graph_lstm.graph_lstm,
+as well as an exporter converting the Graph LSTM weights of a checkpoint into a compact npz file.
+Importing this module does not import Tensorflow.
+"""
+from sys import argv
+
+import numpy as np
+
+
+# names of the packed weights stored in the npz file, see graph_lstm._PACKED_WEIGHTS
+_PACKED_WEIGHT_NAMES = ("W_ufco", "U_ufco", "U_ucon", "U_fn", "b_ufco")
+
+# keys of the graph structure and call configuration stored in the npz file
+_NODE_NAMES = "node_names"
+_UPDATE_ORDER = "update_order"
+_NEIGHBOUR_INDEX = "neighbour_index"
+_DEGREES = "degrees"
+_TIMESTEPS = "timesteps"
+_NORMALIZE = "normalize"
+_RESIDUAL_CONNECTION = "residual_connection"
+_UPDATE_SCHEDULE = "update_schedule"
+# the wave of each node (by index), only stored for the colouring schedule
+_WAVES = "waves"
+
+# update schedules, see graph_lstm.SEQUENTIAL_SCHEDULE, graph_lstm.SYNCHRONOUS_SCHEDULE and
+# graph_lstm.COLOURING_SCHEDULE (graph_lstm.LEVEL_SCHEDULE yields the same results as graph_lstm.SEQUENTIAL_SCHEDULE)
+_SEQUENTIAL_SCHEDULE = "sequential"
+_SYNCHRONOUS_SCHEDULE = "synchronous"
+_COLOURING_SCHEDULE = "colouring"
+
+
+def export_npz(checkpoint_path, npz_path, nxgraph, net_scope, confidence_dict=None, index_dict=None,
+               timesteps=1, normalize=False, residual_connection=False, update_schedule=_SEQUENTIAL_SCHEDULE):
+    """Export the weights of a GraphLSTMNet from a checkpoint into an npz file for NumpyGraphLSTM.
+
+    Per-gate weights are packed like in graph_lstm.PackedGraphLSTMCell. Packed weights made of weights
+    shared between all nodes are stored once, all others are stacked along a leading node axis in _INDEX order.
+    Checkpoints of GraphLSTMCell and PackedGraphLSTMCell networks, with any shared_weights template, as well as
+    of networks with stacked weights are supported (see graph_lstm.read_packed_weights).
+    The graph structure as well as the parameters of the graph_lstm call are stored alongside the weights.
+
+    Args:
+      checkpoint_path: The path of the checkpoint, as passed to tf.train.Saver.restore.
+      npz_path: The path of the npz file to be written.
+      nxgraph: The GraphLSTMNet graph, or something it can be created from by GraphLSTMNet.create_nxgraph.
+        Its indices and confidences must be the ones used for training.
+      net_scope (str): The variable scope of the GraphLSTMNet, e.g. "rnn/GLSTM_layer_1".
+      confidence_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+      index_dict (dict): (optional) Passed to GraphLSTMNet.create_nxgraph.
+      timesteps (int): The number of timesteps, as passed to graph_lstm. Default: 1.
+      normalize (bool): If the input gets normalized, as passed to graph_lstm. Default: False.
+      residual_connection (bool): If a residual connection is used, as passed to graph_lstm. Default: False.
+      update_schedule (str): The update schedule, as passed to graph_lstm. Default: "sequential".
+
+    Raises:
+      KeyError: If a weight of a node can neither be found in its node scope nor in the shared scope.
+      ValueError: If update_schedule is unknown.
+    """
+    # Tensorflow is only needed for reading the checkpoint and building the graph
+    # checkpoint_utils reads checkpoints with TensorFlow 1 as well as 2
+    from tensorflow.python.training import checkpoint_utils
+    import graph_lstm as glstm
+
+    nxgraph = glstm.GraphLSTMNet.create_nxgraph(nxgraph, num_units=1, confidence_dict=confidence_dict,
+                                                index_dict=index_dict, verify=False)
+    plan = glstm.GraphLSTMNet(nxgraph, update_schedule=update_schedule)._get_plan()
+    node_names = sorted(nxgraph, key=plan.index.get)
+    neighbour_index, degrees = glstm.GraphLSTMNet.neighbour_index(nxgraph)
+    schedule_arrays = {_UPDATE_SCHEDULE: _SEQUENTIAL_SCHEDULE}
+    if update_schedule == glstm.SYNCHRONOUS_SCHEDULE:
+        schedule_arrays = {_UPDATE_SCHEDULE: _SYNCHRONOUS_SCHEDULE}
+    elif update_schedule == glstm.COLOURING_SCHEDULE:
+        waves = np.empty(len(node_names), dtype=np.int32)
+        for w, wave in enumerate(plan.waves):
+            waves[wave.index] = w
+        schedule_arrays = {_UPDATE_SCHEDULE: _COLOURING_SCHEDULE, _WAVES: waves}
+
+    reader = checkpoint_utils.load_checkpoint(checkpoint_path)
+    arrays, _ = glstm.read_packed_weights(reader, net_scope, node_names)
+
+    np.savez_compressed(npz_path,
+                        **arrays,
+                        **{_NODE_NAMES: np.asarray([str(n) for n in node_names]),
+                           _UPDATE_ORDER: np.asarray([plan.index[n] for n in plan.node_order], dtype=np.int32),
+                           _NEIGHBOUR_INDEX: neighbour_index,
+                           _DEGREES: degrees,
+                           _TIMESTEPS: timesteps,
+                           _NORMALIZE: normalize,
+                           _RESIDUAL_CONNECTION: residual_connection,
+                           # the level schedule yields the same results as the sequential one and is stored as such
+                           **schedule_arrays})
+
+
+def normalize_for_graph_lstm(array):
+    """NumPy equivalent of graph_lstm.normalize_for_graph_lstm.
+
+    Returns: The normalized array, and a function to undo scaling.
+    """
+    assert array.ndim == 3
+    max_dim = np.max(array, axis=1, keepdims=True)
+    min_dim = np.min(array, axis=1, keepdims=True)
+    diff_dim = max_dim - min_dim
+    max_diff = np.max(diff_dim, axis=2, keepdims=True)
+    normalized_array = (array - min_dim - diff_dim / 2) / max_diff
+
+    def undo_scaling(a):
+        return a * max_diff
+
+    return normalized_array, undo_scaling
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _node_linear(x, w):
+    """Linear map x * w for a stack of nodes, x shaped [nodes, ..., in], w shaped [in, out] or [nodes, in, out]."""
+    if w.ndim == 2:
+        return np.matmul(x, w)
+    return np.matmul(x.reshape([x.shape[0], -1, x.shape[-1]]), w).reshape(x.shape[:-1] + (w.shape[-1],))
+
+
+def _node_bias(b):
+    """Reshape a bias shaped [out] or [nodes, out] to be broadcastable against [nodes, batch_size, out]."""
+    return b if b.ndim == 1 else b[:, np.newaxis, :]
+
+
+class NumpyGraphLSTM:
+    """Graph LSTM forward pass in NumPy.
+
+    Nodes are updated in waves of nodes not depending on each other, like graph_lstm.LEVEL_SCHEDULE,
+    which yields the same results as the sequential update of graph_lstm.GraphLSTMNet.
+    Models exported with graph_lstm.SYNCHRONOUS_SCHEDULE update all nodes in a single wave, models exported with
+    graph_lstm.COLOURING_SCHEDULE update them in the stored colour classes.
+
+    Example:
+        model = NumpyGraphLSTM("model.npz")
+        refined_predictions = model.run(predictions)
+    """
+
+    def __init__(self, npz_path):
+        """Load a model exported by export_npz.
+
+        Args:
+          npz_path: The path of the npz file.
+        """
+        with np.load(npz_path) as npz:
+            self.weights = {name: npz[name].astype(np.float32) for name in _PACKED_WEIGHT_NAMES}
+            self.node_names = list(npz[_NODE_NAMES])
+            update_order = npz[_UPDATE_ORDER]
+            self._neighbour_index = npz[_NEIGHBOUR_INDEX]
+            self._degrees = npz[_DEGREES]
+            self.timesteps = int(npz[_TIMESTEPS])
+            self.normalize = bool(npz[_NORMALIZE])
+            self.residual_connection = bool(npz[_RESIDUAL_CONNECTION])
+            # models exported before update schedules were stored use the sequential update
+            self.update_schedule = str(npz[_UPDATE_SCHEDULE]) if _UPDATE_SCHEDULE in npz else _SEQUENTIAL_SCHEDULE
+            waves = npz[_WAVES] if self.update_schedule == _COLOURING_SCHEDULE else None
+        self.num_units = self.weights["U_fn"].shape[-1]
+        if self.update_schedule == _SYNCHRONOUS_SCHEDULE:
+            self._waves = self._index_waves([np.arange(len(self.node_names))])
+        elif self.update_schedule == _COLOURING_SCHEDULE:
+            self._waves = self._index_waves([update_order[waves[update_order] == w] for w in range(waves.max() + 1)])
+        else:
+            self._waves = self._index_waves(self._level_waves(update_order))
+
+    def _level_waves(self, update_order):
+        """Group the node indices into waves, see graph_lstm.GraphLSTMNet.level_schedule."""
+        level = {}
+        for i in update_order:
+            level[i] = 1 + max([level[j] for j in self._neighbour_index[i, :self._degrees[i]] if j in level],
+                               default=-1)
+        return [np.asarray([i for i in update_order if level[i] == wave_level], dtype=np.int64)
+                for wave_level in range(max(level.values()) + 1)]
+
+    def _index_waves(self, wave_indices):
+        """Prepare the neighbour indices, neighbour masks and neighbour counts of waves given by their node indices."""
+        waves = []
+        for wave_index in wave_indices:
+            wave_degrees = self._degrees[wave_index]
+            wave_neighbour_index = self._neighbour_index[wave_index, :max(wave_degrees)]
+            wave_mask = (np.arange(wave_neighbour_index.shape[1]) < wave_degrees[:, np.newaxis]).astype(np.float32)
+            wave_count = np.maximum(wave_degrees, 1).astype(np.float32)
+            waves.append((wave_index, wave_neighbour_index, wave_mask[:, :, np.newaxis, np.newaxis],
+                          wave_count[:, np.newaxis, np.newaxis]))
+        return waves
+
+    def _weights_for(self, name, wave_index):
+        w = self.weights[name]
+        return w if w.ndim == (1 if name.startswith("b") else 2) else w[wave_index]
+
+    def _step(self, m, h, wave_input_terms):
+        """Update the memory and hidden states [nodes, batch_size, num_units] of all nodes once."""
+        for (wave_index, neighbour_index, mask, count), input_terms in zip(self._waves, wave_input_terms):
+            m_i, h_i = m[wave_index], h[wave_index]
+            m_j, h_j = m[neighbour_index], h[neighbour_index]
+
+            u_terms, f_terms, c_terms, o_terms = np.split(
+                input_terms + _node_linear(h_i, self._weights_for("U_ufco", wave_index)), 4, axis=-1)
+            h_j_avg = np.sum(h_j * mask, axis=1) / count
+            un_terms, cn_terms, on_terms = np.split(
+                _node_linear(h_j_avg, self._weights_for("U_ucon", wave_index)), 3, axis=-1)
+
+            g_u = _sigmoid(u_terms + un_terms)
+            g_fij = _sigmoid(np.split(input_terms, 4, axis=-1)[1][:, np.newaxis]
+                             + _node_linear(h_j, self._weights_for("U_fn", wave_index)))
+            g_fi = _sigmoid(f_terms)
+            g_o = _sigmoid(o_terms + on_terms)
+            g_c = np.tanh(c_terms + cn_terms)
+
+            m_i_new = np.sum(g_fij * m_j * mask, axis=1) / count + g_fi * m_i + g_u * g_c
+            m[wave_index] = m_i_new
+            h[wave_index] = np.tanh(g_o * m_i_new)
+        return m, h
+
+    def _run(self, inputs, normalize, residual_connection, iterate):
+        """Pre- and post-process the inputs and the output of a function iterating the Graph LSTM.
+
+        iterate is called with the memory and hidden states of all nodes, shaped [number_of_nodes, batch_size,
+        num_units], and the input terms of all waves, and returns the new memory and hidden states.
+        """
+        normalize = self.normalize if normalize is None else normalize
+        residual_connection = self.residual_connection if residual_connection is None else residual_connection
+
+        inputs = np.reshape(inputs, [-1, len(self.node_names), self.num_units]).astype(np.float32)
+        rescon_inputs = inputs
+        if normalize:
+            inputs, undo_scaling = normalize_for_graph_lstm(inputs)
+
+        # the input is identical in every timestep, so its projections are computed once
+        x = np.transpose(inputs, [1, 0, 2])
+        wave_input_terms = [_node_linear(x[wave_index], self._weights_for("W_ufco", wave_index))
+                            + _node_bias(self._weights_for("b_ufco", wave_index))
+                            for wave_index, _, _, _ in self._waves]
+        m = np.zeros([len(self.node_names), inputs.shape[0], self.num_units], dtype=np.float32)
+        h = np.zeros_like(m)
+        m, h = iterate(m, h, wave_input_terms)
+
+        output = np.transpose(h, [1, 0, 2])
+        if normalize:
+            output = undo_scaling(output)
+        if residual_connection:
+            output = rescon_inputs + output
+        return output
+
+    def run(self, inputs, timesteps=None, normalize=None, residual_connection=None):
+        """Run the Graph LSTM on a batch of inputs, equivalent to graph_lstm.graph_lstm.
+
+        Args:
+          inputs: An array of shape [batch_size, number_of_nodes, input_size] (or anything it can be reshaped from).
+          timesteps (int): (optional) Overrides the number of timesteps stored in the model.
+          normalize (bool): (optional) Overrides the normalization setting stored in the model.
+          residual_connection (bool): (optional) Overrides the residual connection setting stored in the model.
+
+        Returns:
+          The output array of shape [batch_size, number_of_nodes, num_units].
+        """
+        timesteps = self.timesteps if timesteps is None else timesteps
+
+        def iterate(m, h, wave_input_terms):
+            for _ in range(timesteps):
+                m, h = self._step(m, h, wave_input_terms)
+            return m, h
+        return self._run(inputs, normalize, residual_connection, iterate)
+
+    def run_until_converged(self, inputs, tolerance, max_timesteps=None, normalize=None, residual_connection=None):
+        """Run the Graph LSTM on a batch of inputs until the hidden states of each sample have converged,
+        equivalent to graph_lstm.GraphLSTMNet.run_until_converged.
+
+        Only the samples that have not converged yet are updated: a sample has converged once no component
+        of its hidden state changed by tolerance or more in its last timestep.
+
+        Args:
+          inputs: An array of shape [batch_size, number_of_nodes, input_size] (or anything it can be reshaped from).
+          tolerance (float): The largest change of a hidden state component that counts as converged.
+          max_timesteps (int): (optional) The maximum number of timesteps. Default: the number of timesteps
+            stored in the model.
+          normalize (bool): (optional) Overrides the normalization setting stored in the model.
+          residual_connection (bool): (optional) Overrides the residual connection setting stored in the model.
+
+        Returns:
+          A pair (output, timesteps): the output array of shape [batch_size, number_of_nodes, num_units]
+          and the number of timesteps each sample ran for, shaped [batch_size].
+        """
+        max_timesteps = self.timesteps if max_timesteps is None else max_timesteps
+        timesteps = np.zeros([np.size(inputs) // (len(self.node_names) * self.num_units)], dtype=np.int32)
+
+        def iterate(m, h, wave_input_terms):
+            active = np.arange(m.shape[1])
+            for _ in range(max_timesteps):
+                if not active.size:
+                    break
+                m_active, h_active = self._step(m[:, active], h[:, active], [t[:, active] for t in wave_input_terms])
+                timesteps[active] += 1
+                change = np.max(np.abs(h_active - h[:, active]), axis=(0, 2))
+                m[:, active], h[:, active] = m_active, h_active
+                active = active[change >= tolerance]
+            return m, h
+        return self._run(inputs, normalize, residual_connection, iterate), timesteps
+
+    def run_npy(self, input_npy, output_npy, batch_size=8192, **run_kwargs):
+        """Run the Graph LSTM on all predictions stored in an npy file, batch by batch.
+
+        Args:
+          input_npy: The path of the npy file holding the predictions, shaped [samples, number_of_nodes,
+            input_size] (or [samples, number_of_nodes * input_size]). MHP predictions shaped [samples, hypotheses,
+            number_of_nodes, input_size] are averaged over all hypotheses first.
+          output_npy: The path of the npy file the output is written to.
+          batch_size (int): The number of samples processed at once. Default: 8192.
+          **run_kwargs: Keyword arguments passed to run.
+        """
+        predictions = np.load(input_npy, mmap_mode='r')
+        output = np.lib.format.open_memmap(output_npy, mode='w+', dtype=np.float32,
+                                           shape=(predictions.shape[0], len(self.node_names), self.num_units))
+        for start in range(0, predictions.shape[0], batch_size):
+            batch = np.asarray(predictions[start:start + batch_size])
+            if batch.ndim == 4:
+                batch = np.mean(batch, axis=1)
+            output[start:start + batch_size] = self.run(batch, **run_kwargs)
+        output.flush()
+
+
+def main():
+    if len(argv) - 1 not in (2, 3):
+        print("You need to enter 2 or 3 command line arguments ('model.npz', 'predictions.npy' and optionally "
+              "'output.npy'), but found %i" % (len(argv) - 1))
+        exit(1)
+    npz_path, input_npy = argv[1:3]
+    output_npy = argv[3] if len(argv) == 4 else input_npy[:-len(".npy")] + "_graphlstm.npy"
+    print("Loading Graph LSTM model %s …" % npz_path)
+    model = NumpyGraphLSTM(npz_path)
+    print("Refining predictions %s …" % input_npy)
+    model.run_npy(input_npy, output_npy)
+    print("Stored refined predictions at %s." % output_npy)
+
+
+if __name__ == "__main__":
+    main()
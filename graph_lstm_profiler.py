@@ -0,0 +1,225 @@
+# profile a Graph LSTM network, attributing the time of its ops to nodes, gates and timesteps
+#
+# CALL SIGNATURE:
+# python graph_lstm_profiler.py trace.json [ update_schedule [ timesteps ] ]
+#
+# Runs a training step (forward and backward pass) of graph_lstm on the hand graph with full tracing, prints the time
+# spent per gate, node, wave and timestep, and writes a Chrome trace (to be opened at chrome://tracing) to trace.json,
+# in which every op is annotated with its node, gate and timestep. update_schedule is one of the update schedules of
+# graph_lstm (default: sequential), timesteps defaults to 2.
+"""Per-node and per-gate cost attribution for Graph LSTM.
+
+The ops of a traced run (see profile) are attributed
+  to nodes by the `node_<name>` variable scope of their cell (sequential update schedule),
+  to waves by the `wave` name scopes of vectorised update schedules, as all nodes of a wave share the same ops,
+  to gates by the name scopes in graph_lstm.GATE_SCOPES (ops outside of them, like the state update or the packed
+    matrix multiplications of vectorised updates, belong to no gate),
+  to timesteps by the order of their executions inside the time loop (executions of the gradient of an op inside
+    the loop run in reverse order),
+  and to the backward pass by the `gradients` name scope.
+Times are those the ops ran for on their device, so the times of ops running in parallel add up.
+"""
+import json
+import re
+from collections import defaultdict
+from sys import argv
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+import graph_lstm as glstm
+from helpers import HAND_GRAPH_HANDS2017, HAND_GRAPH_HANDS2017_INDEX_DICT, GLSTM_NUM_UNITS
+
+
+# # PROFILER CONFIGURATION  # ADAPT HERE
+
+BATCH_SIZE = 64
+SHARED_WEIGHTS = glstm.NEIGHBOUR_CONNECTIONS_SHARED
+# number of untraced steps before the traced one
+WARMUP_STEPS = 2
+# maximum number of rows printed per table
+TABLE_ROWS = 25
+
+SEED = 0
+
+
+# attributes of each op execution, as found in the records returned by cost_records
+ATTRIBUTES = ("pass", "gate", "node", "wave", "timestep")
+
+_NODE_PATTERN = re.compile(r"(?:^|/)node_([^/]+)/")
+_WAVE_PATTERN = re.compile(r"(?:^|/)wave(?:_(\d+))?/")
+_GATE_PATTERN = re.compile(r"(?:^|/)(%s)(?:_\d+)?/" % "|".join(glstm.GATE_SCOPES))
+_GRADIENTS_PATTERN = re.compile(r"(?:^|/)gradients(?:_\d+)?/")
+
+
+def profile(sess, fetches, feed_dict=None, timesteps=None, node_names=None, chrome_trace_path=None):
+    """Run fetches once with full tracing, and attribute the time of all ops executed (see cost_records).
+
+    Args:
+      sess: The tf.Session to run in.
+      fetches, feed_dict: Passed to sess.run.
+      timesteps (int): (optional) The number of timesteps run, for attributing ops to timesteps.
+      node_names: (optional) The names of the nodes of the network, see cost_records.
+      chrome_trace_path (str): (optional) The path to write the annotated Chrome trace to (see chrome_trace).
+
+    Returns:
+      A pair (values, records): the fetched values, and the records of all op executions.
+    """
+    run_metadata = tf.RunMetadata()
+    values = sess.run(fetches, feed_dict=feed_dict, options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+                      run_metadata=run_metadata)
+    records = cost_records(run_metadata, timesteps=timesteps, node_names=node_names)
+    if chrome_trace_path is not None:
+        with open(chrome_trace_path, "w") as f:
+            f.write(chrome_trace(run_metadata, records))
+    return values, records
+
+
+def _traced_devices(step_stats):
+    """Return the devices of step_stats each op execution is counted on once: GPU kernels are traced once per
+    stream, once more on "stream:all", and their launches on the device itself, of which only "stream:all" is
+    kept."""
+    devices = [dev_stats.device for dev_stats in step_stats.dev_stats]
+    streamed = [d[:-len("/stream:all")] for d in devices if d.endswith("/stream:all")]
+    return {d for d in devices if d.endswith("/stream:all") or
+            "/stream:" not in d and not any(d.endswith(s) for s in streamed)}
+
+
+def _node(op_name, node_names):
+    """Return the node an op belongs to, or None. Scopes of nodes visited more than once in the same scope
+    get a suffix (`node_<name>_1`), which is removed if the name with suffix is no node name."""
+    match = _NODE_PATTERN.search(op_name)
+    if match is None:
+        return None
+    node = match.group(1)
+    if node_names is None or node in node_names:
+        return node
+    stripped = re.sub(r"_\d+$", "", node)
+    return stripped if stripped in node_names else node
+
+
+def cost_records(run_metadata, timesteps=None, node_names=None):
+    """Attribute every op execution of a traced run to the pass, gate, node, wave and timestep it belongs to.
+
+    Args:
+      run_metadata: The tf.RunMetadata of a run with tf.RunOptions.FULL_TRACE.
+      timesteps (int): (optional) The number of timesteps run. An op executed a multiple of timesteps times is
+        executed equally often per timestep, and its executions are assigned to timesteps in order. Otherwise,
+        or if timesteps is not given, the timestep is None.
+      node_names: (optional) The names of the nodes of the network (as strings), for telling node names from
+        scope suffixes.
+
+    Returns:
+      A list of dicts, one per op execution, holding the op name, the device, the start time and duration in
+      microseconds, and the ATTRIBUTES: "pass" ("forward" or "backward"), "gate" (one of graph_lstm.GATE_SCOPES),
+      "node" (a node name), "wave" (the number of the wave) and "timestep", each None if not applicable.
+    """
+    node_names = None if node_names is None else {str(n) for n in node_names}
+    devices = _traced_devices(run_metadata.step_stats)
+    executions = defaultdict(list)
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        if dev_stats.device in devices:
+            for node_stats in dev_stats.node_stats:
+                executions[node_stats.node_name].append((node_stats.all_start_micros, node_stats.all_end_rel_micros,
+                                                         dev_stats.device))
+    records = []
+    for op_name, runs in executions.items():
+        backward = _GRADIENTS_PATTERN.search(op_name) is not None
+        gate = _GATE_PATTERN.search(op_name)
+        node = _node(op_name, node_names)
+        wave = _WAVE_PATTERN.search(op_name)
+        for k, (start, duration, device) in enumerate(sorted(runs)):
+            timestep = None
+            if timesteps and len(runs) % timesteps == 0:
+                timestep = k * timesteps // len(runs)
+                if backward:
+                    timestep = timesteps - 1 - timestep
+            records.append({"op": op_name, "device": device, "start": start, "duration": duration,
+                            "pass": "backward" if backward else "forward",
+                            "gate": None if gate is None else gate.group(1),
+                            "node": node,
+                            "wave": None if wave is None else int(wave.group(1) or 0),
+                            "timestep": timestep})
+    return records
+
+
+def aggregate(records, key):
+    """Sum up the durations of records by one of the ATTRIBUTES.
+
+    Returns:
+      A list of (value, duration, executions) triples in order of decreasing duration, value None collecting
+      the records not attributed.
+    """
+    durations = defaultdict(int)
+    counts = defaultdict(int)
+    for record in records:
+        durations[record[key]] += record["duration"]
+        counts[record[key]] += 1
+    return sorted(((value, durations[value], counts[value]) for value in durations), key=lambda t: -t[1])
+
+
+def format_table(records, keys=ATTRIBUTES, max_rows=TABLE_ROWS):
+    """Format the durations of records per value of each of keys as a table, see aggregate."""
+    total = max(sum(record["duration"] for record in records), 1)
+    lines = []
+    for key in keys:
+        rows = aggregate(records, key)
+        if all(value is None for value, _, _ in rows):
+            continue
+        lines.append("%-28s %12s %8s %12s" % ("per " + key, "time (ms)", "share", "executions"))
+        for value, duration, count in rows[:max_rows]:
+            lines.append("%-28s %12.3f %6.1f %% %12i" % ("-" if value is None else value, duration / 1000,
+                                                         100 * duration / total, count))
+        if len(rows) > max_rows:
+            lines.append("(%i more)" % (len(rows) - max_rows))
+        lines.append("")
+    lines.append("%-28s %12.3f %8s %12i" % ("total", total / 1000, "", len(records)))
+    return "\n".join(lines)
+
+
+def chrome_trace(run_metadata, records):
+    """Return the Chrome trace of a traced run as a JSON string, see tensorflow.python.client.timeline.
+
+    Each op execution is annotated with its ATTRIBUTES (as far as applicable) in its args, and put in the category
+    of its gate.
+    """
+    trace = json.loads(timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format())
+    attribution = {(record["op"], record["start"]): record for record in records}
+    for event in trace["traceEvents"]:
+        record = attribution.get((event.get("args", {}).get("name"), event.get("ts")))
+        if record is not None:
+            event["args"].update({key: record[key] for key in ATTRIBUTES if record[key] is not None})
+            event["cat"] = record["gate"] or "Op"
+    return json.dumps(trace)
+
+
+def main():
+    if len(argv) - 1 not in (1, 2, 3):
+        print("You need to enter 1 to 3 command line arguments ('trace.json' and optionally 'update_schedule' and "
+              "'timesteps'), but found %i" % (len(argv) - 1))
+        exit(1)
+    trace_path = argv[1]
+    update_schedule = argv[2] if len(argv) > 2 else glstm.SEQUENTIAL_SCHEDULE
+    timesteps = int(argv[3]) if len(argv) > 3 else 2
+
+    nxgraph = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017, GLSTM_NUM_UNITS,
+                                                index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
+    num_nodes = nxgraph.number_of_nodes()
+    input_tensor = tf.placeholder(tf.float32, [None, num_nodes, GLSTM_NUM_UNITS])
+    output = glstm.graph_lstm(input_tensor, nxgraph, shared_weights=SHARED_WEIGHTS, timesteps=timesteps,
+                              update_schedule=update_schedule)
+    gradients = tf.gradients(tf.reduce_sum(output), tf.trainable_variables())
+    feed_dict = {input_tensor: np.random.RandomState(SEED).rand(BATCH_SIZE, num_nodes, GLSTM_NUM_UNITS)}
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+        for _ in range(WARMUP_STEPS):
+            sess.run([output, gradients], feed_dict=feed_dict)
+        _, records = profile(sess, [output, gradients], feed_dict=feed_dict, timesteps=timesteps,
+                             node_names=nxgraph, chrome_trace_path=trace_path)
+    print(format_table(records))
+    print("Stored Chrome trace at %s." % trace_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Sampled recording of Graph LSTM gate activations.
+
+Gate activations are computed inside the time loop of graph_lstm.GraphLSTMNet, so they cannot be fetched, and
+summarising them in every run would slow down training. GateActivationRecorder records them in a sample of the
+runs only (every sample_every-th step), into a memory-mapped .npy file preallocated for a fixed number of records,
+which later records overwrite in turn, so disk use is bounded. The file can be analysed offline with NumPy:
+
+    recorder = GateActivationRecorder("gates.npy", num_nodes, num_units, timesteps=2, sample_every=100)
+    output = glstm.graph_lstm(inputs, nxgraph, timesteps=2, activation_recorder=recorder)
+    for step in range(steps):
+        sess.run(train_op, feed_dict={inputs: batch, **recorder.feed_dict(step)})
+    recorder.flush()
+
+    records = GateActivationRecorder.load("gates.npy")
+    records["activations"][..., glstm.GATE_SCOPES.index("g_fi"), :, :]  # shaped [record, timestep, node, sample, unit]
+
+In runs that are not sampled, each wave (or node, under the sequential update schedule) only evaluates a tf.cond
+per timestep.
+"""
+import numpy as np
+import tensorflow as tf
+
+import graph_lstm as glstm
+
+
+class GateActivationRecorder(object):
+    """Record the gate activations of all nodes of a GraphLSTMNet in sampled runs, into a memory-mapped array.
+
+    The records are a structured array with the fields
+      "step": the step passed to feed_dict when the record was sampled (-1 for records not written yet),
+      "activations": the gate activations, shaped [timesteps, num_nodes, len(graph_lstm.GATE_SCOPES), batch_samples,
+        num_units], with nodes in order of their _INDEX and gates in order of graph_lstm.GATE_SCOPES. The adaptive
+        forget gates g_fij are averaged over the neighbours of each node. Activations not recorded (e.g. of
+        timesteps not run) are NaN.
+    """
+
+    def __init__(self, path, num_nodes, num_units, timesteps, sample_every=100, batch_samples=1, max_bytes=2 ** 28,
+                 dtype=np.float16, name="record_gate_activations"):
+        """Create the memory-mapped file holding the records, and the flag switching recording on in sampled runs.
+
+        The flag is created in the default graph, which must be the graph the network is built in.
+
+        Args:
+          path (str): The path of the .npy file to create.
+          num_nodes (int): The number of nodes of the network.
+          num_units (int): The number of units of the network.
+          timesteps (int): The number of timesteps recorded per run. Later timesteps are not recorded.
+          sample_every (int): Record the runs of the steps divisible by sample_every, see feed_dict. Default: 100.
+          batch_samples (int): The number of samples recorded per run, the first ones of the batch. Default: 1.
+          max_bytes (int): The maximum size of the records on disk, which determines their number
+            (see capacity). Default: 256 MiB.
+          dtype: The NumPy dtype the activations are stored in. Default: np.float16.
+          name (str): The name of the flag placeholder. Default: "record_gate_activations".
+
+        Raises:
+          ValueError: If a single record is larger than max_bytes, or if sample_every is not positive.
+        """
+        if sample_every < 1:
+            raise ValueError("sample_every must be positive, but found %i." % sample_every)
+        record_dtype = np.dtype([("step", np.int64),
+                                 ("activations", dtype,
+                                  (timesteps, num_nodes, len(glstm.GATE_SCOPES), batch_samples, num_units))])
+        capacity = max_bytes // record_dtype.itemsize
+        if capacity < 1:
+            raise ValueError("A record takes %i bytes, more than max_bytes (%i)." % (record_dtype.itemsize,
+                                                                                    max_bytes))
+        self.records = np.lib.format.open_memmap(path, mode="w+", dtype=record_dtype, shape=(capacity,))
+        self.records["step"] = -1
+        self.records["activations"] = np.nan
+        self._timesteps = timesteps
+        self._sample_every = sample_every
+        self._batch_samples = batch_samples
+        self._sampled = 0
+        self._slot = None
+        self._executions = []
+        self._flag = tf.placeholder_with_default(False, [], name=name)
+
+    @property
+    def capacity(self):
+        """The number of records held, after which the oldest ones are overwritten."""
+        return len(self.records)
+
+    @property
+    def sampled(self):
+        """The number of runs sampled so far."""
+        return self._sampled
+
+    def feed_dict(self, step):
+        """Return the feed dict for the run of step, switching recording on if the step is sampled.
+
+        For a sampled step, the oldest record is cleared and will be written by the following run, so the
+        feed dict must be used once.
+
+        Args:
+          step (int): The training step (or any other counter of runs).
+
+        Returns:
+          A dict to be merged into the feed dict of the run, empty if step is not sampled.
+        """
+        if step % self._sample_every:
+            return {}
+        self._slot = self._sampled % self.capacity
+        self._sampled += 1
+        self.records["step"][self._slot] = step
+        self.records["activations"][self._slot] = np.nan
+        self._executions = [0] * len(self._executions)
+        return {self._flag: True}
+
+    def record(self, node_index, gates):
+        """Return the op recording the gate activations of a stack of nodes in sampled runs.
+
+        Called by GraphLSTMNet once per wave (or node) when building the network, the op then runs in every
+        timestep. The executions of one op in a run are counted to tell its timesteps apart.
+
+        Args:
+          node_index: The _INDEX values of the nodes.
+          gates: The list of the activations of the gates in graph_lstm.GATE_SCOPES, each shaped
+            [nodes, batch_size, num_units].
+
+        Returns:
+          An int32 scalar Tensor, to be run as control dependency of the new states of the nodes.
+
+        Raises:
+          ValueError: If the network is built in another graph than the flag.
+        """
+        if tf.get_default_graph() is not self._flag.graph:
+            raise ValueError("GateActivationRecorder must be created in the graph of the network it records.")
+        node_index = np.array(node_index, dtype=np.int64)
+        site = len(self._executions)
+        self._executions.append(0)
+
+        def write(*values):
+            timestep = self._executions[site]
+            self._executions[site] += 1
+            if timestep < self._timesteps:
+                # stack to [nodes, gates, batch_samples, num_units]
+                values = np.stack(values, axis=1)
+                self.records["activations"][self._slot, timestep, node_index, :, :values.shape[2]] = values
+            return np.int32(timestep)
+
+        samples = [gate[:, :self._batch_samples] for gate in gates]
+        return tf.cond(self._flag,
+                       lambda: tf.py_func(write, samples, tf.int32, stateful=True, name="write_gate_activations"),
+                       lambda: tf.constant(0, dtype=tf.int32))
+
+    def flush(self):
+        """Write the records to disk."""
+        self.records.flush()
+
+    @staticmethod
+    def load(path):
+        """Load the records written to a file, in order of their steps."""
+        records = np.load(path, mmap_mode="r")
+        written = np.flatnonzero(records["step"] >= 0)
+        return records[written[np.argsort(records["step"][written], kind="stable")]]
@@ -0,0 +1,334 @@
+"""Graph LSTM for large graphs.
+
+graph_lstm.GraphLSTMNet holds one cell per node, so the size of the TensorFlow graph it builds grows with the
+number of nodes, and graphs of thousands of nodes (like the superpixel graphs of Liang et al.) cannot be built.
+This module provides SparseGraphLSTMNet, which represents the graph as edge index arrays and updates the nodes
+with gather and segment ops. The size of its TensorFlow graph does not depend on the number of nodes: all nodes
+are updated at once (graph_lstm.SYNCHRONOUS_SCHEDULE), or wave by wave inside a tf.while_loop
+(graph_lstm.LEVEL_SCHEDULE, yielding the same results as the sequential update, or graph_lstm.COLOURING_SCHEDULE).
+Its weights are those of a GraphLSTMNet with stacked_weights, in the same scopes (relative to the network scope).
+"""
+import numpy as np
+import tensorflow as tf
+
+import graph_lstm as glstm
+
+
+def edges_from_nxgraph(nxgraph):
+    """Convert a valid GraphLSTMNet graph into the arguments of SparseGraphLSTMNet.
+
+    Args:
+      nxgraph (networkx.Graph): A valid GraphLSTMNet graph, e.g. as returned by GraphLSTMNet.create_nxgraph.
+
+    Returns:
+      A tuple (num_nodes, edges, confidence): the number of nodes, an int32 array [number_of_edges, 2] holding the
+        _INDEX values of the nodes of each edge, and the confidence values in _INDEX order.
+
+    Raises:
+      TypeError: If a confidence value is a Tensor.
+    """
+    index = {node_name: node_dict[glstm._INDEX] for node_name, node_dict in nxgraph.nodes(data=True)}
+    confidence = np.zeros(len(index))
+    for node_name, node_dict in nxgraph.nodes(data=True):
+        if isinstance(node_dict[glstm._CONFIDENCE], tf.Tensor):
+            raise TypeError("SparseGraphLSTMNet only supports static confidence values, but the confidence of node "
+                            "'%s' is a Tensor." % node_name)
+        confidence[index[node_name]] = node_dict[glstm._CONFIDENCE]
+    edges = np.asarray([(index[n_i], index[n_j]) for n_i, n_j in nxgraph.edges()], dtype=np.int32).reshape([-1, 2])
+    return len(index), edges, confidence
+
+
+def directed_edges(num_nodes, edges):
+    """Convert undirected edges into directed edges in both directions, sorted by receiving node.
+
+    Args:
+      num_nodes (int): The number of nodes.
+      edges: An int array [number_of_edges, 2] holding the indices of the nodes of each edge.
+        Duplicate edges are ignored.
+
+    Returns:
+      A tuple (senders, receivers, degrees) of int32 arrays: the sending and receiving node of each directed edge,
+        sorted by receiver (and sender), and the number of neighbours of each node.
+
+    Raises:
+      ValueError: If edges is not shaped [number_of_edges, 2], holds node indices out of range, or self-loops.
+    """
+    edges = np.asarray(edges, dtype=np.int64)
+    if edges.ndim != 2 or edges.shape[1] != 2:
+        raise ValueError("Expected edges shaped [number_of_edges, 2], but found shape %r." % (edges.shape,))
+    if edges.size and (edges.min() < 0 or edges.max() >= num_nodes):
+        raise ValueError("Node indices of edges must be in [0, %i), but found indices in [%i, %i]."
+                         % (num_nodes, edges.min(), edges.max()))
+    if np.any(edges[:, 0] == edges[:, 1]):
+        raise ValueError("Self-loops are not supported, but found one at node %i."
+                         % edges[edges[:, 0] == edges[:, 1]][0, 0])
+    # both directions, deduplicated and sorted by receiver via the keys receiver * num_nodes + sender
+    keys = np.unique(np.concatenate([edges[:, 1] * num_nodes + edges[:, 0], edges[:, 0] * num_nodes + edges[:, 1]]))
+    senders = (keys % num_nodes).astype(np.int32)
+    receivers = (keys // num_nodes).astype(np.int32)
+    degrees = np.bincount(receivers, minlength=num_nodes).astype(np.int32)
+    return senders, receivers, degrees
+
+
+def level_schedule(num_nodes, senders, receivers, confidence):
+    """Assign the nodes to waves of independent updates, as GraphLSTMNet.level_schedule does.
+
+    Nodes are visited in order of decreasing confidence (ties are broken by lower index), and each node is placed
+    in the wave directly after the latest wave holding one of its already visited neighbours.
+
+    Args:
+      num_nodes (int): The number of nodes.
+      senders, receivers: The directed edges sorted by receiver, as returned by directed_edges.
+      confidence: The confidence value of each node.
+
+    Returns:
+      An int32 array holding the wave of each node.
+    """
+    node_order = np.argsort(-np.asarray(confidence, dtype=np.float64), kind="mergesort")
+    return glstm._csr_levels(np.searchsorted(receivers, np.arange(num_nodes + 1)), senders, node_order)
+
+
+def colouring_schedule(num_nodes, senders, receivers, confidence):
+    """Assign the nodes to colour classes of independent updates, as GraphLSTMNet.colouring_schedule does.
+
+    Args:
+      num_nodes (int): The number of nodes.
+      senders, receivers: The directed edges sorted by receiver, as returned by directed_edges.
+      confidence: The confidence value of each node.
+
+    Returns:
+      An int32 array holding the colour class of each node, classes numbered in the order they are updated.
+    """
+    confidence = np.asarray(confidence, dtype=np.float64)
+    node_order = np.argsort(-confidence, kind="mergesort")
+    return glstm._csr_colours(np.searchsorted(receivers, np.arange(num_nodes + 1)), senders, node_order, confidence)
+
+
+class SparseGraphLSTMNet(object):
+    """Graph LSTM network for large graphs, given as edge index arrays.
+
+    All nodes share one number of units. As for graph_lstm.GraphLSTMNet with stacked_weights and a vectorised
+    update schedule, the weights of all gates acting on the same operand are packed into one weight, held once
+    in the scope `shared_weights` if shared between all nodes, or stacked along a leading node axis (in index
+    order) in the scope `stacked_weights` otherwise. Neighbour states are gathered per directed edge and averaged
+    per node by segment sums, so memory grows with the number of edges instead of nodes times maximum degree.
+    """
+
+    def __init__(self, num_nodes, edges, num_units, confidence=None, shared_weights=glstm.ALL_SHARED, name=None,
+                 update_schedule=glstm.SYNCHRONOUS_SCHEDULE, bias_initializer=None, weight_initializer=None,
+                 forget_bias_initializer=None):
+        """Create a sparse Graph LSTM network.
+
+        Args:
+          num_nodes (int): The number of nodes.
+          edges: An int array [number_of_edges, 2] holding the indices of the nodes of each (undirected) edge.
+          num_units (int): The number of units of each node.
+          confidence: (optional) The confidence value of each node, determining the update order of
+            LEVEL_SCHEDULE and COLOURING_SCHEDULE. Default: decreasing with the node index, i.e. nodes are
+            updated in index order.
+          shared_weights: A list of the weights that will be shared between all nodes, as for GraphLSTMNet.
+            Must contain either all or none of the weights making up a packed weight. Default: ALL_SHARED.
+          name (string): The Tensorflow name of the network. Default: "sparse_graph_lstm_net".
+          update_schedule: SYNCHRONOUS_SCHEDULE updates all nodes at once from the neighbour states of the
+            previous timestep. LEVEL_SCHEDULE (or SEQUENTIAL_SCHEDULE) updates the nodes wave by wave, yielding
+            the same results as the sequential update of GraphLSTMNet. COLOURING_SCHEDULE updates the nodes
+            colour class by colour class, as GraphLSTMNet does. Default: SYNCHRONOUS_SCHEDULE.
+          bias_initializer: The initializer of the biases. Default: uniform in [-0.1, 0.1).
+          weight_initializer: The initializer of the weights. Default: uniform in [-0.1, 0.1).
+          forget_bias_initializer: The initializer of the forget gate bias b_f. Default: constant 1.
+
+        Raises:
+          ValueError: If edges are invalid (see directed_edges), confidence has the wrong length,
+            update_schedule is unknown, or only some of the weights making up a packed weight are shared.
+        """
+        if update_schedule not in glstm._SCHEDULES:
+            raise ValueError("Unknown update_schedule '%s', expected one of %s."
+                             % (update_schedule, sorted(glstm._SCHEDULES)))
+        if confidence is None:
+            confidence = -np.arange(num_nodes)
+        confidence = np.asarray(confidence)
+        if confidence.shape != (num_nodes,):
+            raise ValueError("Expected one confidence value per node (%i), but found shape %r."
+                             % (num_nodes, confidence.shape))
+        self.num_nodes = num_nodes
+        self.num_units = num_units
+        self._name = "sparse_graph_lstm_net" if name is None else name
+        self._update_schedule = glstm.LEVEL_SCHEDULE if update_schedule == glstm.SEQUENTIAL_SCHEDULE else \
+            update_schedule
+        self._shared_packed_weights = glstm._shared_packed_weights(shared_weights, type(self).__name__)
+        # only used for its initializers
+        self._initializer_cell = glstm.GraphLSTMCell(num_units, bias_initializer=bias_initializer,
+                                                     weight_initializer=weight_initializer,
+                                                     forget_bias_initializer=forget_bias_initializer)
+
+        self.senders, self.receivers, self.degrees = directed_edges(num_nodes, edges)
+        if self._update_schedule == glstm.LEVEL_SCHEDULE:
+            self.waves = self._compile_waves(level_schedule(num_nodes, self.senders, self.receivers, confidence))
+        elif self._update_schedule == glstm.COLOURING_SCHEDULE:
+            self.waves = self._compile_waves(colouring_schedule(num_nodes, self.senders, self.receivers, confidence))
+        else:
+            self.waves = None
+
+    def _compile_waves(self, level):
+        """Sort nodes and edges by wave, for slicing the nodes and incoming edges of each wave.
+
+        Returns:
+          A dict of int32 arrays:
+            nodes: the nodes, sorted by wave (and index),
+            node_splits: the nodes of wave w being nodes[node_splits[w]:node_splits[w + 1]],
+            senders, receivers: the directed edges, sorted by the wave (and index) of their receiver,
+            segments: the position of each edge's receiver within the nodes of its wave,
+            edge_splits: the edges of wave w being senders[edge_splits[w]:edge_splits[w + 1]].
+        """
+        num_waves = level.max() + 1
+        nodes = np.lexsort([np.arange(self.num_nodes), level]).astype(np.int32)
+        node_splits = np.searchsorted(level[nodes], np.arange(num_waves + 1)).astype(np.int32)
+        position = np.empty(self.num_nodes, dtype=np.int32)
+        position[nodes] = np.arange(self.num_nodes) - node_splits[level[nodes]]
+        edge_order = np.lexsort([self.receivers, level[self.receivers]])
+        edge_splits = np.searchsorted(level[self.receivers][edge_order], np.arange(num_waves + 1)).astype(np.int32)
+        return {"nodes": nodes, "node_splits": node_splits,
+                "senders": self.senders[edge_order], "receivers": self.receivers[edge_order],
+                "segments": position[self.receivers[edge_order]], "edge_splits": edge_splits}
+
+    def zero_state(self, batch_size, dtype=tf.float32):
+        """Return the zero state, shaped [batch_size, number_of_nodes, 2, num_units] like the packed state of
+        GraphLSTMNet, holding memory and hidden state of each node."""
+        return tf.zeros(tf.stack([batch_size, self.num_nodes, 2, self.num_units]), dtype=dtype)
+
+    def _update(self, input_terms, m, h, nodes, senders, receivers, segments, weights):
+        """Update a stack of nodes once from the states m and h of all nodes, shaped
+        [number_of_nodes, batch_size, num_units].
+
+        Args:
+          input_terms: The input terms of the nodes, shaped [nodes, batch_size, 4 * num_units].
+          nodes: The indices of the nodes, or None for all nodes in index order.
+          senders, receivers: The directed edges into the nodes.
+          segments: The position of the receiver of each edge in nodes.
+          weights: The packed weights of all nodes.
+
+        Returns:
+          The new memory and hidden states of the nodes, each shaped [nodes, batch_size, num_units].
+        """
+        def rows(t):
+            return t if nodes is None else tf.gather(t, nodes)
+
+        num_segments = self.num_nodes if nodes is None else tf.shape(nodes)[0]
+        node_weights = {name: w if name in self._shared_packed_weights else rows(w) for name, w in weights.items()}
+        m_i, h_i = rows(m), rows(h)
+        m_j, h_j = tf.gather(m, senders), tf.gather(h, senders)
+        neighbour_divisor = tf.reshape(tf.cast(tf.maximum(rows(tf.constant(self.degrees)), 1), h.dtype), [-1, 1, 1])
+
+        def neighbour_mean(t):
+            return tf.unsorted_segment_sum(t, segments, num_segments) / neighbour_divisor
+
+        # f_{i,t+1} * W + b and h_{i,t} * U for gates u, f, c, o
+        u_terms, f_terms, c_terms, o_terms = tf.split(input_terms +
+                                                      glstm._node_linear(h_i, node_weights[glstm._U_UFCO]), 4, axis=-1)
+        # Eq. 1: averaged hidden states for neighbouring nodes h^-_{i,t}
+        un_terms, cn_terms, on_terms = tf.split(glstm._node_linear(neighbour_mean(h_j), node_weights[glstm._U_UCON]),
+                                                3, axis=-1)
+        # Eq. 2
+        g_u = tf.sigmoid(u_terms + un_terms)
+        # adaptive forget gate, per edge, with the weights of its receiver
+        u_fn = weights[glstm._U_FN]
+        if glstm._U_FN not in self._shared_packed_weights:
+            u_fn = tf.gather(u_fn, receivers)
+        g_fij = tf.sigmoid(tf.gather(tf.split(input_terms, 4, axis=-1)[1], segments) + glstm._node_linear(h_j, u_fn))
+        g_fi = tf.sigmoid(f_terms)
+        g_o = tf.sigmoid(o_terms + on_terms)
+        g_c = tf.tanh(c_terms + cn_terms)
+
+        m_i_new = neighbour_mean(g_fij * m_j) + g_fi * m_i + g_u * g_c
+        h_i_new = tf.tanh(g_o * m_i_new)
+        return m_i_new, h_i_new
+
+    def _timestep(self, m, h, input_terms, weights):
+        """Update all nodes once, all at once or wave by wave depending on the update schedule."""
+        if self.waves is None:
+            return self._update(input_terms, m, h, None, tf.constant(self.senders), tf.constant(self.receivers),
+                                tf.constant(self.receivers), weights)
+
+        waves = {key: tf.constant(value, name=key) for key, value in self.waves.items()}
+
+        def wave_step(wave, m, h):
+            nodes = waves["nodes"][waves["node_splits"][wave]:waves["node_splits"][wave + 1]]
+            first_edge, last_edge = waves["edge_splits"][wave], waves["edge_splits"][wave + 1]
+            m_i_new, h_i_new = self._update(tf.gather(input_terms, nodes), m, h, nodes,
+                                            waves["senders"][first_edge:last_edge],
+                                            waves["receivers"][first_edge:last_edge],
+                                            waves["segments"][first_edge:last_edge], weights)
+            # write back: every node keeps its row, except for the nodes of this wave, which get the new one
+            position = tf.scatter_nd(tf.expand_dims(nodes, 1), tf.range(1, tf.shape(nodes)[0] + 1), [self.num_nodes])
+            write_back_index = tf.where(position > 0, self.num_nodes + position - 1, tf.range(self.num_nodes))
+            return (wave + 1, tf.gather(tf.concat([m, m_i_new], 0), write_back_index),
+                    tf.gather(tf.concat([h, h_i_new], 0), write_back_index))
+
+        _, m, h = tf.while_loop(lambda wave, m, h: wave < len(self.waves["node_splits"]) - 1, wave_step, (0, m, h),
+                                name="waves")
+        return m, h
+
+    def __call__(self, inputs, timesteps=1, initial_state=None, scope=None):
+        """Run the network on the same inputs for a number of timesteps.
+
+        Args:
+          inputs: A Tensor shaped [batch_size, number_of_nodes, input_size].
+          timesteps: The number of timesteps, an int or a scalar int32 Tensor
+            (e.g. as returned by graph_lstm.timesteps_placeholder). Default: 1.
+          initial_state: (optional) The state to start from, shaped [batch_size, number_of_nodes, 2, num_units]
+            as returned by zero_state. Default: the zero state.
+          scope: (optional) The variable scope of the network. Default: the network's name.
+
+        Returns:
+          A pair (output, state): the output of the last timestep, shaped [batch_size, number_of_nodes, num_units],
+            and the state after it, shaped as the initial state.
+        """
+        with tf.variable_scope(scope or self._name):
+            inputs = tf.convert_to_tensor(inputs)
+            if initial_state is None:
+                initial_state = self.zero_state(tf.shape(inputs)[0], inputs.dtype)
+            weights = glstm._create_packed_weights(self.num_nodes, inputs.get_shape()[-1].value, self.num_units,
+                                                   self._shared_packed_weights, self._initializer_cell, inputs.dtype)
+            # the input terms do not change between timesteps
+            x = tf.transpose(inputs, [1, 0, 2])
+            input_terms = glstm._graphlstm_input_terms(x, weights)
+            m, h = tf.unstack(tf.transpose(initial_state, [2, 1, 0, 3]), num=2)
+
+            def step(time, m, h):
+                return (time + 1,) + tuple(self._timestep(m, h, input_terms, weights))
+
+            _, m, h = tf.while_loop(lambda time, m, h: time < timesteps, step, (0, m, h), name="timesteps")
+            m.set_shape(x.get_shape()[:-1].concatenate(self.num_units))
+            h.set_shape(m.get_shape())
+            return tf.transpose(h, [1, 0, 2]), tf.transpose(tf.stack([m, h]), [2, 1, 0, 3])
+
+
+def sparse_graph_lstm(inputs, edges, num_units, confidence=None, shared_weights=glstm.ALL_SHARED, name=None,
+                      timesteps=1, update_schedule=glstm.SYNCHRONOUS_SCHEDULE, normalize=False,
+                      residual_connection=False):
+    """Functional interface for a sparse Graph LSTM network, like graph_lstm.graph_lstm.
+
+    Args:
+      inputs: A Tensor shaped [batch_size, number_of_nodes, input_size], with a static number of nodes.
+      edges: An int array [number_of_edges, 2] holding the indices of the nodes of each (undirected) edge.
+      num_units (int): The number of units of each node.
+      confidence, shared_weights, name, update_schedule: Passed to SparseGraphLSTMNet.
+      timesteps: The number of timesteps, an int or a scalar int32 Tensor. Default: 1.
+      normalize: If True, the input is scaled into [-0.5, 0.5] (and back afterwards), see
+        graph_lstm.normalize_for_graph_lstm. Default: False.
+      residual_connection: If True, a residual connection is added around the network. Default: False.
+
+    Returns:
+      The output Tensor of the last timestep, shaped [batch_size, number_of_nodes, num_units].
+    """
+    net = SparseGraphLSTMNet(inputs.get_shape()[1].value, edges, num_units, confidence=confidence,
+                             shared_weights=shared_weights, name=name, update_schedule=update_schedule)
+    rescon_inputs = inputs
+    if normalize:
+        inputs, undo_scaling = glstm.normalize_for_graph_lstm(inputs)
+    output, _ = net(inputs, timesteps=timesteps)
+    if normalize:
+        output = undo_scaling(output)
+    if residual_connection:
+        output = tf.add(rescon_inputs, output)
+    return output
@@ -0,0 +1,419 @@
+"""TensorFlow 2 Graph LSTM.
+
+This module provides Keras layer versions of graph_lstm.GraphLSTMCell and graph_lstm.GraphLSTMNet,
+which run eagerly or under tf.function, optionally compiled by XLA (jit_compile).
+The nodes are updated in vectorised waves like graph_lstm.LEVEL_SCHEDULE (or graph_lstm.SYNCHRONOUS_SCHEDULE and
+graph_lstm.COLOURING_SCHEDULE),
+from packed weights like those of graph_lstm.PackedGraphLSTMCell, and the weights of a GraphLSTMNet can be
+loaded from any checkpoint of graph_lstm (see GraphLSTMNet.load_checkpoint).
+Unlike graph_lstm, this module requires TensorFlow 2.
+"""
+import numpy as np
+import tensorflow as tf
+
+import graph_lstm as glstm
+
+
+class GraphLSTMCell(tf.keras.layers.Layer):
+    """Graph LSTM cell updating a stack of nodes, as a Keras layer.
+
+    The cell holds the weights of all nodes of a graph. As in graph_lstm.PackedGraphLSTMCell, the weights
+    of all gates acting on the same operand are packed into one weight (see graph_lstm._PACKED_WEIGHTS).
+    Packed weights shared between all nodes are held once, all others are stacked along a leading node axis
+    in _INDEX order, as for graph_lstm.GraphLSTMNet's stacked_weights.
+    Calling the cell runs one Graph LSTM update for any stack of these nodes at once.
+    """
+
+    def __init__(self, num_units, num_nodes, shared_weights=glstm.ALL_SHARED, bias_initializer=None,
+                 weight_initializer=None, forget_bias_initializer=None, **kwargs):
+        """Initialize the Graph LSTM cell.
+
+        Args:
+          num_units (int): The number of units of each node.
+          num_nodes (int): The number of nodes of the graph.
+          shared_weights: A list of the weights that will be shared between all nodes, as for
+            graph_lstm.GraphLSTMNet. Must contain either all or none of the weights making up a packed weight.
+            Default: ALL_SHARED.
+          bias_initializer: The initializer of the biases. Default: uniform in [-0.1, 0.1).
+          weight_initializer: The initializer of the weights. Default: uniform in [-0.1, 0.1).
+          forget_bias_initializer: The initializer of the forget gate bias b_f. Default: constant 1.
+          **kwargs: Keyword arguments passed to tf.keras.layers.Layer, e.g. name.
+
+        Raises:
+          ValueError: If only some of the weights making up a packed weight are shared.
+        """
+        super(GraphLSTMCell, self).__init__(**kwargs)
+        self.num_units = num_units
+        self.num_nodes = num_nodes
+        self._shared_packed_weights = glstm._shared_packed_weights(shared_weights, type(self).__name__)
+        self._bias_initializer = tf.keras.initializers.RandomUniform(-0.1, 0.1) \
+            if bias_initializer is None else bias_initializer
+        self._weight_initializer = tf.keras.initializers.RandomUniform(-0.1, 0.1) \
+            if weight_initializer is None else weight_initializer
+        self._forget_bias_initializer = tf.keras.initializers.Constant(1.) \
+            if forget_bias_initializer is None else forget_bias_initializer
+
+    def _packed_initializer(self, packed_name):
+        """Return the initializer of a packed weight, initializing each part like the corresponding per-gate weight."""
+        initializers = [self._forget_bias_initializer if weight_name == glstm._B_F else
+                        self._bias_initializer if weight_name in glstm._BIASES else self._weight_initializer
+                        for weight_name in glstm._PACKED_WEIGHTS[packed_name]]
+
+        def initializer(shape, dtype=None):
+            part_shape = list(shape[:-1]) + [shape[-1] // len(initializers)]
+            return tf.concat([i(part_shape, dtype=dtype) for i in initializers], axis=-1)
+        return initializer
+
+    def build(self, input_shape):
+        """Create the packed weights.
+
+        Args:
+          input_shape: The shape of the inputs of all nodes, [number_of_nodes, batch_size, input_size].
+        """
+        input_size = int(input_shape[-1])
+        part_shapes = {glstm._W_UFCO: [input_size, self.num_units],
+                       glstm._U_UFCO: [self.num_units, self.num_units],
+                       glstm._U_UCON: [self.num_units, self.num_units],
+                       glstm._U_FN: [self.num_units, self.num_units],
+                       glstm._B_UFCO: [self.num_units]}
+        self.packed_weights = {}
+        for packed_name, weight_names in glstm._PACKED_WEIGHTS.items():
+            shape = part_shapes[packed_name][:-1] + [self.num_units * len(weight_names)]
+            if packed_name not in self._shared_packed_weights:
+                shape = [self.num_nodes] + shape
+            self.packed_weights[packed_name] = self.add_weight(name=packed_name, shape=shape,
+                                                               initializer=self._packed_initializer(packed_name))
+        self.built = True
+
+    def _node_weights(self, node_index):
+        """Return the packed weights of the nodes given by node_index, or of all nodes if node_index is None."""
+        return {name: w if node_index is None or name in self._shared_packed_weights else tf.gather(w, node_index)
+                for name, w in self.packed_weights.items()}
+
+    def input_terms(self, inputs, node_index=None):
+        """Calculate the input terms f_{i,t+1} * W + b of all gates of a stack of nodes.
+
+        As they do not depend on the state, they can be reused for every timestep of a constant input.
+
+        Args:
+          inputs: The inputs of the nodes, shaped [nodes, batch_size, input_size].
+          node_index: (optional) The _INDEX values of the nodes. Default: all nodes in _INDEX order.
+
+        Returns:
+          A Tensor shaped [nodes, batch_size, 4 * num_units].
+        """
+        weights = self._node_weights(node_index)
+        return _node_linear(inputs, weights[glstm._W_UFCO]) + _node_bias(weights[glstm._B_UFCO])
+
+    def call(self, input_terms, m_i, h_i, m_j, h_j, node_index=None, neighbour_count=None):
+        """Run one Graph LSTM update for a stack of nodes, see graph_lstm._graphlstm_update.
+
+        Args:
+          input_terms: The input terms of the nodes, as returned by input_terms.
+          m_i: The memory states of the nodes, shaped [nodes, batch_size, num_units].
+          h_i: The hidden states of the nodes, shaped [nodes, batch_size, num_units].
+          m_j: The most recent memory states of the neighbours of each node,
+            shaped [nodes, neighbours, batch_size, num_units].
+          h_j: The most recent hidden states of the neighbours of each node,
+            shaped [nodes, neighbours, batch_size, num_units].
+          node_index: (optional) The _INDEX values of the nodes. Default: all nodes in _INDEX order.
+          neighbour_count: (optional) The number of actual neighbours of each node, shaped [nodes].
+            Neighbours beyond that count are padding and get masked. Default: all neighbours are actual neighbours.
+
+        Returns:
+          The new memory and hidden states, each shaped [nodes, batch_size, num_units].
+        """
+        weights = self._node_weights(node_index)
+
+        # f_{i,t+1} * W + b and h_{i,t} * U for gates u, f, c, o
+        u_terms, f_terms, c_terms, o_terms = tf.split(input_terms + _node_linear(h_i, weights[glstm._U_UFCO]),
+                                                      4, axis=-1)
+
+        if neighbour_count is not None:
+            neighbour_mask = tf.sequence_mask(neighbour_count, maxlen=tf.shape(h_j)[1], dtype=h_j.dtype)
+            neighbour_mask = neighbour_mask[:, :, tf.newaxis, tf.newaxis]
+            neighbour_divisor = tf.reshape(tf.cast(tf.maximum(neighbour_count, 1), h_j.dtype), [-1, 1, 1])
+
+        def neighbour_mean(t):
+            if neighbour_count is None:
+                return tf.reduce_mean(t, axis=1)
+            return tf.reduce_sum(t * neighbour_mask, axis=1) / neighbour_divisor
+
+        # Eq. 1: averaged hidden states for neighbouring nodes h^-_{i,t}
+        h_j_avg = neighbour_mean(h_j)
+        un_terms, cn_terms, on_terms = tf.split(_node_linear(h_j_avg, weights[glstm._U_UCON]), 3, axis=-1)
+
+        # Eq. 2
+        g_u = tf.sigmoid(u_terms + un_terms)
+        g_fij = tf.sigmoid(tf.expand_dims(tf.split(input_terms, 4, axis=-1)[1], 1)
+                           + _node_linear(h_j, weights[glstm._U_FN]))
+        g_fi = tf.sigmoid(f_terms)
+        g_o = tf.sigmoid(o_terms + on_terms)
+        g_c = tf.tanh(c_terms + cn_terms)
+
+        m_i_new = neighbour_mean(g_fij * m_j) + g_fi * m_i + g_u * g_c
+        h_i_new = tf.tanh(g_o * m_i_new)
+        return m_i_new, h_i_new
+
+    def load_packed_weights(self, packed_weights):
+        """Assign the packed weights of all nodes.
+
+        Weights shared between all nodes in packed_weights are copied to every node if the cell holds them
+        stacked. Stacked weights can only be loaded into a shared weight if they are identical for all nodes.
+
+        Args:
+          packed_weights: A dict of packed weight name:numpy array pairs, as returned by
+            graph_lstm.read_packed_weights.
+
+        Raises:
+          ValueError: If a stacked weight differing between nodes is loaded into a shared weight,
+            or if the shapes do not match.
+        """
+        for packed_name, value in packed_weights.items():
+            weight = self.packed_weights[packed_name]
+            if len(weight.shape) == value.ndim + 1:
+                value = np.broadcast_to(value, weight.shape)
+            elif len(weight.shape) == value.ndim - 1:
+                if not np.all(value == value[:1]):
+                    raise ValueError("Weight '%s' differs between nodes, but is shared between all nodes of %s."
+                                     % (packed_name, self.name))
+                value = value[0]
+            if tuple(weight.shape) != value.shape:
+                raise ValueError("Weight '%s' of %s has shape %s, but the value to be loaded has shape %s."
+                                 % (packed_name, self.name, tuple(weight.shape), value.shape))
+            weight.assign(value)
+
+
+class GraphLSTMNet(tf.keras.layers.Layer):
+    """Graph LSTM network, as a Keras layer.
+
+    The TensorFlow 2 equivalent of graph_lstm.graph_lstm: the network runs for a number of timesteps on the same
+    input, and returns the output of the last timestep. The input terms of all gates are thus computed once,
+    outside of the time loop (see graph_lstm.GraphLSTMNet.run_with_constant_input). The time loop runs under
+    tf.function, compiled by XLA if jit_compile is set.
+
+    Example:
+        net = GraphLSTMNet(HAND_GRAPH_HANDS2017, num_units=3, timesteps=2, jit_compile=True)
+        net.load_checkpoint("model.ckpt", "rnn/GLSTM_layer_1")
+        refined_predictions = net(predictions)
+    """
+
+    def __init__(self, nxgraph, num_units=None, shared_weights=glstm.ALL_SHARED,
+                 update_schedule=glstm.LEVEL_SCHEDULE, timesteps=1, normalize=False, residual_connection=False,
+                 jit_compile=False, confidence_dict=None, index_dict=None, **kwargs):
+        """Create a Graph LSTM network.
+
+        Args:
+          nxgraph: A graph_lstm.GraphLSTMNet graph, or something it can be created from by
+            graph_lstm.GraphLSTMNet.create_nxgraph. Only its structure, confidences and indices are used.
+          num_units (int): The number of units of each node. Required if nxgraph holds no cells.
+          shared_weights: A list of the weights that will be shared between all nodes. Default: ALL_SHARED.
+          update_schedule: graph_lstm.LEVEL_SCHEDULE, graph_lstm.SYNCHRONOUS_SCHEDULE or
+            graph_lstm.COLOURING_SCHEDULE. SEQUENTIAL_SCHEDULE yields the same results as LEVEL_SCHEDULE
+            and is run as such. Default: LEVEL_SCHEDULE.
+          timesteps (int): The default number of timesteps. Default: 1.
+          normalize (bool): If the input gets normalized, as for graph_lstm.graph_lstm. Default: False.
+          residual_connection (bool): If a residual connection is added, as for graph_lstm.graph_lstm.
+            Default: False.
+          jit_compile (bool): If the time loop is compiled by XLA. Default: False.
+          confidence_dict (dict): (optional) Passed to graph_lstm.GraphLSTMNet.create_nxgraph.
+          index_dict (dict): (optional) Passed to graph_lstm.GraphLSTMNet.create_nxgraph.
+          **kwargs: Keyword arguments passed to tf.keras.layers.Layer, e.g. name.
+
+        Raises:
+          ValueError: If update_schedule is unknown, num_units cannot be determined, or a confidence value
+            is a Tensor (dynamic update orders are not supported).
+        """
+        super(GraphLSTMNet, self).__init__(**kwargs)
+        if update_schedule not in glstm._SCHEDULES:
+            raise ValueError("Unknown update_schedule '%s', expected one of %s."
+                             % (update_schedule, sorted(glstm._SCHEDULES)))
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(nxgraph, num_units=num_units, confidence_dict=confidence_dict,
+                                                    index_dict=index_dict, verify=False)
+        if num_units is None:
+            num_units_set = {nxgraph.nodes[n][glstm._CELL].output_size for n in nxgraph}
+            if len(num_units_set) != 1:
+                raise ValueError("Must specify num_units if the cells of nxgraph differ in their number of units, "
+                                 "but found %r." % sorted(num_units_set))
+            num_units = num_units_set.pop()
+        if update_schedule == glstm.SEQUENTIAL_SCHEDULE:
+            update_schedule = glstm.LEVEL_SCHEDULE
+        self._plan = glstm.GraphLSTMNet(nxgraph, update_schedule=update_schedule)._get_plan()
+        if self._plan.confidence is not None:
+            raise ValueError("%s does not support confidence values given as Tensors." % type(self).__name__)
+
+        self.node_names = sorted(nxgraph, key=self._plan.index.get)
+        self.num_units = num_units
+        self.update_schedule = update_schedule
+        self.timesteps = timesteps
+        self.normalize = normalize
+        self.residual_connection = residual_connection
+        self.jit_compile = jit_compile
+        self.cell = GraphLSTMCell(num_units, len(self.node_names), shared_weights=shared_weights,
+                                  name="graph_lstm_cell")
+        self._run = tf.function(self._iterate, jit_compile=jit_compile)
+
+    def build(self, input_shape):
+        """Create the weights of the cell.
+
+        Args:
+          input_shape: The shape of the inputs, [batch_size, number_of_nodes, input_size].
+        """
+        self.cell.build([len(self.node_names), None, input_shape[-1]])
+        self.built = True
+
+    def zero_state(self, batch_size, dtype=tf.float32):
+        """Return the zero state, shaped [batch_size, number_of_nodes, 2, num_units]
+        (see graph_lstm.GraphLSTMNet's packed_state)."""
+        return tf.zeros([batch_size, len(self.node_names), 2, self.num_units], dtype=dtype)
+
+    def _step(self, m, h, wave_input_terms):
+        """Update the packed memory and hidden states [number_of_nodes, batch_size, num_units] of all nodes once,
+        wave by wave, see graph_lstm.GraphLSTMNet._vectorised_step."""
+        num_nodes = len(self.node_names)
+        for wave, input_terms in zip(self._plan.waves, wave_input_terms):
+            covers_all_nodes = glstm._wave_covers_all_nodes(wave, num_nodes)
+            m_i_new, h_i_new = self.cell(input_terms,
+                                         m if covers_all_nodes else tf.gather(m, wave.index),
+                                         h if covers_all_nodes else tf.gather(h, wave.index),
+                                         tf.gather(m, wave.neighbour_index),
+                                         tf.gather(h, wave.neighbour_index),
+                                         node_index=None if covers_all_nodes else wave.index,
+                                         neighbour_count=wave.neighbour_count)
+            if covers_all_nodes:
+                m, h = m_i_new, h_i_new
+                continue
+            # write back: every node keeps its row, except for the nodes of this wave, which get the new one
+            write_back_index = np.arange(num_nodes, dtype=np.int32)
+            write_back_index[wave.index] = num_nodes + np.arange(len(wave.nodes), dtype=np.int32)
+            m = tf.gather(tf.concat([m, m_i_new], 0), write_back_index)
+            h = tf.gather(tf.concat([h, h_i_new], 0), write_back_index)
+        return m, h
+
+    def _iterate(self, inputs, state, timesteps):
+        """Run the Graph LSTM for a number of timesteps on the same input.
+
+        Args:
+          inputs: The inputs, shaped [batch_size, number_of_nodes, input_size].
+          state: The initial state, shaped [batch_size, number_of_nodes, 2, num_units].
+          timesteps: The number of timesteps, a scalar int32 Tensor running a tf.while_loop, or an int
+            running the unrolled time loop (used with jit_compile).
+
+        Returns:
+          The output of the last timestep and the final state.
+        """
+        num_nodes = len(self.node_names)
+        x = tf.transpose(inputs, [1, 0, 2])
+        wave_input_terms = [self.cell.input_terms(x, None) if glstm._wave_covers_all_nodes(wave, num_nodes) else
+                            self.cell.input_terms(tf.gather(x, wave.index), wave.index)
+                            for wave in self._plan.waves]
+        m, h = tf.unstack(tf.transpose(state, [2, 1, 0, 3]), num=2)
+        if isinstance(timesteps, int):
+            # unrolled, as the loop state XLA keeps for the gradients of a while loop cannot leave the compiled
+            # function, i.e. the gradients could only be calculated within the same compiled function
+            for _ in range(timesteps):
+                m, h = self._step(m, h, wave_input_terms)
+        else:
+            _, m, h = tf.while_loop(lambda time, m, h: time < timesteps,
+                                    lambda time, m, h: (time + 1, *self._step(m, h, wave_input_terms)),
+                                    (tf.constant(0), m, h))
+        return tf.transpose(h, [1, 0, 2]), tf.transpose(tf.stack([m, h]), [2, 1, 0, 3])
+
+    def call(self, inputs, initial_state=None, timesteps=None, return_state=False):
+        """Run the Graph LSTM on inputs.
+
+        Args:
+          inputs: A Tensor shaped [batch_size, number_of_nodes, input_size], the index of each node
+            corresponding to its _INDEX value.
+          initial_state: (optional) The state to start from, shaped [batch_size, number_of_nodes, 2, num_units].
+            Default: the zero state.
+          timesteps: (optional) The number of timesteps, overriding the default. An int, or a scalar int32 Tensor
+            unless jit_compile is set (every new number of timesteps then compiles the network again).
+          return_state (bool): If the final state is returned as well. Default: False.
+
+        Returns:
+          The output of the last timestep, shaped [batch_size, number_of_nodes, num_units],
+          and the final state if return_state is set.
+
+        Raises:
+          ValueError: If the inputs do not have 3 dimensions or do not match the number of nodes,
+            or if timesteps is a Tensor without constant value and jit_compile is set.
+        """
+        if len(inputs.shape) != 3 or inputs.shape[1] != len(self.node_names):
+            raise ValueError("Input shape mismatch: expected [batch_size, %i, input_size], but saw %s."
+                             % (len(self.node_names), inputs.shape))
+        timesteps = self.timesteps if timesteps is None else timesteps
+        if self.jit_compile:
+            if tf.get_static_value(timesteps) is None:
+                raise ValueError("With jit_compile, timesteps must be known when calling %s, but found %s."
+                                 % (self.name, timesteps))
+            timesteps = int(tf.get_static_value(timesteps))
+        else:
+            timesteps = tf.convert_to_tensor(timesteps, tf.int32)
+        rescon_inputs = inputs
+        if self.normalize:
+            inputs, undo_scaling = _normalize_for_graph_lstm(inputs)
+        if initial_state is None:
+            initial_state = self.zero_state(tf.shape(inputs)[0], inputs.dtype)
+
+        output, state = self._run(inputs, initial_state, timesteps)
+
+        if self.normalize:
+            output = undo_scaling(output)
+        if self.residual_connection:
+            output = rescon_inputs + output
+        return (output, state) if return_state else output
+
+    def load_checkpoint(self, checkpoint_path, net_scope):
+        """Load the weights of a graph_lstm.GraphLSTMNet from a checkpoint.
+
+        Checkpoints of GraphLSTMCell and PackedGraphLSTMCell networks, with any shared_weights template, as well
+        as of networks with stacked weights are supported (see graph_lstm.read_packed_weights). The network is
+        built from the checkpoint's weight shapes if it has not been built yet.
+
+        Args:
+          checkpoint_path: The path of the checkpoint, as passed to tf.train.Saver.restore.
+          net_scope (str): The variable scope of the GraphLSTMNet, e.g. "rnn/GLSTM_layer_1".
+
+        Raises:
+          KeyError: If a weight of a node can neither be found in its node scope nor in the shared scope.
+          ValueError: If the weights do not fit the network, see GraphLSTMCell.load_packed_weights.
+        """
+        reader = tf.train.load_checkpoint(checkpoint_path)
+        packed_weights, _ = glstm.read_packed_weights(reader, net_scope, self.node_names)
+        if not self.built:
+            self.build([None, len(self.node_names), packed_weights[glstm._W_UFCO].shape[-2]])
+        self.cell.load_packed_weights(packed_weights)
+
+
+def _normalize_for_graph_lstm(tensor):
+    """TensorFlow 2 equivalent of graph_lstm.normalize_for_graph_lstm.
+
+    Returns: The normalized Tensor, and a function to undo scaling.
+    """
+    max_dim = tf.reduce_max(tensor, axis=1, keepdims=True)
+    min_dim = tf.reduce_min(tensor, axis=1, keepdims=True)
+    diff_dim = max_dim - min_dim
+    max_diff = tf.reduce_max(diff_dim, axis=2, keepdims=True)
+    normalized_tensor = (tensor - min_dim - diff_dim / 2) / max_diff
+
+    def undo_scaling(t):
+        return t * max_diff
+
+    return normalized_tensor, undo_scaling
+
+
+def _node_linear(x, w):
+    """Linear map x * w for a stack of nodes, x shaped [nodes, ..., in], w shaped [in, out] or [nodes, in, out]."""
+    x_shape = tf.shape(x)
+    in_size, out_size = w.shape[-2], w.shape[-1]
+    if len(w.shape) == 2:
+        res = tf.matmul(tf.reshape(x, [-1, in_size]), w)
+    else:
+        res = tf.matmul(tf.reshape(x, [x_shape[0], -1, in_size]), w)
+    return tf.reshape(res, tf.concat([x_shape[:-1], [out_size]], 0))
+
+
+def _node_bias(b):
+    """Reshape a bias shaped [out] or [nodes, out] to be broadcastable against [nodes, batch_size, out]."""
+    return b if len(b.shape) == 1 else b[:, tf.newaxis, :]
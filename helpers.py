@@ -9,6 +9,9 @@ import numpy as np
 # tensorflow collection name for saving important tensors
 COLLECTION = "input-output-groundtruth-trainstep-loss"
 
+# tensorflow collection name for the input and output tensors of inference graphs (see export_inference_graph.py)
+INFERENCE_COLLECTION = "inference-input-output"
+
 # each cell has three units, one per dimension (x, y, z)
 GLSTM_NUM_UNITS = 3
 
@@ -119,6 +122,11 @@ def predictions_npy_name(model_name, epoch):
     return "predictions_%s%s.npy" % (model_name, (("_epoch" + str(epoch)) if epoch is not None else ""))
 
 
+# create path for storing the inference graph exported from a checkpoint (see export_inference_graph.py)
+def inference_graph_path(checkpoint_path):
+    return checkpoint_path + ".inference.meta"
+
+
 def calc_groundtruth_poses_npy(dataset_root, container_name_list):
     """Returns all groundtruth poses for the given dataset and container name list.
     """
@@ -36,10 +36,23 @@ checkpoint_dir = r"/home/matthias-k/GraphLSTM_data/%s" % prefix
 
 # number of timesteps to be simulated (each step, the same data is fed)
 graphlstm_timesteps = 2
+# Graph LSTM update schedule, glstm.SYNCHRONOUS_SCHEDULE updates all nodes at once from the previous timestep's
+# neighbour states instead of updating them one after another, glstm.COLOURING_SCHEDULE updates the nodes of one colour
+# class (no two of them neighbours) at once; both change the learned weights and get their own model name
+graphlstm_update_schedule = glstm.SEQUENTIAL_SCHEDULE  # ADAPT HERE
+# if True, the nodes of each sample are updated in order of increasing MHP variance of their joints,
+# instead of in one fixed order for all samples
+graphlstm_dynamic_confidence = False  # ADAPT HERE
 learning_rate = 1e-3
 
 model_name = "regen_MHP%ihyps_pretrained_epoch%i_lrx0.1_graphlstmt%i_updateorder-randomorder_rescon_adamlr%f" % \
              (hypotheses_count, load_epoch, graphlstm_timesteps, learning_rate)
+if graphlstm_update_schedule == glstm.SYNCHRONOUS_SCHEDULE:
+    model_name += "_synchronous"
+elif graphlstm_update_schedule == glstm.COLOURING_SCHEDULE:
+    model_name += "_colouring"
+if graphlstm_dynamic_confidence:
+    model_name += "_dynamicconfidence"
 
 checkpoint_dir += r"/%s" % model_name
 tensorboard_dir = checkpoint_dir + r"/tensorboard"
@@ -98,13 +111,26 @@ mhp_one_output = mhp_mean
 
 print("Building GraphLSTM network …")
 
+# number of timesteps, can be overridden at runtime by feeding a different value
+graphlstm_timesteps_tensor = glstm.timesteps_placeholder(graphlstm_timesteps)
+
+# per-sample confidence of each joint: its negative MHP variance, summed over all coordinates
+if graphlstm_dynamic_confidence:
+    mhp_joint_confidence = tf.unstack(-tf.reduce_sum(mhp_variance, axis=-1), axis=1)
+    confidence_dict = {node_name: mhp_joint_confidence[index]
+                       for node_name, index in HAND_GRAPH_HANDS2017_INDEX_DICT.items()}
+else:
+    confidence_dict = None
+
 # initialize Graph LSTM
 # since a well-defined node order is necessary to correctly communicate with the Region Ensemble network,
 # the graph must be created manually
 nxgraph = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017,
                                             num_units=GLSTM_NUM_UNITS,
+                                            confidence_dict=confidence_dict,
                                             index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
-graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED)
+graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED,
+                                    update_schedule=graphlstm_update_schedule)
 
 # not necessary, as pretrained model already has output shape [ batch size, 21, 3 ]
 # # overall output dimensions: batch_size, number_of_nodes, output_size
@@ -114,18 +140,12 @@ graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONN
 mhp_one_output_tensor_normalized, undo_scaling = glstm.normalize_for_graph_lstm(mhp_one_output)
 
 
-# input dimensions of GraphLSTMNet: batch_size, max_time, number_of_nodes, input_size
-graphlstm_input_tensor = graph_lstm_net.reshape_input_for_dynamic_rnn(mhp_one_output_tensor_normalized,
-                                                                      timesteps=graphlstm_timesteps)
-
-dynrnn_glstm_output_full, dynrnn_glstm_state = tf.nn.dynamic_rnn(graph_lstm_net,
-                                                                 inputs=graphlstm_input_tensor,
-                                                                 dtype=tf.float32)
-
-# reorder dimensions to [batch_size, max_time, number_of_nodes, output_size]
-glstm_output_full = graph_lstm_net.transpose_output_from_cells_first_to_batch_first(dynrnn_glstm_output_full)
-# extract last timestep from output
-glstm_output = tf.unstack(glstm_output_full, axis=1)[-1]
+# run Graph LSTM on the same input for every timestep, keeping only the output of the last timestep
+# output dimensions: batch_size, number_of_nodes, output_size
+glstm_output, glstm_state = graph_lstm_net.run_with_constant_input(mhp_one_output_tensor_normalized,
+                                                                   graphlstm_timesteps_tensor,
+                                                                   dtype=tf.float32,
+                                                                   final_output_only=True)
 # denormalize GraphLSTM output
 glstm_output_rescaled = undo_scaling(glstm_output)
 
@@ -41,10 +41,21 @@ pretrained_checkpoint_dir = r"/home/matthias-k/GraphLSTM_data/%s/%s" % \
 
 # number of timesteps to be simulated (each step, the same data is fed)
 graphlstm_timesteps = 2
+# Graph LSTM update schedule, glstm.SYNCHRONOUS_SCHEDULE updates all nodes at once from the previous timestep's
+# neighbour states instead of updating them one after another, glstm.COLOURING_SCHEDULE updates the nodes of one colour
+# class (no two of them neighbours) at once; both change the learned weights and get their own model name
+graphlstm_update_schedule = glstm.SEQUENTIAL_SCHEDULE  # ADAPT HERE
+# if True, Graph LSTM gate activations are recomputed in the backward pass instead of being stored, which saves memory
+# for higher numbers of timesteps (same results, requires glstm.LEVEL_SCHEDULE or glstm.SYNCHRONOUS_SCHEDULE)
+graphlstm_recompute_activations = False  # ADAPT HERE
 learning_rate = 1e-3
 
 model_name = "regen_MHP%ihyps_pretrained_epoch%i_lrx0.1_graphlstmt%i_rescon_2glstmlayers_adamlr%f" % \
              (hypotheses_count, load_epoch, graphlstm_timesteps, learning_rate)
+if graphlstm_update_schedule == glstm.SYNCHRONOUS_SCHEDULE:
+    model_name += "_synchronous"
+elif graphlstm_update_schedule == glstm.COLOURING_SCHEDULE:
+    model_name += "_colouring"
 
 checkpoint_dir += r"/%s" % model_name
 tensorboard_dir = checkpoint_dir + r"/tensorboard"
@@ -103,6 +114,9 @@ mhp_one_output = mhp_mean
 
 print("Building GraphLSTM network …")
 
+# number of timesteps, can be overridden at runtime by feeding a different value
+graphlstm_timesteps_tensor = glstm.timesteps_placeholder(graphlstm_timesteps)
+
 # FIRST LAYER
 
 # initialize Graph LSTM
@@ -111,7 +125,9 @@ print("Building GraphLSTM network …")
 nxgraph = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017,
                                             num_units=GLSTM_NUM_UNITS,
                                             index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
-graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED, name="GLSTM_layer_1")
+graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED, name="GLSTM_layer_1",
+                                    update_schedule=graphlstm_update_schedule,
+                                    recompute_activations=graphlstm_recompute_activations)
 
 # not necessary, as pretrained model already has output shape [ batch size, 21, 3 ]
 # # overall output dimensions: batch_size, number_of_nodes, output_size
@@ -121,18 +137,12 @@ graph_lstm_net = glstm.GraphLSTMNet(nxgraph, shared_weights=glstm.NEIGHBOUR_CONN
 mhp_one_output_tensor_normalized, undo_scaling = glstm.normalize_for_graph_lstm(mhp_one_output)
 
 
-# input dimensions of GraphLSTMNet: batch_size, max_time, number_of_nodes, input_size
-graphlstm_input_tensor = graph_lstm_net.reshape_input_for_dynamic_rnn(mhp_one_output_tensor_normalized,
-                                                                      timesteps=graphlstm_timesteps)
-
-dynrnn_glstm_output_full, dynrnn_glstm_state = tf.nn.dynamic_rnn(graph_lstm_net,
-                                                                 inputs=graphlstm_input_tensor,
-                                                                 dtype=tf.float32)
-
-# reorder dimensions to [batch_size, max_time, number_of_nodes, output_size]
-glstm_output_full = graph_lstm_net.transpose_output_from_cells_first_to_batch_first(dynrnn_glstm_output_full)
-# extract last timestep from output
-glstm_output = tf.unstack(glstm_output_full, axis=1)[-1]
+# run Graph LSTM on the same input for every timestep, keeping only the output of the last timestep
+# output dimensions: batch_size, number_of_nodes, output_size
+glstm_output, glstm_state = graph_lstm_net.run_with_constant_input(mhp_one_output_tensor_normalized,
+                                                                   graphlstm_timesteps_tensor,
+                                                                   dtype=tf.float32,
+                                                                   final_output_only=True)
 # denormalize GraphLSTM output
 glstm_output_rescaled = undo_scaling(glstm_output)
 
@@ -153,7 +163,8 @@ nxgraph_2 = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017,
                                               num_units=GLSTM_NUM_UNITS,
                                               index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
 graph_lstm_net_2 = glstm.GraphLSTMNet(nxgraph_2, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED,
-                                      name="GLSTM_layer_2")
+                                      name="GLSTM_layer_2", update_schedule=graphlstm_update_schedule,
+                                      recompute_activations=graphlstm_recompute_activations)
 
 # not necessary, as pretrained model already has output shape [ batch size, 21, 3 ]
 # # overall output dimensions: batch_size, number_of_nodes, output_size
@@ -163,18 +174,12 @@ graph_lstm_net_2 = glstm.GraphLSTMNet(nxgraph_2, shared_weights=glstm.NEIGHBOUR_
 residual_merge_1_normalized, undo_scaling_rm1 = glstm.normalize_for_graph_lstm(residual_merge_1)
 
 
-# input dimensions of GraphLSTMNet: batch_size, max_time, number_of_nodes, input_size
-graphlstm_input_tensor_2 = graph_lstm_net_2.reshape_input_for_dynamic_rnn(residual_merge_1_normalized,
-                                                                          timesteps=graphlstm_timesteps)
-
-dynrnn_glstm_output_full_2, dynrnn_glstm_state_2 = tf.nn.dynamic_rnn(graph_lstm_net_2,
-                                                                     inputs=graphlstm_input_tensor_2,
-                                                                     dtype=tf.float32)
-
-# reorder dimensions to [batch_size, max_time, number_of_nodes, output_size]
-glstm_output_full_2 = graph_lstm_net_2.transpose_output_from_cells_first_to_batch_first(dynrnn_glstm_output_full_2)
-# extract last timestep from output
-glstm_output_2 = tf.unstack(glstm_output_full_2, axis=1)[-1]
+# run Graph LSTM on the same input for every timestep, keeping only the output of the last timestep
+# output dimensions: batch_size, number_of_nodes, output_size
+glstm_output_2, glstm_state_2 = graph_lstm_net_2.run_with_constant_input(residual_merge_1_normalized,
+                                                                         graphlstm_timesteps_tensor,
+                                                                         dtype=tf.float32,
+                                                                         final_output_only=True)
 # denormalize GraphLSTM output
 glstm_output_rescaled_2 = undo_scaling_rm1(glstm_output_2)
 
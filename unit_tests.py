@@ -2,11 +2,21 @@
 # run this file whenever changes to graph_lstm.py are made
 
 import graph_lstm as glstm
+import graph_lstm_numpy as glstm_numpy
+import graph_lstm_sparse as glstm_sparse
+import graph_lstm_batched as glstm_batched
+import graph_lstm_profiler as glstm_profiler
+import graph_lstm_recorder as glstm_recorder
+import benchmark
+from helpers import lr_mult, HAND_GRAPH_HANDS2017, HAND_GRAPH_HANDS2017_INDEX_DICT
 import networkx as nx
 import tensorflow as tf
 import numpy as np
 from tensorflow.python.ops import rnn_cell_impl as orig_rci
 import unittest
+import os
+import json
+from itertools import product
 import matplotlib.pyplot as plt
 
 # test graph: 20 nodes
@@ -496,9 +506,53 @@ class TestGraphLSTMNet(tf.test.TestCase):
             np.testing.assert_equal(rc2_actual_result[1], rc2_expected_result[1], err_msg=msg)
 
             # check proper index handling: uninodal GraphLSTM should complain about indices > 0
+            # (in-place changes to the nxgraph only take effect after recompiling the execution plan)
             net._nxgraph.node[cell_name][_INDEX] = 1
+            net.compile_plan()
             self.assertRaises(IndexError, tf.nn.dynamic_rnn, net, input_data_rc2, dtype=tf.float32)
 
+    def test_compile_plan(self):
+        # graph:
+        #
+        #     +---c
+        # a---b   |
+        #     +---d
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph([['a', 'b'], ['b', 'c'], ['b', 'd'], ['c', 'd']], 1,
+                                                    confidence_dict={"c": 1, "d": 0.9, "a": .6, "b": -2})
+        net = glstm.GraphLSTMNet(nxgraph, update_schedule=glstm.LEVEL_SCHEDULE)
+        plan = net._get_plan()
+        self.assertEqual(plan.node_order, ('c', 'd', 'a', 'b'))
+        self.assertEqual(dict(plan.index), {'a': 0, 'b': 1, 'c': 2, 'd': 3})
+        self.assertEqual(dict(plan.neighbours), {'a': (1,), 'b': (0, 2, 3), 'c': (1, 3), 'd': (1, 2)})
+        self.assertEqual([wave.nodes for wave in plan.waves], [('c', 'a'), ('d',), ('b',)])
+        np.testing.assert_equal(plan.waves[0].neighbour_index, [[1, 3], [1, 0]])
+        np.testing.assert_equal(plan.waves[0].neighbour_count, [2, 1])
+        self.assertIsNone(plan.waves[1].neighbour_count)
+
+        # the plan is immutable ...
+        with self.assertRaises(TypeError):
+            plan.index['a'] = 1
+        self.assertRaises(ValueError, plan.waves[0].index.__setitem__, 0, 1)
+        # ... and reused until a different nxgraph is assigned
+        self.assertIs(net._get_plan(), plan)
+        net._nxgraph = glstm.GraphLSTMNet.create_nxgraph([['a', 'b']], 1)
+        self.assertEqual(net._get_plan().node_order, ('a', 'b'))
+
+        # cells resolve their weights only once per graph
+        net._nxgraph = nxgraph
+        init_weights_calls = []
+        cell_a = net._cell('a')
+        original_init_weights = cell_a._init_weights
+        cell_a._init_weights = lambda inputs: init_weights_calls.append(inputs) or original_init_weights(inputs)
+        with tf.Graph().as_default() as graph:
+            input_data = tf.placeholder(tf.float32, [None, None, 4, 1])
+            outputs = [tf.nn.dynamic_rnn(net, input_data, dtype=tf.float32)[0] for _ in range(2)]
+            self.assertEqual(len(init_weights_calls), 1)
+            with self.test_session(graph=graph) as sess:
+                sess.run(tf.global_variables_initializer())
+                output_values = sess.run(outputs, feed_dict={input_data: np.random.rand(2, 3, 4, 1)})
+                np.testing.assert_equal(output_values[0], output_values[1])
+
     @staticmethod
     def get_uninodal_graphlstmnet(cell_name="node0", confidence=0):
         graph = nx.Graph()
@@ -907,6 +961,26 @@ class TestGraphLSTMCell(tf.test.TestCase):
                 np.testing.assert_allclose(actual_result[0], expected_output, rtol=1e-4)
                 np.testing.assert_allclose(actual_result[1], expected_final_state, rtol=1e-4)
 
+    def test_cached_weights(self):
+        with tf.Graph().as_default():
+            cell = glstm.GraphLSTMCell(3, name="cell")
+            with tf.variable_scope("shared", reuse=tf.AUTO_REUSE) as shared_scope:
+                pass
+            inputs = tf.placeholder(tf.float32, [None, 2])
+            weights = cell.get_weights(inputs, shared_scope, glstm.NEIGHBOUR_CONNECTIONS_SHARED)
+            # the same inputs reuse the cached weights
+            self.assertIs(cell.get_weights(inputs, shared_scope, glstm.NEIGHBOUR_CONNECTIONS_SHARED), weights)
+            # other input sizes and dtypes look the variables up again, and do not fit them
+            self.assertRaises(ValueError, cell.get_weights, tf.placeholder(tf.float32, [None, 4]), shared_scope,
+                              glstm.NEIGHBOUR_CONNECTIONS_SHARED)
+            self.assertRaises(ValueError, cell.get_weights, tf.placeholder(tf.float64, [None, 2]), shared_scope,
+                              glstm.NEIGHBOUR_CONNECTIONS_SHARED)
+            # another variable scope gets its own local weights
+            with tf.variable_scope("other"):
+                other_weights = cell._get_or_init_weights(inputs)
+            self.assertTrue(other_weights[glstm._W_U].name.startswith("other/"))
+            self.assertIs(other_weights[glstm._U_CN], weights[glstm._U_CN])
+
 
 class TestGraphLSTMCellAndNet(tf.test.TestCase):
 
@@ -1561,6 +1635,1550 @@ class TestGraphLSTMConvenienceWrapper(tf.test.TestCase):
             np.testing.assert_allclose(wrapper_actual_result, expected_output, atol=1e-5)
 
 
+class TestLevelSchedule(tf.test.TestCase):
+    """Test the vectorised LEVEL_SCHEDULE against the sequential update"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_level_schedule(self):
+        # graph:
+        #
+        #     +---c
+        # a---b   |
+        #     +---d
+
+        # update order: c, d, a, b
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph([['a', 'b'], ['b', 'c'], ['b', 'd'], ['c', 'd']], 1,
+                                                    confidence_dict={"c": 1, "d": 0.9, "a": .6, "b": -2})
+        self.assertEqual(glstm.GraphLSTMNet.level_schedule(nxgraph), [['c', 'a'], ['d'], ['b']])
+
+        # nodes within the same wave must never be neighbours, and every node is part of exactly one wave
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 1, confidence_dict=confidence_dict)
+        waves = glstm.GraphLSTMNet.level_schedule(nxgraph)
+        self.assertEqual(sorted(n for wave in waves for n in wave), sorted(nxgraph))
+        for wave in waves:
+            for node_name in wave:
+                self.assertFalse(set(nx.all_neighbors(nxgraph, node_name)) & set(wave),
+                                 msg="Node '%s' shares a wave with one of its neighbours" % node_name)
+
+    def test_neighbour_index(self):
+        # graph:
+        #
+        #     +---c
+        # a---b   |
+        #     +---d
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph([['a', 'b'], ['b', 'c'], ['b', 'd'], ['c', 'd']], 1)
+        neighbour_index, degrees = glstm.GraphLSTMNet.neighbour_index(nxgraph)
+        np.testing.assert_equal(neighbour_index, [[1, 0, 0], [0, 2, 3], [1, 3, 0], [1, 2, 0]])
+        np.testing.assert_equal(degrees, [1, 3, 2, 2])
+
+    def test_invalid_usage(self):
+        self.assertRaisesRegex(ValueError, "Unknown update_schedule", glstm.GraphLSTMNet, _kickoff_hand, 1,
+                               update_schedule="unknown")
+
+        # the vectorised update is only defined for GraphLSTMCells
+        net = glstm.GraphLSTMNet([['a', 'b']], 1, update_schedule=glstm.LEVEL_SCHEDULE)
+        net._nxgraph.node['a'][_CELL] = DummyReturnTfCell(1)
+        input_data = tf.placeholder(tf.float32, [None, None, 2, 1])
+        self.assertRaisesRegex(TypeError, "requires all cells to be GraphLSTMCells", tf.nn.dynamic_rnn, net,
+                               input_data, dtype=tf.float32)
+
+    def test_same_result_as_sequential_schedule(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        for shared_weights in [glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.NONE_SHARED, glstm.ALL_SHARED]:
+            msg = "shared_weights: %r" % shared_weights
+
+            sequential_result, variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                update_schedule=glstm.SEQUENTIAL_SCHEDULE)
+            # feed the weights of the sequential network into the vectorised one
+            level_result, level_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                update_schedule=glstm.LEVEL_SCHEDULE, variable_values=variable_values)
+
+            # both schedules need to use the same variables
+            self.assertEqual(sorted(variable_values), sorted(level_variable_values), msg=msg)
+            np.testing.assert_allclose(level_result, sequential_result, atol=1e-5, err_msg=msg)
+
+            # the vectorised update also supports concatenated states
+            level_concat_result, _ = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                update_schedule=glstm.LEVEL_SCHEDULE, variable_values=variable_values, state_is_tuple=False)
+            np.testing.assert_allclose(level_concat_result, sequential_result, atol=1e-5, err_msg=msg)
+
+
+class TestSynchronousSchedule(tf.test.TestCase):
+    """Test the vectorised SYNCHRONOUS_SCHEDULE, in which nodes only see their neighbours' states of the last
+    timestep"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_single_wave(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 1, confidence_dict=confidence_dict)
+        net = glstm.GraphLSTMNet(nxgraph, update_schedule=glstm.SYNCHRONOUS_SCHEDULE)
+        plan = net._get_plan()
+        self.assertEqual(len(plan.waves), 1)
+        np.testing.assert_equal(plan.waves[0].index, np.arange(len(confidence_dict)))
+
+        # the update needs neither gathering the nodes' own rows nor writing them back,
+        # only the memory and hidden states of the neighbours are gathered
+        with tf.Graph().as_default():
+            input_data = tf.placeholder(tf.float32, [None, len(confidence_dict), 1])
+            net.run_with_constant_input(input_data, 2, dtype=tf.float32)
+            self.assertEqual(len([op for op in tf.get_default_graph().get_operations()
+                                  if op.type == "GatherV2" and "/wave/" in op.name]), 2)
+
+    def test_same_result_as_numpy(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        checkpoint_path = os.path.join(self.get_temp_dir(), "graph_lstm")
+        npz_path = os.path.join(self.get_temp_dir(), "graph_lstm.npz")
+
+        sequential_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                          input_values)
+        for kwargs in [dict(), dict(constant_input=True), dict(packed_state=True), dict(state_is_tuple=False)]:
+            msg = "kwargs: %r" % kwargs
+            # the synchronous update uses the same variables as the sequential one, but yields different results
+            synchronous_result, synchronous_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, variable_values=variable_values,
+                update_schedule=glstm.SYNCHRONOUS_SCHEDULE, save_checkpoint=checkpoint_path, **kwargs)
+            self.assertEqual(sorted(variable_values), sorted(synchronous_variable_values), msg=msg)
+            self.assertGreater(np.max(np.abs(synchronous_result - sequential_result)), 1e-4, msg=msg)
+
+            glstm_numpy.export_npz(checkpoint_path, npz_path, _kickoff_hand, "rnn/graph_lstm_in_new_graph",
+                                   confidence_dict=confidence_dict, timesteps=2,
+                                   update_schedule=glstm.SYNCHRONOUS_SCHEDULE)
+            model = glstm_numpy.NumpyGraphLSTM(npz_path)
+            self.assertEqual(model.update_schedule, glstm.SYNCHRONOUS_SCHEDULE)
+            np.testing.assert_allclose(model.run(input_values), synchronous_result, rtol=1e-4, atol=1e-4,
+                                       err_msg=msg)
+
+    def test_trainable(self):
+        with tf.Graph().as_default():
+            input_data = tf.placeholder(tf.float32, [None, len(nx.Graph(_kickoff_hand)), 2])
+            output = glstm.graph_lstm(input_data, _kickoff_hand, 2, update_schedule=glstm.SYNCHRONOUS_SCHEDULE,
+                                      shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED, timesteps=3)
+            gradients = tf.gradients(tf.reduce_sum(output), tf.trainable_variables())
+            self.assertTrue(tf.trainable_variables())
+            self.assertNotIn(None, gradients)
+
+
+class TestColouringSchedule(tf.test.TestCase):
+    """Test the vectorised COLOURING_SCHEDULE, which updates colour classes of independent nodes one after
+    another"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_colouring_schedule(self):
+        # graph:
+        #
+        #     +---c
+        # a---b   |
+        #     +---d
+
+        # visiting order: c, d, a, b
+        # colours: c and a 0 (mean confidence 0.8), d 1 (0.9), b 2 (-2)
+        confidence_dict = {"c": 1, "d": 0.9, "a": .6, "b": -2}
+        edges = [['a', 'b'], ['b', 'c'], ['b', 'd'], ['c', 'd']]
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(edges, 1, confidence_dict=confidence_dict)
+        self.assertEqual(glstm.GraphLSTMNet.colouring_schedule(nxgraph), [['d'], ['c', 'a'], ['b']])
+        spec = glstm.GraphSpec.from_edges(edges, 1, confidence_dict=confidence_dict)
+        np.testing.assert_equal(spec.colours(), [1, 2, 1, 0])
+
+        # colour classes are independent, ordered by mean confidence, and the GraphSpec yields the same plan
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(HAND_GRAPH_HANDS2017)}
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017, 1, confidence_dict=confidence_dict,
+                                                    index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
+        net = glstm.GraphLSTMNet(nxgraph, update_schedule=glstm.COLOURING_SCHEDULE)
+        waves = [list(wave.nodes) for wave in net._get_plan().waves]
+        self.assertEqual(sorted(n for wave in waves for n in wave), sorted(nxgraph))
+        for wave in waves:
+            for node_name in wave:
+                self.assertFalse(set(nx.all_neighbors(nxgraph, node_name)) & set(wave),
+                                 msg="Node '%s' shares a colour with one of its neighbours" % node_name)
+        mean_confidence = [np.mean([confidence_dict[n] for n in wave]) for wave in waves]
+        self.assertEqual(mean_confidence, sorted(mean_confidence, reverse=True))
+        spec = glstm.GraphSpec.from_nxgraph(nxgraph, 1)
+        spec_net = glstm.GraphLSTMNet(spec, update_schedule=glstm.COLOURING_SCHEDULE)
+        self.assertEqual([list(wave.nodes) for wave in spec_net._get_plan().waves], waves)
+
+        # the hand graph is updated in a few steps instead of one per node
+        parallelism = net.parallelism()
+        self.assertEqual(parallelism["nodes"], 21)
+        self.assertLessEqual(parallelism["steps"], 4)
+        self.assertEqual(parallelism["wave_sizes"], [len(wave) for wave in waves])
+        self.assertEqual(glstm.GraphLSTMNet(nxgraph).parallelism()["steps"], 21)
+        self.assertEqual(glstm.GraphLSTMNet(nxgraph, update_schedule=glstm.SYNCHRONOUS_SCHEDULE)
+                         .parallelism()["wave_sizes"], [21])
+
+        # colour classes cannot be ordered by confidence Tensors
+        with tf.Graph().as_default():
+            nxgraph = glstm.GraphLSTMNet.create_nxgraph(
+                _kickoff_hand, 1, confidence_dict={n: tf.placeholder(tf.float32) for n in nx.Graph(_kickoff_hand)})
+            self.assertRaisesRegex(ValueError, "static confidence values", glstm.GraphLSTMNet, nxgraph,
+                                   update_schedule=glstm.COLOURING_SCHEDULE)
+
+    def test_same_result_as_numpy(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        checkpoint_path = os.path.join(self.get_temp_dir(), "graph_lstm")
+        npz_path = os.path.join(self.get_temp_dir(), "graph_lstm.npz")
+
+        sequential_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                          input_values)
+        # the colouring update uses the same variables as the sequential one, but yields different results
+        colouring_result, colouring_variable_values = run_graph_lstm_in_new_graph(
+            _kickoff_hand, confidence_dict, input_values, variable_values=variable_values,
+            update_schedule=glstm.COLOURING_SCHEDULE, save_checkpoint=checkpoint_path)
+        self.assertEqual(sorted(variable_values), sorted(colouring_variable_values))
+        self.assertGreater(np.max(np.abs(colouring_result - sequential_result)), 1e-4)
+
+        glstm_numpy.export_npz(checkpoint_path, npz_path, _kickoff_hand, "rnn/graph_lstm_in_new_graph",
+                               confidence_dict=confidence_dict, timesteps=2, update_schedule=glstm.COLOURING_SCHEDULE)
+        model = glstm_numpy.NumpyGraphLSTM(npz_path)
+        self.assertEqual(model.update_schedule, glstm.COLOURING_SCHEDULE)
+        np.testing.assert_allclose(model.run(input_values), colouring_result, rtol=1e-4, atol=1e-4)
+
+
+class TestDynamicConfidence(tf.test.TestCase):
+    """Test GraphLSTMNets with per-sample confidence Tensors against GraphLSTMNets with the confidence values of
+    each sample"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_plan(self):
+        with tf.Graph().as_default():
+            confidence_dict = {n: tf.placeholder(tf.float32, [None]) for n in nx.Graph(_kickoff_hand)}
+            nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 1, confidence_dict=confidence_dict)
+            self.assertTrue(glstm.GraphLSTMNet.is_valid_nxgraph(nxgraph))
+            for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE]:
+                plan = glstm.GraphLSTMNet(nxgraph, update_schedule=update_schedule)._get_plan()
+                # one wave holding all nodes, ordered by index
+                self.assertEqual(len(plan.waves), 1, msg=update_schedule)
+                self.assertEqual([plan.index[n] for n in plan.node_order], list(range(len(nxgraph))))
+                self.assertEqual(plan.confidence, tuple(confidence_dict[n] for n in plan.node_order))
+            # the synchronous update does not depend on the update order
+            plan = glstm.GraphLSTMNet(nxgraph, update_schedule=glstm.SYNCHRONOUS_SCHEDULE)._get_plan()
+            self.assertIsNone(plan.confidence)
+
+            # the per-sample update is only defined for GraphLSTMCells
+            net = glstm.GraphLSTMNet(nxgraph)
+            net._nxgraph.nodes["t0"][_CELL] = DummyReturnTfCell(1)
+            input_data = tf.placeholder(tf.float32, [None, None, len(nxgraph), 1])
+            self.assertRaisesRegex(TypeError, "requires all cells to be GraphLSTMCells", tf.nn.dynamic_rnn, net,
+                                   input_data, dtype=tf.float32)
+
+    def test_same_result_as_static_confidence(self):
+        num_samples = 4
+        input_values = np.random.rand(num_samples, len(nx.Graph(_kickoff_hand)), 2)
+        # per-sample confidence values, and a node without confidence value (i.e. 0 for all samples)
+        confidence_dict = {n: np.random.rand(num_samples) - .5 for n in list(nx.Graph(_kickoff_hand))[1:]}
+
+        for kwargs in [dict(update_schedule=glstm.SEQUENTIAL_SCHEDULE),
+                       dict(update_schedule=glstm.LEVEL_SCHEDULE, shared_weights=glstm.NONE_SHARED),
+                       dict(update_schedule=glstm.LEVEL_SCHEDULE, stacked_weights=True, packed_state=True,
+                            final_output_only=True)]:
+            msg = "kwargs: %r" % kwargs
+            dynamic_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                          input_values, **kwargs)
+            for b in range(num_samples):
+                static_result, static_variable_values = run_graph_lstm_in_new_graph(
+                    _kickoff_hand, {n: c[b] for n, c in confidence_dict.items()}, input_values[b:b + 1],
+                    variable_values=variable_values, **kwargs)
+                self.assertEqual(sorted(variable_values), sorted(static_variable_values), msg=msg)
+                np.testing.assert_allclose(dynamic_result[b:b + 1], static_result, atol=1e-5,
+                                           err_msg=msg + ", sample %i" % b)
+
+        # a scalar confidence Tensor holds the same value for all samples
+        scalar_confidence_dict = {n: c[0] for n, c in confidence_dict.items()}
+        static_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, scalar_confidence_dict,
+                                                                     input_values)
+        dynamic_result, _ = run_graph_lstm_in_new_graph(
+            _kickoff_hand, {n: np.asarray(c) for n, c in scalar_confidence_dict.items()}, input_values,
+            variable_values=variable_values)
+        np.testing.assert_allclose(dynamic_result, static_result, atol=1e-5)
+
+
+class TestPackedGraphLSTMCell(tf.test.TestCase):
+    """Test PackedGraphLSTMCell against GraphLSTMCell"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_invalid_shared_weights(self):
+        # packed weights can only be shared as a whole
+        net = glstm.GraphLSTMNet(_kickoff_hand, 2, shared_weights={glstm._W_U, glstm._U_UN},
+                                 cell_class=glstm.PackedGraphLSTMCell)
+        input_data = tf.placeholder(tf.float32, [None, None, len(net.output_size), 2])
+        self.assertRaisesRegex(ValueError, "can only share all or none of the weights", tf.nn.dynamic_rnn, net,
+                               input_data, dtype=tf.float32)
+
+    def test_pack_weights(self):
+        per_gate_dict = {w: tf.constant(np.random.rand(2, 3)) for ws in glstm._PACKED_WEIGHTS.values() for w in ws}
+        packed_dict = {p: tf.constant(np.random.rand(2, 3 * len(ws))) for p, ws in glstm._PACKED_WEIGHTS.items()}
+        w_ufco = tf.concat([per_gate_dict[w] for w in [glstm._W_U, glstm._W_F, glstm._W_C, glstm._W_O]], -1)
+
+        # shared weights stay as they are, others are stacked, mixing packed and per-gate cells if necessary
+        for weight_dicts, expected_weights in [([packed_dict, packed_dict], packed_dict[glstm._W_UFCO]),
+                                               ([per_gate_dict, per_gate_dict], w_ufco),
+                                               ([per_gate_dict, packed_dict],
+                                                tf.stack([w_ufco, packed_dict[glstm._W_UFCO]]))]:
+            packed_weights = glstm._pack_weights(weight_dicts)
+            with self.test_session():
+                np.testing.assert_equal(packed_weights[glstm._W_UFCO].eval(), expected_weights.eval())
+
+    def test_same_result_as_graph_lstm_cell(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        checkpoint_path = os.path.join(self.get_temp_dir(), "per_gate")
+
+        for shared_weights in [glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.NONE_SHARED, glstm.ALL_SHARED]:
+            per_gate_result, per_gate_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                save_checkpoint=checkpoint_path)
+
+            for update_schedule, state_is_tuple in [(glstm.SEQUENTIAL_SCHEDULE, True),
+                                                    (glstm.SEQUENTIAL_SCHEDULE, False),
+                                                    (glstm.LEVEL_SCHEDULE, True)]:
+                msg = "shared_weights: %r, update_schedule: %s, state_is_tuple: %s" % (shared_weights, update_schedule,
+                                                                                      state_is_tuple)
+                # load the per-gate checkpoint into the packed network
+                packed_result, packed_variable_values = run_graph_lstm_in_new_graph(
+                    _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                    cell_class=glstm.PackedGraphLSTMCell, restore_checkpoint=checkpoint_path,
+                    update_schedule=update_schedule, state_is_tuple=state_is_tuple)
+
+                # the packed network only has packed weights, living in the same scopes as the per-gate weights
+                self.assertEqual(sorted({name.rpartition("/")[0] for name in packed_variable_values}),
+                                 sorted({name.rpartition("/")[0] for name in per_gate_variable_values}), msg=msg)
+                self.assertTrue(all(name.rpartition("/")[2][:-2] in glstm._PACKED_WEIGHTS
+                                    for name in packed_variable_values), msg=msg)
+                self.assertLess(len(packed_variable_values), len(per_gate_variable_values), msg=msg)
+                np.testing.assert_allclose(packed_result, per_gate_result, atol=1e-5, err_msg=msg)
+
+
+class TestFusedGraphLSTMCell(tf.test.TestCase):
+    """Test FusedGraphLSTMCell and its explicit gradient against GraphLSTMCell"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_gradients_as_graph_lstm_cell(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        checkpoint_path = os.path.join(self.get_temp_dir(), "per_gate")
+
+        def run_with_gradients(cell_class, dynamic_confidence=False, **graph_lstm_kwargs):
+            with tf.Graph().as_default():
+                nxgraph = glstm.GraphLSTMNet.create_nxgraph(
+                    _kickoff_hand, 2, cell_class=cell_class,
+                    state_is_tuple=graph_lstm_kwargs.get("state_is_tuple", True),
+                    confidence_dict={n: tf.constant(c, tf.float32) if dynamic_confidence else c
+                                     for n, c in confidence_dict.items()})
+                input_data = tf.constant(input_values, tf.float32)
+                output = glstm.graph_lstm(input_data, nxgraph, name="graph_lstm_in_new_graph", timesteps=2,
+                                          **graph_lstm_kwargs)
+                variables = tf.trainable_variables()
+                gradients = tf.gradients(tf.reduce_sum(tf.sin(output)), variables + [input_data])
+                with tf.Session() as sess:
+                    if os.path.exists(checkpoint_path + ".index"):
+                        glstm.restore_from_per_gate_checkpoint(sess, checkpoint_path)
+                    else:
+                        sess.run(tf.global_variables_initializer())
+                        tf.train.Saver().save(sess, checkpoint_path)
+                    output_value, gradient_values = sess.run([output, gradients])
+                    return output_value, gradient_values[-1], dict(zip([v.op.name for v in variables],
+                                                                       gradient_values))
+
+        # with vectorised update schedules, this covers weights shared between all nodes, per-node weights packed
+        # per wave and stacked weights
+        for shared_weights in [glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.NONE_SHARED, glstm.ALL_SHARED]:
+            checkpoint_path = os.path.join(self.get_temp_dir(), "per_gate_%i" % len(shared_weights))
+            # the level schedule and dynamic confidence Tensors holding the static values yield the results of the
+            # sequential schedule
+            per_gate_results = {update_schedule: run_with_gradients(None, shared_weights=shared_weights,
+                                                                    update_schedule=update_schedule)
+                                for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.SYNCHRONOUS_SCHEDULE]}
+
+            for kwargs in [dict(update_schedule=glstm.SEQUENTIAL_SCHEDULE),
+                           dict(update_schedule=glstm.SEQUENTIAL_SCHEDULE, state_is_tuple=False),
+                           dict(update_schedule=glstm.LEVEL_SCHEDULE),
+                           dict(update_schedule=glstm.SYNCHRONOUS_SCHEDULE),
+                           dict(update_schedule=glstm.LEVEL_SCHEDULE, recompute_activations=True),
+                           dict(update_schedule=glstm.LEVEL_SCHEDULE, dynamic_confidence=True)]:
+                msg = "shared_weights: %r, kwargs: %r" % (shared_weights, kwargs)
+                per_gate_output, per_gate_input_gradient, per_gate_gradients = per_gate_results[
+                    glstm.SYNCHRONOUS_SCHEDULE if kwargs["update_schedule"] == glstm.SYNCHRONOUS_SCHEDULE else
+                    glstm.SEQUENTIAL_SCHEDULE]
+                fused_output, fused_input_gradient, fused_gradients = run_with_gradients(
+                    glstm.FusedGraphLSTMCell, shared_weights=shared_weights, **kwargs)
+
+                np.testing.assert_allclose(fused_output, per_gate_output, atol=1e-5, err_msg=msg)
+                np.testing.assert_allclose(fused_input_gradient, per_gate_input_gradient, atol=1e-5, err_msg=msg)
+                # the gradient of a packed weight is made of the gradients of its parts
+                self.assertEqual(sorted(name.rpartition("/")[0] + "/" + part_name for name in fused_gradients
+                                        for part_name in glstm._PACKED_WEIGHTS[name.rpartition("/")[2]]),
+                                 sorted(per_gate_gradients), msg=msg)
+                for name, gradient in fused_gradients.items():
+                    scope_name, _, packed_name = name.rpartition("/")
+                    np.testing.assert_allclose(
+                        gradient, np.concatenate([per_gate_gradients[scope_name + "/" + part_name]
+                                                  for part_name in glstm._PACKED_WEIGHTS[packed_name]], axis=-1),
+                        atol=1e-5, err_msg=msg + ", weight: %s" % name)
+
+    def test_same_gradients_as_update(self):
+        # the explicit gradient of one update of a stack of nodes against the gradient derived by autodiff,
+        # with padded neighbours masked per node and per sample
+        nodes, neighbours, batch_size, input_size, num_units = 3, 4, 2, 2, 3
+        shapes = {glstm._W_UFCO: [input_size, 4 * num_units],
+                  glstm._U_UFCO: [num_units, 4 * num_units],
+                  glstm._U_UCON: [num_units, 3 * num_units],
+                  glstm._U_FN: [num_units, num_units],
+                  glstm._B_UFCO: [4 * num_units]}
+        for stacked, neighbour_count in product([False, True], [None, [4, 1, 2], [[4, 3], [1, 2], [2, 1]]]):
+            msg = "stacked: %s, neighbour_count: %r" % (stacked, neighbour_count)
+            with tf.Graph().as_default():
+                weights = {name: tf.constant(np.random.uniform(-.5, .5, ([nodes] if stacked else []) + shape),
+                                             tf.float32)
+                           for name, shape in shapes.items()}
+                x, m_i, h_i = [tf.constant(np.random.rand(nodes, batch_size, size), tf.float32)
+                               for size in [input_size, num_units, num_units]]
+                m_j, h_j = [tf.constant(np.random.rand(nodes, neighbours, batch_size, num_units), tf.float32)
+                            for _ in range(2)]
+                differentiated = [x, m_i, h_i, m_j, h_j] + [weights[name] for name in sorted(weights)]
+                results = []
+                for update in [glstm._graphlstm_update, glstm._fused_graphlstm_update]:
+                    m_i_new, h_i_new = update(glstm._graphlstm_input_terms(x, weights), m_i, h_i, m_j, h_j, weights,
+                                              None if neighbour_count is None else
+                                              tf.constant(neighbour_count, tf.int32))
+                    loss = tf.reduce_sum(tf.sin(m_i_new)) + tf.reduce_sum(tf.cos(h_i_new))
+                    results.append([m_i_new, h_i_new] + tf.gradients(loss, differentiated))
+                with tf.Session() as sess:
+                    autodiff_results, fused_results = sess.run(results)
+            for name, fused_result, autodiff_result in zip(
+                    ["m_i_new", "h_i_new", "x", "m_i", "h_i", "m_j", "h_j"] + sorted(weights), fused_results,
+                    autodiff_results):
+                np.testing.assert_allclose(fused_result, autodiff_result, atol=1e-6, err_msg=msg + ", " + name)
+            if neighbour_count is not None:
+                # padded neighbours get no gradient: node 1 has one neighbour in the first sample
+                m_j_gradient = fused_results[5]
+                self.assertFalse(np.any(m_j_gradient[1, 1:, 0]), msg=msg)
+                self.assertTrue(np.all(m_j_gradient[0, :3]), msg=msg)
+
+    def test_smaller_gradient_graph(self):
+        gradient_op_counts = []
+        for cell_class in [glstm.PackedGraphLSTMCell, glstm.FusedGraphLSTMCell]:
+            with tf.Graph().as_default() as graph:
+                input_data = tf.placeholder(tf.float32, [None, len(nx.Graph(_kickoff_hand)), 2])
+                output = glstm.graph_lstm(input_data, _kickoff_hand, 2, cell_class=cell_class,
+                                          update_schedule=glstm.LEVEL_SCHEDULE)
+                op_count = len(graph.get_operations())
+                tf.gradients(tf.reduce_sum(output), tf.trainable_variables())
+                gradient_op_counts.append(len(graph.get_operations()) - op_count)
+        self.assertLess(gradient_op_counts[1], gradient_op_counts[0])
+
+
+class TestConstantInput(tf.test.TestCase):
+    """Test GraphLSTMNet.run_with_constant_input against feeding copies of the input to tf.nn.dynamic_rnn"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_dynamic_rnn(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        for update_schedule, cell_class in [(glstm.SEQUENTIAL_SCHEDULE, None), (glstm.LEVEL_SCHEDULE, None),
+                                            (glstm.LEVEL_SCHEDULE, glstm.PackedGraphLSTMCell)]:
+            msg = "update_schedule: %s, cell_class: %s" % (update_schedule, cell_class)
+            kwargs = dict(shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED, update_schedule=update_schedule,
+                          cell_class=cell_class)
+
+            dynamic_rnn_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                              input_values, **kwargs)
+            constant_input_result, constant_input_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, variable_values=variable_values, constant_input=True,
+                **kwargs)
+
+            self.assertEqual(sorted(variable_values), sorted(constant_input_variable_values), msg=msg)
+            np.testing.assert_allclose(constant_input_result, dynamic_rnn_result, atol=1e-5, err_msg=msg)
+
+    def test_input_terms_hoisted(self):
+        # for vectorised schedules, the only matrix multiplications left in the time loop are those with the states
+        with tf.Graph().as_default():
+            net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=glstm.LEVEL_SCHEDULE)
+            input_data = tf.placeholder(tf.float32, [None, len(net.output_size), 2])
+            outputs, final_state = net.run_with_constant_input(input_data, 3, dtype=tf.float32)
+            self.assertEqual(len(outputs), len(net.output_size))
+            self.assertEqual(outputs[0].get_shape().as_list(), [None, 3, 2])
+            matmuls_in_loop = [op for op in tf.get_default_graph().get_operations()
+                               if op.type in ("MatMul", "BatchMatMul") and op._control_flow_context is not None]
+            self.assertEqual(len(matmuls_in_loop), 3 * len(net._get_plan().waves))
+            self.assertRaisesRegex(ValueError, "dtype must be specified", net.run_with_constant_input, input_data, 3)
+
+
+class TestRuntimeTimesteps(tf.test.TestCase):
+    """Test graph_lstm with the number of timesteps fed at runtime against graph_lstm with fixed timesteps"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_fixed_timesteps(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        for kwargs in [dict(), dict(update_schedule=glstm.LEVEL_SCHEDULE, constant_input=True)]:
+            with tf.Graph().as_default():
+                nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+                input_data = tf.placeholder(tf.float32, [None, len(confidence_dict), 2])
+                timesteps = glstm.timesteps_placeholder(2)
+                self.assertEqual(tf.get_collection(glstm.TIMESTEPS_COLLECTION), [timesteps])
+                output = glstm.graph_lstm(input_data, nxgraph, timesteps=timesteps, normalize=True,
+                                          residual_connection=True, **kwargs)
+                variables = tf.global_variables()
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    variable_values = dict(zip([v.name for v in variables], sess.run(variables)))
+                    results = {t: sess.run(output, feed_dict={input_data: input_values, timesteps: t})
+                               for t in [1, 3]}
+                    # not feeding the placeholder runs the default number of timesteps
+                    results[2] = sess.run(output, feed_dict={input_data: input_values})
+
+            for t, result in results.items():
+                msg = "kwargs: %r, timesteps: %i" % (kwargs, t)
+                with tf.Graph().as_default():
+                    nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+                    input_data = tf.placeholder(tf.float32, [None, len(confidence_dict), 2])
+                    output = glstm.graph_lstm(input_data, nxgraph, timesteps=t, normalize=True,
+                                              residual_connection=True, **kwargs)
+                    variables = tf.global_variables()
+                    with tf.Session() as sess:
+                        sess.run([v.initializer for v in variables],
+                                 feed_dict={v.initializer.inputs[1]: variable_values[v.name] for v in variables})
+                        np.testing.assert_allclose(sess.run(output, feed_dict={input_data: input_values}), result,
+                                                   atol=1e-5, err_msg=msg)
+
+
+class TestFinalOutputOnly(tf.test.TestCase):
+    """Test graph_lstm keeping only the last timestep's output against graph_lstm collecting all outputs"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_all_outputs(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        # GraphLSTMCells only support tuple states, PackedGraphLSTMCells support concatenated states as well
+        for update_schedule, state_is_tuple, cell_class in [(glstm.SEQUENTIAL_SCHEDULE, True, None),
+                                                            (glstm.SEQUENTIAL_SCHEDULE, False,
+                                                             glstm.PackedGraphLSTMCell),
+                                                            (glstm.LEVEL_SCHEDULE, True, None)]:
+            msg = "update_schedule: %s, state_is_tuple: %s" % (update_schedule, state_is_tuple)
+            kwargs = dict(update_schedule=update_schedule, state_is_tuple=state_is_tuple, cell_class=cell_class,
+                          normalize=True, residual_connection=True)
+            all_outputs_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                              input_values, **kwargs)
+            final_output_result, final_output_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, variable_values=variable_values, final_output_only=True,
+                **kwargs)
+
+            self.assertEqual(sorted(variable_values), sorted(final_output_variable_values), msg=msg)
+            np.testing.assert_allclose(final_output_result, all_outputs_result, atol=1e-5, err_msg=msg)
+
+    def test_no_outputs_collected(self):
+        with tf.Graph().as_default():
+            net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=glstm.LEVEL_SCHEDULE)
+            input_data = tf.placeholder(tf.float32, [None, len(net.output_size), 2])
+            output, final_state = net.run_with_constant_input(input_data, 3, dtype=tf.float32,
+                                                              final_output_only=True)
+            self.assertEqual(output.get_shape().as_list(), [None, len(net.output_size), 2])
+            self.assertEqual(len(final_state), len(net.output_size))
+            self.assertFalse([op for op in tf.get_default_graph().get_operations() if "TensorArray" in op.type])
+
+
+class TestAdaptiveTimesteps(tf.test.TestCase):
+    """Test running GraphLSTMNet until convergence against running it for a fixed number of timesteps"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_fixed_timesteps(self):
+        input_values = np.random.rand(4, len(nx.Graph(_kickoff_hand)), 2) * np.arange(1, 5)[:, np.newaxis, np.newaxis]
+
+        for update_schedule, packed_state in product([glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE], [False, True]):
+            msg = "update_schedule: %s, packed_state: %s" % (update_schedule, packed_state)
+            with tf.Graph().as_default():
+                net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=update_schedule, packed_state=packed_state)
+                input_data = tf.placeholder(tf.float32, [None, *input_values.shape[1:]])
+                tolerance = tf.placeholder_with_default(1e-2, [])
+                output, _, timesteps = net.run_until_converged(input_data, 10, tolerance, dtype=tf.float32)
+                fixed_timesteps = tf.placeholder(tf.int32, [])
+                fixed_output, _ = net.run_with_constant_input(input_data, fixed_timesteps, dtype=tf.float32,
+                                                              final_output_only=True)
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    output_value, timesteps_value = sess.run([output, timesteps], {input_data: input_values})
+                    self.assertTrue(np.all((timesteps_value >= 1) & (timesteps_value <= 10)), msg=msg)
+                    for sample, sample_timesteps in enumerate(timesteps_value):
+                        np.testing.assert_allclose(
+                            output_value[sample],
+                            sess.run(fixed_output, {input_data: input_values[sample:sample + 1],
+                                                    fixed_timesteps: sample_timesteps})[0],
+                            atol=1e-5, err_msg=msg)
+                    # nothing converges without tolerance
+                    np.testing.assert_array_equal(sess.run(timesteps, {input_data: input_values, tolerance: 0}),
+                                                  [10] * len(input_values), err_msg=msg)
+
+    def test_invalid_usage(self):
+        with tf.Graph().as_default():
+            nxgraph = glstm.GraphLSTMNet.create_nxgraph(
+                _kickoff_hand, 2, confidence_dict={n: tf.constant(1.) for n in nx.Graph(_kickoff_hand)})
+            net = glstm.GraphLSTMNet(nxgraph)
+            input_data = tf.placeholder(tf.float32, [None, len(net.output_size), 2])
+            with self.assertRaises(ValueError):
+                net.run_until_converged(input_data, 10, 1e-2)
+            with self.assertRaises(ValueError):
+                net.run_until_converged(input_data, 10, 1e-2, dtype=tf.float32)
+
+
+class TestStreaming(tf.test.TestCase):
+    """Test carrying the GraphLSTMNet state across frames against running all frames' timesteps at once"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_more_timesteps(self):
+        input_values = np.random.rand(3, len(nx.Graph(_kickoff_hand)), 2)
+
+        for update_schedule, packed_state in product([glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE], [False, True]):
+            msg = "update_schedule: %s, packed_state: %s" % (update_schedule, packed_state)
+            with tf.Graph().as_default():
+                net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=update_schedule, packed_state=packed_state)
+                input_data = tf.placeholder(tf.float32, [None, *input_values.shape[1:]])
+                stream_index = tf.placeholder(tf.int32, [None])
+                reset = tf.placeholder_with_default(tf.zeros_like(stream_index, tf.bool), [None])
+                output = net.run_streaming(input_data, stream_index, 3, reset=reset)
+                timesteps = tf.placeholder(tf.int32, [])
+                fixed_output, _ = net.run_with_constant_input(input_data, timesteps, dtype=tf.float32,
+                                                              final_output_only=True)
+                # the stream states are not saved in checkpoints
+                self.assertEqual([v.op.name.rpartition("/")[2] for v in tf.local_variables()], ["stream_state"],
+                                 msg=msg)
+                self.assertFalse(set(tf.local_variables()) & set(tf.global_variables()), msg=msg)
+
+                with tf.Session() as sess:
+                    sess.run([tf.global_variables_initializer(), tf.local_variables_initializer()])
+
+                    def assert_same_result(samples, streams, expected_timesteps, reset_value=None):
+                        feed_dict = {input_data: input_values[samples], stream_index: streams}
+                        if reset_value is not None:
+                            feed_dict[reset] = reset_value
+                        output_value = sess.run(output, feed_dict)
+                        for sample, sample_output, sample_timesteps in zip(samples, output_value,
+                                                                           expected_timesteps):
+                            np.testing.assert_allclose(
+                                sample_output, sess.run(fixed_output, {input_data: input_values[sample:sample + 1],
+                                                                       timesteps: sample_timesteps})[0],
+                                atol=1e-5, err_msg=msg)
+
+                    # feeding the same frame again continues where the last call stopped
+                    for expected_timesteps in range(1, 4):
+                        assert_same_result([2, 0], [2, 0], [expected_timesteps] * 2)
+                    # streams are independent of each other and of the position in the batch
+                    assert_same_result([1, 2], [1, 2], [1, 4])
+                    # a reset stream starts from the zero state
+                    assert_same_result([0, 2], [0, 2], [1, 5], reset_value=[True, False])
+
+
+class TestRecomputeActivations(tf.test.TestCase):
+    """Test recomputing activations in the backward pass against keeping them"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_gradients(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        for update_schedule, final_output_only in product([glstm.LEVEL_SCHEDULE, glstm.SYNCHRONOUS_SCHEDULE],
+                                                          [False, True]):
+            msg = "update_schedule: %s, final_output_only: %s" % (update_schedule, final_output_only)
+            results = []
+            for recompute_activations in [False, True]:
+                with tf.Graph().as_default():
+                    nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+                    input_data = tf.constant(input_values, tf.float32)
+                    output = glstm.graph_lstm(input_data, nxgraph, timesteps=3, update_schedule=update_schedule,
+                                              final_output_only=final_output_only,
+                                              recompute_activations=recompute_activations)
+                    variables = tf.trainable_variables()
+                    gradients = tf.gradients(tf.reduce_sum(tf.square(output)), variables + [input_data])
+                    stack_pushes = [op for op in tf.get_default_graph().get_operations() if op.type == "StackPushV2"]
+                    with tf.Session() as sess:
+                        if results:
+                            sess.run([v.initializer for v in variables],
+                                     feed_dict={v.initializer.inputs[1]: results[0][2][v.name] for v in variables})
+                        else:
+                            sess.run(tf.global_variables_initializer())
+                        gradient_values = sess.run(gradients)
+                        results.append((sess.run(output), gradient_values,
+                                        dict(zip([v.name for v in variables], sess.run(variables))),
+                                        len(stack_pushes)))
+
+            (output, gradient_values, _, stored), (recomputed_output, recomputed_gradient_values, _, recomputed) = \
+                results
+            np.testing.assert_allclose(recomputed_output, output, atol=1e-6, err_msg=msg)
+            for g, recomputed_g in zip(gradient_values, recomputed_gradient_values):
+                np.testing.assert_allclose(recomputed_g, g, atol=1e-5, err_msg=msg)
+            # only the inputs of each timestep are kept for the backward pass
+            self.assertLess(recomputed, stored, msg=msg)
+
+    def test_invalid_usage(self):
+        with tf.Graph().as_default():
+            with self.assertRaises(ValueError):
+                glstm.GraphLSTMNet(_kickoff_hand, 2, recompute_activations=True)
+
+
+class TestPackedState(tf.test.TestCase):
+    """Test GraphLSTMNets with packed state and output tensors against GraphLSTMNets with per-node tensors"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_invalid_usage(self):
+        self.assertRaisesRegex(ValueError, "packed_state requires the cells' states to be tuples",
+                               glstm.GraphLSTMNet, _kickoff_hand, 2, state_is_tuple=False, packed_state=True)
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2)
+        nxgraph.nodes["t0"][glstm._CELL] = glstm.GraphLSTMCell(3)
+        net = glstm.GraphLSTMNet(nxgraph, packed_state=True)
+        self.assertRaisesRegex(ValueError, "same number of units", lambda: net.state_size)
+
+    def test_shapes(self):
+        for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE]:
+            with tf.Graph().as_default():
+                net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=update_schedule, packed_state=True)
+                num_nodes = len(nx.Graph(_kickoff_hand))
+                self.assertEqual(net.state_size.as_list(), [num_nodes, 2, 2])
+                self.assertEqual(net.output_size.as_list(), [num_nodes, 2])
+                input_data = tf.placeholder(tf.float32, [None, 4, num_nodes, 2])
+                output, final_state = tf.nn.dynamic_rnn(net, input_data, dtype=tf.float32)
+                self.assertEqual(output.get_shape().as_list(), [None, 4, num_nodes, 2], msg=update_schedule)
+                self.assertEqual(final_state.get_shape().as_list(), [None, num_nodes, 2, 2], msg=update_schedule)
+
+    def test_same_result_as_tuple_state(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+
+        for update_schedule, constant_input, final_output_only in product(
+                [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE], [False, True], [False, True]):
+            msg = "update_schedule: %s, constant_input: %s, final_output_only: %s" \
+                  % (update_schedule, constant_input, final_output_only)
+            kwargs = dict(update_schedule=update_schedule, constant_input=constant_input,
+                          final_output_only=final_output_only, normalize=True, residual_connection=True)
+            tuple_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict, input_values,
+                                                                        **kwargs)
+            packed_result, packed_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, variable_values=variable_values, packed_state=True,
+                **kwargs)
+
+            self.assertEqual(sorted(variable_values), sorted(packed_variable_values), msg=msg)
+            np.testing.assert_allclose(packed_result, tuple_result, atol=1e-5, err_msg=msg)
+
+
+class TestStackedWeights(tf.test.TestCase):
+    """Test GraphLSTMNets with stacked weights against GraphLSTMNets with per-cell weights"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_invalid_usage(self):
+        self.assertRaisesRegex(ValueError, "requires a vectorised update_schedule", glstm.GraphLSTMNet, _kickoff_hand,
+                               2, stacked_weights=True)
+        with tf.Graph().as_default():
+            net = glstm.GraphLSTMNet(_kickoff_hand, 2, shared_weights={glstm._W_U, glstm._U_UN},
+                                     update_schedule=glstm.LEVEL_SCHEDULE, stacked_weights=True)
+            input_data = tf.placeholder(tf.float32, [None, None, len(net.output_size), 2])
+            self.assertRaisesRegex(ValueError, "can only share all or none of the weights", tf.nn.dynamic_rnn, net,
+                                   input_data, dtype=tf.float32)
+
+    def test_same_result_as_per_cell_weights(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        checkpoint_path = os.path.join(self.get_temp_dir(), "per_cell")
+        stacked_checkpoint_path = os.path.join(self.get_temp_dir(), "stacked")
+        num_nodes = len(confidence_dict)
+
+        for shared_weights in [glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.NONE_SHARED, glstm.ALL_SHARED]:
+            per_cell_result, per_cell_variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                save_checkpoint=checkpoint_path)
+            glstm.convert_checkpoint_to_stacked_weights(checkpoint_path, stacked_checkpoint_path, _kickoff_hand,
+                                                        "rnn/graph_lstm_in_new_graph")
+
+            for constant_input in [False, True]:
+                msg = "shared_weights: %r, constant_input: %s" % (shared_weights, constant_input)
+                stacked_result, stacked_variable_values = run_graph_lstm_in_new_graph(
+                    _kickoff_hand, confidence_dict, input_values, shared_weights=shared_weights,
+                    restore_checkpoint=stacked_checkpoint_path, update_schedule=glstm.LEVEL_SCHEDULE,
+                    stacked_weights=True, constant_input=constant_input)
+
+                # one variable per packed weight, unshared ones with a leading node axis
+                self.assertEqual(len(stacked_variable_values), len(glstm._PACKED_WEIGHTS), msg=msg)
+                for name, value in stacked_variable_values.items():
+                    self.assertEqual("stacked_weights" in name, value.shape[0] == num_nodes, msg=msg)
+                    self.assertEqual("stacked_weights" in name,
+                                     name.rpartition("/")[2][:-2] not in glstm._shared_packed_weights(
+                                         shared_weights, ""), msg=msg)
+                np.testing.assert_allclose(stacked_result, per_cell_result, atol=1e-5, err_msg=msg)
+
+            # stacked weights can be initialized from scratch
+            stacked_result, _ = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict, input_values,
+                                                            shared_weights=shared_weights,
+                                                            update_schedule=glstm.LEVEL_SCHEDULE,
+                                                            stacked_weights=True)
+            self.assertEqual(stacked_result.shape, per_cell_result.shape)
+
+    def test_input_terms_in_one_matmul(self):
+        with tf.Graph().as_default():
+            net = glstm.GraphLSTMNet(_kickoff_hand, 2, shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED,
+                                     update_schedule=glstm.LEVEL_SCHEDULE, stacked_weights=True)
+            input_data = tf.placeholder(tf.float32, [None, len(net.output_size), 2])
+            net.run_with_constant_input(input_data, 3, dtype=tf.float32)
+            # TensorFlow 1.14 and later create BatchMatMulV2 ops
+            matmuls = [op for op in tf.get_default_graph().get_operations()
+                       if op.type == "MatMul" or op.type.startswith("BatchMatMul")]
+            matmuls_in_loop = [op for op in matmuls if op._control_flow_context is not None]
+            self.assertEqual(len(matmuls) - len(matmuls_in_loop), 1)
+            self.assertEqual(len(matmuls_in_loop), 3 * len(net._get_plan().waves))
+
+
+class TestBenchmark(tf.test.TestCase):
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_run_and_compare(self):
+        graph, confidence_dict = benchmark.random_graph(8)
+        self.assertTrue(nx.is_connected(graph))
+        configs = benchmark.sweep_configs()
+        # every parameter gets changed once with respect to the base config
+        self.assertEqual(configs[0], benchmark.BASE_CONFIG)
+        self.assertEqual(len(configs), 1 + sum(len(v) - 1 for v in [benchmark.BATCH_SIZES, benchmark.TIMESTEPS,
+                                                                    benchmark.SHARED_WEIGHTS, benchmark.STATE_IS_TUPLE,
+                                                                    benchmark.ENGINES]))
+
+        results = benchmark.run_all(graphs={"random8": (graph, confidence_dict, None)},
+                                    configs=[dict(benchmark.BASE_CONFIG, batch_size=2, timesteps=1)], verbose=False)
+        metrics = results["results"][0]["metrics"]
+        self.assertLess(metrics["op_count"], metrics["gradient_op_count"])
+        self.assertGreater(metrics["forward_backward_time"], 0)
+        self.assertGreater(metrics["peak_memory"], 0)
+
+        # slower or bigger results are regressions, faster ones are not
+        self.assertEqual(benchmark.compare_results(results, results), [])
+        baseline = {"results": [dict(results["results"][0], metrics=dict(metrics, op_count=metrics["op_count"] - 1,
+                                                                         forward_time=metrics["forward_time"] * 2))]}
+        regressions = benchmark.compare_results(results, baseline)
+        self.assertEqual([r["metric"] for r in regressions], ["op_count"])
+
+    def test_recompute_report(self):
+        rows = benchmark.recompute_report(engines=["synchronous"], timesteps=[2], batch_size=2, verbose=False)
+        self.assertEqual(len(rows), 1)
+        self.assertLess(rows[0]["recomputed"]["stack_memory"], rows[0]["stored"]["stack_memory"])
+
+    def test_sparse_report(self):
+        rows = benchmark.sparse_report(graph_sizes=[8, 16], engines=["sparse_synchronous"], dense_max_nodes=8,
+                                       verbose=False)
+        self.assertEqual(len(rows), 2)
+        self.assertIsNone(rows[1]["dense"])
+        self.assertLess(rows[0]["sparse"]["gradient_op_count"], rows[0]["dense"]["gradient_op_count"])
+
+    def test_schedule_report(self):
+        graph, confidence_dict = benchmark.random_graph(8)
+        rows = benchmark.schedule_report(graphs={"random8": (graph, confidence_dict, None)},
+                                         engines=["sequential", "colouring"], verbose=False)
+        self.assertEqual([row["parallelism"]["update_schedule"] for row in rows],
+                         [glstm.SEQUENTIAL_SCHEDULE, glstm.COLOURING_SCHEDULE])
+        self.assertEqual(rows[0]["parallelism"]["steps"], 8)
+        self.assertLess(rows[1]["parallelism"]["steps"], 8)
+        self.assertGreater(rows[1]["metrics"]["forward_time"], 0)
+
+
+class TestProfiler(tf.test.TestCase):
+    """Test the attribution of op timings to nodes, gates and timesteps by graph_lstm_profiler"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_profile(self):
+        num_nodes = len(nx.Graph(_kickoff_hand))
+        trace_path = os.path.join(self.get_temp_dir(), "trace.json")
+        for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE]:
+            msg = "update_schedule: %s" % update_schedule
+            with tf.Graph().as_default():
+                nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2)
+                input_data = tf.placeholder(tf.float32, [None, num_nodes, 2])
+                output = glstm.graph_lstm(input_data, nxgraph, timesteps=2, update_schedule=update_schedule)
+                gradients = tf.gradients(tf.reduce_sum(output), tf.trainable_variables())
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    _, records = glstm_profiler.profile(sess, [output, gradients],
+                                                        feed_dict={input_data: np.random.rand(3, num_nodes, 2)},
+                                                        timesteps=2, node_names=nxgraph, chrome_trace_path=trace_path)
+
+            def values(key):
+                return {value for value, _, _ in glstm_profiler.aggregate(records, key)}
+            self.assertEqual(values("gate"), {*glstm.GATE_SCOPES, None}, msg=msg)
+            self.assertEqual(values("pass"), {"forward", "backward"}, msg=msg)
+            self.assertEqual(values("timestep"), {0, 1, None}, msg=msg)
+            # the cells of the sequential update run under their node's scope, waves share their ops
+            if update_schedule == glstm.SEQUENTIAL_SCHEDULE:
+                self.assertEqual(values("node"), {*nxgraph, None}, msg=msg)
+                self.assertEqual(values("wave"), {None}, msg=msg)
+            else:
+                self.assertEqual(values("wave"), {*range(len(glstm.GraphLSTMNet.level_schedule(nxgraph))), None},
+                                 msg=msg)
+            for record in records:
+                if record["gate"] is not None and record["pass"] == "forward":
+                    self.assertIsNotNone(record["node"] if update_schedule == glstm.SEQUENTIAL_SCHEDULE else
+                                         record["wave"], msg=record["op"])
+            self.assertIn("g_fij", glstm_profiler.format_table(records))
+
+            with open(trace_path) as f:
+                events = json.load(f)["traceEvents"]
+            gate_events = [e for e in events if e.get("cat") in glstm.GATE_SCOPES]
+            self.assertTrue(gate_events, msg=msg)
+            self.assertTrue(all(e["args"]["gate"] == e["cat"] for e in gate_events), msg=msg)
+
+
+class TestGateActivationRecorder(tf.test.TestCase):
+    """Test recording gate activations in sampled runs with graph_lstm_recorder"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_record(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        num_nodes = len(confidence_dict)
+        input_values = np.random.rand(3, num_nodes, 2)
+        variable_values = None
+        recorded = {}
+        for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE]:
+            msg = "update_schedule: %s" % update_schedule
+            path = os.path.join(self.get_temp_dir(), "gates_%s.npy" % update_schedule)
+            with tf.Graph().as_default():
+                recorder = glstm_recorder.GateActivationRecorder(path, num_nodes, 2, timesteps=2, sample_every=2,
+                                                                 batch_samples=2, dtype=np.float32)
+                nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+                input_data = tf.constant(input_values, tf.float32)
+                output = glstm.graph_lstm(input_data, nxgraph, timesteps=2, update_schedule=update_schedule,
+                                          activation_recorder=recorder)
+                variables = tf.trainable_variables()
+                gradients = tf.gradients(tf.reduce_sum(output), variables)
+                with tf.Session() as sess:
+                    if variable_values is None:
+                        sess.run(tf.global_variables_initializer())
+                        variable_values = dict(zip([v.name for v in variables], sess.run(variables)))
+                    else:
+                        sess.run([v.initializer for v in variables],
+                                 feed_dict={v.initializer.inputs[1]: variable_values[v.name] for v in variables})
+                    unrecorded_output = sess.run(output)
+                    # steps not sampled leave the records untouched
+                    self.assertEqual(recorder.feed_dict(1), {}, msg=msg)
+                    self.assertTrue(np.all(recorder.records["step"] == -1), msg=msg)
+                    recorded_output, _ = sess.run([output, gradients], feed_dict=recorder.feed_dict(2))
+                recorder.flush()
+            # recording does not change results
+            np.testing.assert_allclose(recorded_output, unrecorded_output, err_msg=msg)
+
+            records = glstm_recorder.GateActivationRecorder.load(path)
+            np.testing.assert_equal(records["step"], [2], err_msg=msg)
+            activations = records["activations"][0]
+            self.assertEqual(activations.shape, (2, num_nodes, len(glstm.GATE_SCOPES), 2, 2), msg=msg)
+            self.assertFalse(np.any(np.isnan(activations)), msg=msg)
+            # sigmoid gates, and the tanh of g_c
+            self.assertTrue(np.all((activations[:, :, :4] >= 0) & (activations[:, :, :4] <= 1)), msg=msg)
+            self.assertTrue(np.all(np.abs(activations[:, :, 4]) <= 1), msg=msg)
+            recorded[update_schedule] = activations
+
+        # cells and vectorised updates record the same activations
+        np.testing.assert_allclose(recorded[glstm.LEVEL_SCHEDULE], recorded[glstm.SEQUENTIAL_SCHEDULE], atol=1e-5)
+
+    def test_other_cells(self):
+        path = os.path.join(self.get_temp_dir(), "gates.npy")
+        with tf.Graph().as_default():
+            recorder = glstm_recorder.GateActivationRecorder(path, 2, 2, timesteps=1, sample_every=1)
+            net = glstm.GraphLSTMNet([("a", "b")], 2, activation_recorder=recorder)
+            for node_name in "ab":
+                net._nxgraph.nodes[node_name][_CELL] = DummyReturnTfCell(2)
+            output, _ = tf.nn.dynamic_rnn(net, tf.constant(np.random.rand(3, 1, 2, 2), tf.float32), dtype=tf.float32)
+            with tf.Session() as sess:
+                sess.run(output, feed_dict=recorder.feed_dict(0))
+        # cells other than GraphLSTMCells are run without recording
+        self.assertTrue(np.all(np.isnan(glstm_recorder.GateActivationRecorder.load(path)["activations"])))
+
+    def test_bounded_records(self):
+        num_nodes = len(nx.Graph(_kickoff_hand))
+        path = os.path.join(self.get_temp_dir(), "gates.npy")
+        with tf.Graph().as_default():
+            record_bytes = 8 + 1 * num_nodes * len(glstm.GATE_SCOPES) * 1 * 2 * 2
+            recorder = glstm_recorder.GateActivationRecorder(path, num_nodes, 2, timesteps=1, sample_every=1,
+                                                             max_bytes=2 * record_bytes + 1)
+            self.assertEqual(recorder.capacity, 2)
+            input_data = tf.constant(np.random.rand(3, num_nodes, 2), tf.float32)
+            output = glstm.graph_lstm(input_data, _kickoff_hand, 2, timesteps=3, update_schedule=glstm.LEVEL_SCHEDULE,
+                                      activation_recorder=recorder)
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                for step in range(3):
+                    sess.run(output, feed_dict=recorder.feed_dict(step))
+        # the oldest record is overwritten, timesteps beyond the recorded ones are dropped
+        self.assertEqual(recorder.sampled, 3)
+        np.testing.assert_equal(glstm_recorder.GateActivationRecorder.load(path)["step"], [1, 2])
+        self.assertLess(os.path.getsize(path), 2 * record_bytes + 1024)
+
+    def test_invalid_usage(self):
+        num_nodes = len(nx.Graph(_kickoff_hand))
+        path = os.path.join(self.get_temp_dir(), "gates.npy")
+        self.assertRaises(ValueError, glstm_recorder.GateActivationRecorder, path, num_nodes, 2, 1, max_bytes=100)
+        self.assertRaises(ValueError, glstm_recorder.GateActivationRecorder, path, num_nodes, 2, 1, sample_every=0)
+        with tf.Graph().as_default():
+            recorder = glstm_recorder.GateActivationRecorder(path, num_nodes, 2, 1)
+            self.assertRaises(ValueError, glstm.GraphLSTMNet, _kickoff_hand, 2, update_schedule=glstm.LEVEL_SCHEDULE,
+                              recompute_activations=True, activation_recorder=recorder)
+            # the converge loop only updates the samples not converged yet, which would be recorded as the first ones
+            for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE]:
+                net = glstm.GraphLSTMNet(_kickoff_hand, 2, update_schedule=update_schedule,
+                                         activation_recorder=recorder)
+                self.assertRaisesRegex(ValueError, "activation_recorder", net.run_until_converged,
+                                       tf.zeros([3, num_nodes, 2]), 10, 1e-2, dtype=tf.float32)
+        # the recorder lives in the graph of the network
+        with tf.Graph().as_default():
+            input_data = tf.constant(np.random.rand(3, num_nodes, 2), tf.float32)
+            self.assertRaises(ValueError, glstm.graph_lstm, input_data, _kickoff_hand, 2,
+                              update_schedule=glstm.LEVEL_SCHEDULE, activation_recorder=recorder)
+
+
+class TestExportInferenceGraph(tf.test.TestCase):
+    """Test the inference graphs of export_inference_graph against the training graphs they are exported from"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    # build a training graph like those of the train_build_*.py scripts: dense layers with dropout, an MHP layer and
+    # a Graph LSTM refining the mean of its hypotheses, as well as loss, optimizer and summaries
+    def build_training_graph(self, hypotheses_count=2):
+        import multiple_hypotheses_extension as mhp
+        confidence_dict = {n: i for i, n in enumerate(nx.Graph(_kickoff_hand))}
+        node_count = len(confidence_dict)
+        input_tensor = tf.placeholder(tf.float32, [None, 8])
+        groundtruth_tensor = tf.placeholder(tf.float32, [None, node_count * 2])
+        is_training = tf.placeholder(tf.bool)
+        hidden = tf.keras.layers.Dense(32, activation="relu")(input_tensor)
+        hidden = tf.keras.layers.Dropout(0.5)(hidden)
+        hidden = tf.keras.layers.Dense(32)(hidden)
+        hidden = tf.layers.dropout(hidden, training=is_training)
+        hidden = tf.keras.layers.Dense(4)(hidden)
+        mhp_layer, meta_loss = mhp.dense_mhp(hidden, node_count * 2, hypotheses_count, lambda a, b:
+                                             tf.reduce_mean(tf.abs(a - b)), is_training, groundtruth_tensor)
+        mhp_layer = lr_mult(0.1)(tf.reshape(mhp_layer, [-1, hypotheses_count, node_count, 2]))
+        mhp_mean, _ = mhp.mean_and_variance(mhp_layer)
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+        output_tensor = glstm.graph_lstm(mhp_mean, nxgraph, timesteps=glstm.timesteps_placeholder(2),
+                                         normalize=True, residual_connection=True)
+        tf.train.AdamOptimizer().minimize(meta_loss)
+        tf.summary.scalar("loss", meta_loss)
+        return input_tensor, output_tensor, is_training
+
+    def test_same_result_as_training_graph(self):
+        import export_inference_graph as eig
+        input_values = np.random.rand(3, 8)
+        for fold_bottlenecks in [False, True]:
+            msg = "fold_bottlenecks: %r" % fold_bottlenecks
+            filename = os.path.join(self.get_temp_dir(), "model-1.inference.meta")
+            with tf.Graph().as_default():
+                input_tensor, output_tensor, is_training = self.build_training_graph()
+                timesteps, = tf.get_collection(glstm.TIMESTEPS_COLLECTION)
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    results = {t: sess.run(output_tensor, feed_dict={input_tensor: input_values, timesteps: t,
+                                                                     is_training: False})
+                               for t in [1, 2]}
+                    graph_def = eig.freeze_inference_graph(sess, input_tensor, output_tensor,
+                                                           fold_bottlenecks=fold_bottlenecks,
+                                                           training_flags=[is_training])
+                eig.save_inference_graph(filename, graph_def, input_tensor.name, output_tensor.name,
+                                         [timesteps.name])
+
+            # only the Graph LSTM while loop is left of the control flow, and no training ops or variables
+            ops = {node.op for node in graph_def.node if "/while/" not in node.name}
+            self.assertFalse(ops & {"Switch", "Merge", "VariableV2", "VarHandleOp", "IdentityN", "Identity",
+                                    "RandomUniform"}, msg=msg)
+            self.assertFalse([node.name for node in graph_def.node if "Adam" in node.name or "gradients" in node.name],
+                             msg=msg)
+            # the 32 and 4 unit layers are folded, as are both hypotheses, and with fold_bottlenecks the result
+            matmuls = [node for node in graph_def.node if node.op == "MatMul" and "/while/" not in node.name]
+            self.assertEqual(len(matmuls), 2 if fold_bottlenecks else 3, msg=msg)
+
+            with tf.Graph().as_default():
+                input_tensor, output_tensor = eig.load_inference_graph(filename)
+                timesteps, = tf.get_collection(glstm.TIMESTEPS_COLLECTION)
+                with tf.Session() as sess:
+                    for t, result in results.items():
+                        np.testing.assert_allclose(sess.run(output_tensor, feed_dict={input_tensor: input_values,
+                                                                                      timesteps: t}),
+                                                   result, rtol=1e-5, atol=1e-5, err_msg=msg)
+
+    def test_prune_constant_branches(self):
+        import export_inference_graph as eig
+        with tf.Graph().as_default():
+            x = tf.placeholder(tf.float32, [None])
+            flag = tf.placeholder_with_default(True, [])
+            y = tf.cond(flag, lambda: x * 2., lambda: x - 1.)
+            # boolean placeholders that are no training flags are kept
+            switch = tf.placeholder_with_default(True, [])
+            z = tf.cond(switch, lambda: x * 3., lambda: x)
+            graph_def, flags = eig.fix_training_flags(tf.get_default_graph().as_graph_def(), [flag.op.name])
+            self.assertEqual(flags, [flag.op.name])
+            z_graph_def = eig.prune_constant_branches(graph_def)
+            z_graph_def = tf.graph_util.extract_sub_graph(z_graph_def, [z.op.name])
+            self.assertIn("Switch", {node.op for node in z_graph_def.node})
+            graph_def = eig.prune_constant_branches(graph_def)
+            graph_def = tf.graph_util.extract_sub_graph(graph_def, [y.op.name])
+            self.assertNotIn("Switch", {node.op for node in graph_def.node})
+            self.assertNotIn("Merge", {node.op for node in graph_def.node})
+        with tf.Graph().as_default():
+            tf.import_graph_def(graph_def, name="")
+            with tf.Session() as sess:
+                np.testing.assert_allclose(sess.run(y.name, feed_dict={x.name: [1., 2.]}), [0., 1.])
+
+
+class TestGraphSpec(tf.test.TestCase):
+    """Test GraphLSTMNets built from GraphSpecs against those built from nxgraphs"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_plan_as_nxgraph(self):
+        for update_schedule in [glstm.SEQUENTIAL_SCHEDULE, glstm.LEVEL_SCHEDULE, glstm.SYNCHRONOUS_SCHEDULE]:
+            msg = "update_schedule: %s" % update_schedule
+            confidence_dict = {n: np.random.rand() for n in nx.Graph(HAND_GRAPH_HANDS2017)}
+            spec = glstm.GraphSpec.from_edges(HAND_GRAPH_HANDS2017, 3, confidence_dict=confidence_dict,
+                                              index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
+            nxgraph = glstm.GraphLSTMNet.create_nxgraph(HAND_GRAPH_HANDS2017, 3, confidence_dict=confidence_dict,
+                                                        index_dict=HAND_GRAPH_HANDS2017_INDEX_DICT)
+            for other_spec in [spec, glstm.GraphSpec.from_nxgraph(nxgraph, 3)]:
+                spec_plan = glstm.GraphLSTMNet(other_spec, update_schedule=update_schedule)._get_plan()
+                nxgraph_plan = glstm.GraphLSTMNet(nxgraph, update_schedule=update_schedule)._get_plan()
+                self.assertEqual(spec_plan.node_order, nxgraph_plan.node_order, msg=msg)
+                self.assertEqual(dict(spec_plan.index), dict(nxgraph_plan.index), msg=msg)
+                self.assertEqual(dict(spec_plan.neighbours), dict(nxgraph_plan.neighbours), msg=msg)
+                if update_schedule == glstm.SEQUENTIAL_SCHEDULE:
+                    self.assertIsNone(spec_plan.waves)
+                    continue
+                self.assertEqual(len(spec_plan.waves), len(nxgraph_plan.waves), msg=msg)
+                for spec_wave, nxgraph_wave in zip(spec_plan.waves, nxgraph_plan.waves):
+                    self.assertEqual(spec_wave.nodes, nxgraph_wave.nodes, msg=msg)
+                    for spec_array, nxgraph_array in zip(spec_wave[1:], nxgraph_wave[1:]):
+                        np.testing.assert_equal(spec_array, nxgraph_array, err_msg=msg)
+
+    def test_same_result_as_nxgraph(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        spec = glstm.GraphSpec.from_edges(_kickoff_hand, 2, confidence_dict=confidence_dict)
+
+        for kwargs in [dict(), dict(update_schedule=glstm.LEVEL_SCHEDULE, stacked_weights=True,
+                                    shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED)]:
+            msg = "kwargs: %r" % kwargs
+            nxgraph_result, variable_values = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict,
+                                                                          input_values, **kwargs)
+            with tf.Graph().as_default():
+                input_data = tf.placeholder(tf.float32, [None, len(confidence_dict), 2])
+                output = glstm.graph_lstm(input_data, spec, name="graph_lstm_in_new_graph", timesteps=2, **kwargs)
+                variables = tf.global_variables()
+                self.assertEqual(sorted(v.name for v in variables), sorted(variable_values), msg=msg)
+                with tf.Session() as sess:
+                    sess.run([v.initializer for v in variables],
+                             feed_dict={v.initializer.inputs[1]: variable_values[v.name] for v in variables})
+                    spec_result = sess.run(output, feed_dict={input_data: input_values})
+            np.testing.assert_allclose(spec_result, nxgraph_result, atol=1e-6, err_msg=msg)
+
+    def test_lazy_cells(self):
+        # vectorised update schedules with stacked weights do not need any cells, the sequential update needs all
+        spec = glstm.GraphSpec.from_edges(_kickoff_hand, 2)
+        for kwargs, cell_count in [(dict(update_schedule=glstm.SYNCHRONOUS_SCHEDULE, stacked_weights=True), 0),
+                                   (dict(), len(spec))]:
+            with tf.Graph().as_default():
+                glstm.graph_lstm(tf.placeholder(tf.float32, [None, len(spec), 2]), spec, **kwargs)
+            self.assertEqual(len(spec._cells), cell_count, msg="kwargs: %r" % kwargs)
+
+    def test_invalid_spec(self):
+        # a path 0 - 1 - 2
+        offsets, indices = [0, 1, 3, 4], [1, 0, 2, 1]
+        self.assertEqual(len(glstm.GraphSpec(offsets, indices, 1)), 3)
+        self.assertRaisesRegex(ValueError, "undirected", glstm.GraphSpec, offsets, [1, 0, 2, 0], 1)
+        self.assertRaisesRegex(ValueError, "only once", glstm.GraphSpec, [0, 2, 4, 4], [1, 1, 0, 0], 1)
+        self.assertRaisesRegex(ValueError, "selfloops", glstm.GraphSpec, [0, 1, 1, 1], [0], 1)
+        self.assertRaisesRegex(ValueError, "increase monotonically", glstm.GraphSpec, [0, 3, 1, 4], indices, 1)
+        self.assertRaisesRegex(ValueError, "positions in", glstm.GraphSpec, offsets, [1, 0, 3, 1], 1)
+        self.assertRaisesRegex(ValueError, "index must contain", glstm.GraphSpec, offsets, indices, 1,
+                               index=[0, 2, 2])
+        self.assertRaisesRegex(ValueError, "one value per node", glstm.GraphSpec, offsets, indices, 1,
+                               confidence=[0, 1])
+        self.assertRaisesRegex(TypeError, "num_units", glstm.GraphSpec, offsets, indices, 1.5)
+        self.assertRaisesRegex(KeyError, "does not exist", glstm.GraphSpec.from_edges, _kickoff_hand, 1,
+                               confidence_dict={"thumb": 1.})
+
+
+class TestBatchedGraphLSTM(tf.test.TestCase):
+    """Test graph_lstm_batched against running GraphLSTMNet with stacked weights on each sample's graph"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_graph_lstm(self):
+        # samples with different graphs and update orders, the largest graph first
+        graphs = [_kickoff_hand, _kickoff_hand[:7], _kickoff_hand]
+        confidence_dicts = [{n: np.random.rand() for n in nx.Graph(graph)} for graph in graphs]
+        input_values = [np.random.rand(1, len(confidence_dict), 2) for confidence_dict in confidence_dicts]
+        max_nodes = len(confidence_dicts[0])
+        padded_input_values = np.zeros([len(graphs), max_nodes, 2])
+        for b, values in enumerate(input_values):
+            padded_input_values[b, :values.shape[1]] = values[0]
+        specs = [glstm.GraphSpec.from_edges(graph, 1, confidence_dict=confidence_dict)
+                 for graph, confidence_dict in zip(graphs, confidence_dicts)]
+
+        for update_schedule in [glstm.LEVEL_SCHEDULE, glstm.SYNCHRONOUS_SCHEDULE, glstm.COLOURING_SCHEDULE]:
+            msg = "update_schedule: %s" % update_schedule
+            # the synchronous schedule ignores the waves
+            graph_batch = glstm_batched.GraphBatch.from_graphs(specs, update_schedule=glstm.COLOURING_SCHEDULE if
+                                                               update_schedule == glstm.COLOURING_SCHEDULE else
+                                                               glstm.LEVEL_SCHEDULE)
+            variable_values = None
+            graph_lstm_results = []
+            for graph, confidence_dict, values in zip(graphs, confidence_dicts, input_values):
+                result, variable_values = run_graph_lstm_in_new_graph(
+                    graph, confidence_dict, values, variable_values=variable_values, stacked_weights=True,
+                    update_schedule=update_schedule)
+                graph_lstm_results.append(result[0])
+
+            with tf.Graph().as_default():
+                graph_batch_placeholders = glstm_batched.GraphBatch.placeholders(max_nodes)
+                input_data = tf.placeholder(tf.float32, [None, max_nodes, 2])
+                output, _ = glstm_batched.BatchedGraphLSTMNet(2, update_schedule=update_schedule)(
+                    input_data, graph_batch_placeholders, timesteps=2)
+                variables = tf.global_variables()
+                gradients = tf.gradients(tf.reduce_sum(output), variables)
+                with tf.Session() as sess:
+                    sess.run([v.initializer for v in variables],
+                             feed_dict={v.initializer.inputs[1]: variable_values["rnn/graph_lstm_in_new_graph/" +
+                                                                                  v.name.split("/", 1)[1]]
+                                        for v in variables})
+                    feed_dict = graph_batch_placeholders.feed_dict(graph_batch)
+                    feed_dict[input_data] = padded_input_values
+                    batched_result, _ = sess.run([output, gradients], feed_dict=feed_dict)
+            for b, result in enumerate(graph_lstm_results):
+                np.testing.assert_allclose(batched_result[b, :len(result)], result, atol=1e-6, err_msg=msg)
+                # padding nodes keep their (zero) state
+                np.testing.assert_equal(batched_result[b, len(result):], 0, err_msg=msg)
+
+    def test_padding_nodes(self):
+        graph_batch = glstm_batched.GraphBatch.from_graphs([_kickoff_hand, _kickoff_hand[:7]])
+        max_nodes = graph_batch.levels.shape[1]
+        # padding nodes are told by the node counts alone, even if their levels are set
+        graph_batch.levels[1, graph_batch.node_counts[1]:] = 0
+        initial_state_values = np.random.rand(2, max_nodes, 2, 2)
+        for update_schedule in [glstm.LEVEL_SCHEDULE, glstm.SYNCHRONOUS_SCHEDULE]:
+            msg = "update_schedule: %s" % update_schedule
+            with tf.Graph().as_default():
+                output, state = glstm_batched.BatchedGraphLSTMNet(2, update_schedule=update_schedule)(
+                    tf.constant(np.random.rand(2, max_nodes, 2), tf.float32), graph_batch, timesteps=2,
+                    initial_state=tf.constant(initial_state_values, tf.float32))
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    output_value, state_value = sess.run([output, state])
+            node_count = graph_batch.node_counts[1]
+            np.testing.assert_equal(output_value[1, node_count:], 0, err_msg=msg)
+            np.testing.assert_allclose(state_value[1, node_count:], initial_state_values[1, node_count:], rtol=1e-6,
+                                       err_msg=msg)
+            self.assertTrue(np.all(output_value[1, :node_count]), msg=msg)
+            self.assertTrue(np.all(output_value[0]), msg=msg)
+
+    def test_from_graphs(self):
+        # a path a - b - c and a single edge, indexed in sorted order
+        graph_batch = glstm_batched.GraphBatch.from_graphs([[("c", "b"), ("b", "a")], nx.Graph([("x", "y")])],
+                                                           max_nodes=4)
+        np.testing.assert_equal(graph_batch.node_counts, [3, 2])
+        np.testing.assert_equal(graph_batch.degrees, [[1, 2, 1, 0], [1, 1, 0, 0]])
+        np.testing.assert_equal(graph_batch.neighbour_index[0, 1], [2, 0])
+        np.testing.assert_equal(graph_batch.neighbour_index[1, :2, 0], [1, 0])
+        # all confidences are 0, so nodes are visited in order of their position
+        np.testing.assert_equal(graph_batch.levels, [[2, 1, 0, -1], [0, 1, -1, -1]])
+        graph_batch = glstm_batched.GraphBatch.from_graphs([[("c", "b"), ("b", "a")], nx.Graph([("x", "y")])],
+                                                           max_nodes=4, update_schedule=glstm.COLOURING_SCHEDULE)
+        np.testing.assert_equal(graph_batch.levels, [[0, 1, 0, -1], [0, 1, -1, -1]])
+        self.assertRaisesRegex(ValueError, "max_nodes", glstm_batched.GraphBatch.from_graphs, [_kickoff_hand],
+                               max_nodes=4)
+        self.assertRaisesRegex(ValueError, "update_schedule", glstm_batched.GraphBatch.from_graphs, [_kickoff_hand],
+                               update_schedule=glstm.SYNCHRONOUS_SCHEDULE)
+
+
+class TestSparseGraphLSTM(tf.test.TestCase):
+    """Test graph_lstm_sparse against GraphLSTMNet with stacked weights"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_graph_lstm(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(3, len(confidence_dict), 2)
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(_kickoff_hand, 2, confidence_dict=confidence_dict)
+        num_nodes, edges, confidence = glstm_sparse.edges_from_nxgraph(nxgraph)
+
+        for update_schedule, shared_weights in [(glstm.SYNCHRONOUS_SCHEDULE, glstm.NEIGHBOUR_CONNECTIONS_SHARED),
+                                                (glstm.LEVEL_SCHEDULE, glstm.ALL_SHARED),
+                                                (glstm.LEVEL_SCHEDULE, glstm.NONE_SHARED),
+                                                (glstm.COLOURING_SCHEDULE, glstm.ALL_SHARED)]:
+            msg = "update_schedule: %s, shared_weights: %s" % (update_schedule, sorted(shared_weights))
+            dense_result, variable_values = run_graph_lstm_in_new_graph(
+                _kickoff_hand, confidence_dict, input_values, stacked_weights=True, update_schedule=update_schedule,
+                shared_weights=shared_weights)
+            with tf.Graph().as_default():
+                input_data = tf.placeholder(tf.float32, [None, num_nodes, 2])
+                output = glstm_sparse.sparse_graph_lstm(input_data, edges, 2, confidence=confidence, timesteps=2,
+                                                        shared_weights=shared_weights, update_schedule=update_schedule)
+                variables = tf.global_variables()
+                # the weights are those of the dense network, relative to the network scope
+                self.assertEqual(sorted(v.name.split("/", 1)[1] for v in variables),
+                                 sorted(name.split("/", 2)[2] for name in variable_values), msg=msg)
+                gradients = tf.gradients(tf.reduce_sum(output), variables)
+                with tf.Session() as sess:
+                    sess.run([v.initializer for v in variables],
+                             feed_dict={v.initializer.inputs[1]: variable_values["rnn/graph_lstm_in_new_graph/" +
+                                                                                  v.name.split("/", 1)[1]]
+                                        for v in variables})
+                    sparse_result, _ = sess.run([output, gradients], feed_dict={input_data: input_values})
+            np.testing.assert_allclose(sparse_result, dense_result, atol=1e-6, err_msg=msg)
+
+    def test_shape_dependent_initializer(self):
+        num_nodes, num_units = 5, 3
+        with tf.Graph().as_default():
+            net = glstm_sparse.SparseGraphLSTMNet(num_nodes, [[i, i + 1] for i in range(num_nodes - 1)], num_units,
+                                                  shared_weights=glstm.NONE_SHARED,
+                                                  weight_initializer=tf.orthogonal_initializer())
+            net(tf.zeros([1, num_nodes, 2]))
+            u_fn, = [v for v in tf.global_variables() if v.name.endswith(glstm._U_FN + ":0")]
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                u_fn_value = sess.run(u_fn)
+        # every node's slice is initialized on its own, like the weights of a separate cell
+        self.assertEqual(u_fn_value.shape, (num_nodes, num_units, num_units))
+        for node_u_fn in u_fn_value:
+            np.testing.assert_allclose(node_u_fn.T.dot(node_u_fn), np.eye(num_units), atol=1e-5)
+
+    def test_graph_size_independent_of_node_count(self):
+        op_counts = []
+        for num_nodes in [10, 1000]:
+            with tf.Graph().as_default() as tf_graph:
+                input_data = tf.placeholder(tf.float32, [None, num_nodes, 2])
+                edges = [(i, (i + 1) % num_nodes) for i in range(num_nodes)]
+                glstm_sparse.sparse_graph_lstm(input_data, edges, 2, shared_weights=glstm.NONE_SHARED,
+                                               update_schedule=glstm.LEVEL_SCHEDULE)
+                op_counts.append(len(tf_graph.get_operations()))
+        self.assertEqual(op_counts[0], op_counts[1])
+
+    def test_invalid_edges(self):
+        self.assertRaisesRegex(ValueError, "Self-loops", glstm_sparse.SparseGraphLSTMNet, 3, [(0, 1), (2, 2)], 1)
+        self.assertRaisesRegex(ValueError, "must be in", glstm_sparse.SparseGraphLSTMNet, 3, [(0, 3)], 1)
+        self.assertRaisesRegex(ValueError, "one confidence value per node", glstm_sparse.SparseGraphLSTMNet, 3,
+                               [(0, 1)], 1, confidence=[0, 1])
+        # duplicate edges are ignored
+        senders, receivers, degrees = glstm_sparse.directed_edges(3, [(0, 1), (1, 0), (1, 2)])
+        np.testing.assert_equal(senders, [1, 0, 2, 1])
+        np.testing.assert_equal(receivers, [0, 1, 1, 2])
+        np.testing.assert_equal(degrees, [1, 2, 1])
+
+
+class TestNumpyGraphLSTM(tf.test.TestCase):
+    """Test the NumPy forward pass of graph_lstm_numpy against graph_lstm"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    def test_same_result_as_graph_lstm(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(5, len(confidence_dict), 2) * 100
+        checkpoint_path = os.path.join(self.get_temp_dir(), "graph_lstm")
+        npz_path = os.path.join(self.get_temp_dir(), "graph_lstm.npz")
+
+        for shared_weights, cell_class in [(glstm.NEIGHBOUR_CONNECTIONS_SHARED, None), (glstm.NONE_SHARED, None),
+                                           (glstm.ALL_SHARED, None),
+                                           (glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.PackedGraphLSTMCell)]:
+            msg = "shared_weights: %r, cell_class: %s" % (shared_weights, cell_class)
+            result, _ = run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict, input_values,
+                                                    shared_weights=shared_weights, cell_class=cell_class,
+                                                    normalize=True, residual_connection=True,
+                                                    save_checkpoint=checkpoint_path)
+            glstm_numpy.export_npz(checkpoint_path, npz_path, _kickoff_hand, "rnn/graph_lstm_in_new_graph",
+                                   confidence_dict=confidence_dict, timesteps=2, normalize=True,
+                                   residual_connection=True)
+            model = glstm_numpy.NumpyGraphLSTM(npz_path)
+
+            # weights shared by all nodes are only stored once
+            self.assertEqual(model.weights[glstm._U_UCON].ndim, 2 if glstm._U_UN in shared_weights else 3, msg=msg)
+            np.testing.assert_allclose(model.run(input_values), result, rtol=1e-4, atol=1e-4, err_msg=msg)
+
+        # predictions stored in npy files are processed in batches, MHP hypotheses are averaged
+        input_npy = os.path.join(self.get_temp_dir(), "predictions.npy")
+        output_npy = os.path.join(self.get_temp_dir(), "predictions_graphlstm.npy")
+        np.save(input_npy, np.stack([input_values, input_values + 1, input_values - 1], axis=1))
+        model.run_npy(input_npy, output_npy, batch_size=2)
+        np.testing.assert_allclose(np.load(output_npy), result, rtol=1e-4, atol=1e-4)
+
+    def test_run_until_converged(self):
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(4, len(confidence_dict), 2) * np.arange(1, 5)[:, np.newaxis, np.newaxis]
+        checkpoint_path = os.path.join(self.get_temp_dir(), "graph_lstm")
+        npz_path = os.path.join(self.get_temp_dir(), "graph_lstm.npz")
+        run_graph_lstm_in_new_graph(_kickoff_hand, confidence_dict, input_values, save_checkpoint=checkpoint_path)
+        glstm_numpy.export_npz(checkpoint_path, npz_path, _kickoff_hand, "rnn/graph_lstm_in_new_graph",
+                               confidence_dict=confidence_dict, timesteps=10)
+        model = glstm_numpy.NumpyGraphLSTM(npz_path)
+
+        output, timesteps = model.run_until_converged(input_values, 1e-2)
+        self.assertTrue(np.all((timesteps >= 1) & (timesteps <= 10)))
+        for sample, sample_timesteps in enumerate(timesteps):
+            np.testing.assert_allclose(output[sample], model.run(input_values[sample:sample + 1],
+                                                                 timesteps=sample_timesteps)[0], atol=1e-6)
+        np.testing.assert_array_equal(model.run_until_converged(input_values, 0)[1], [10] * len(input_values))
+
+
+# build a graph_lstm with two timesteps in a new tf.Graph, optionally loading variable values by variable name,
+# and return the output as well as the values of all variables
+# optionally, the variables are restored from a per-gate checkpoint, and saved to a checkpoint after initialization
+# confidence values given as numpy arrays become constant Tensors (i.e. dynamic confidence values)
+def run_graph_lstm_in_new_graph(nxgraph_template, confidence_dict, input_values, variable_values=None,
+                                cell_class=None, restore_checkpoint=None, save_checkpoint=None, **graph_lstm_kwargs):
+    with tf.Graph().as_default():
+        if confidence_dict is not None:
+            confidence_dict = {n: tf.constant(c, tf.float32) if isinstance(c, np.ndarray) else c
+                               for n, c in confidence_dict.items()}
+        state_is_tuple = graph_lstm_kwargs.get("state_is_tuple", True)
+        nxgraph = glstm.GraphLSTMNet.create_nxgraph(nxgraph_template, input_values.shape[-1],
+                                                    confidence_dict=confidence_dict, state_is_tuple=state_is_tuple,
+                                                    cell_class=cell_class)
+        input_data = tf.placeholder(tf.float32, [None, *input_values.shape[1:]])
+        output = glstm.graph_lstm(input_data, nxgraph, name="graph_lstm_in_new_graph", timesteps=2,
+                                  **graph_lstm_kwargs)
+        variables = tf.global_variables()
+        with tf.Session() as sess:
+            if restore_checkpoint is not None:
+                glstm.restore_from_per_gate_checkpoint(sess, restore_checkpoint)
+            elif variable_values is None:
+                sess.run(tf.global_variables_initializer())
+            else:
+                # feeding the initial values of all variables at once is a lot faster than loading them one by one
+                sess.run([v.initializer for v in variables],
+                         feed_dict={v.initializer.inputs[1]: variable_values[v.name] for v in variables})
+            if save_checkpoint is not None:
+                tf.train.Saver().save(sess, save_checkpoint)
+            return sess.run(output, feed_dict={input_data: input_values}), \
+                dict(zip([v.name for v in variables], sess.run(variables)))
+
+
+@unittest.skipUnless(int(tf.__version__.split(".")[0]) >= 2, "graph_lstm_tf2 requires TensorFlow 2")
+class TestGraphLSTMTF2(tf.test.TestCase):
+    """Test the TensorFlow 2 Graph LSTM of graph_lstm_tf2 against graph_lstm_numpy"""
+
+    def setUp(self):
+        self.longMessage = True
+
+    # save random per-gate weights named like those of a GraphLSTMNet 'rnn/net' made of GraphLSTMCells
+    @staticmethod
+    def save_per_gate_checkpoint(checkpoint_path, input_size, num_units, shared_weights):
+        with tf.Graph().as_default():
+            for weight_name in sorted(glstm.ALL_SHARED):
+                shape = [num_units] if weight_name in glstm._BIASES else \
+                    [input_size if weight_name in glstm._WEIGHTS else num_units, num_units]
+                scopes = ["rnn/net/shared_weights"] if weight_name in shared_weights else \
+                    ["rnn/net/node_%s/graph_lstm_cell_%s" % (n, n) for n in nx.Graph(_kickoff_hand)]
+                for scope in scopes:
+                    tf.compat.v1.get_variable(scope + "/" + weight_name,
+                                              initializer=np.random.uniform(-0.5, 0.5, shape).astype(np.float32))
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                tf.compat.v1.train.Saver().save(sess, checkpoint_path)
+
+    def test_load_checkpoint(self):
+        import graph_lstm_tf2 as glstm_tf2
+        confidence_dict = {n: np.random.rand() for n in nx.Graph(_kickoff_hand)}
+        input_values = np.random.rand(5, len(confidence_dict), 2) * 100
+        checkpoint_path = os.path.join(self.get_temp_dir(), "graph_lstm")
+        npz_path = os.path.join(self.get_temp_dir(), "graph_lstm.npz")
+
+        for shared_weights, update_schedule, jit_compile in [
+                (glstm.NEIGHBOUR_CONNECTIONS_SHARED, glstm.LEVEL_SCHEDULE, False),
+                (glstm.NONE_SHARED, glstm.SYNCHRONOUS_SCHEDULE, False),
+                (glstm.ALL_SHARED, glstm.SEQUENTIAL_SCHEDULE, True)]:
+            msg = "shared_weights: %r, update_schedule: %s, jit_compile: %s" % (shared_weights, update_schedule,
+                                                                                jit_compile)
+            self.save_per_gate_checkpoint(checkpoint_path, 2, 2, shared_weights)
+            glstm_numpy.export_npz(checkpoint_path, npz_path, _kickoff_hand, "rnn/net", confidence_dict=confidence_dict,
+                                   timesteps=2, normalize=True, residual_connection=True,
+                                   update_schedule=update_schedule)
+            net = glstm_tf2.GraphLSTMNet(_kickoff_hand, num_units=2, confidence_dict=confidence_dict,
+                                         shared_weights=shared_weights, update_schedule=update_schedule, timesteps=2,
+                                         normalize=True, residual_connection=True, jit_compile=jit_compile)
+            net.load_checkpoint(checkpoint_path, "rnn/net")
+            np.testing.assert_allclose(net(tf.constant(input_values, tf.float32)).numpy(),
+                                       glstm_numpy.NumpyGraphLSTM(npz_path).run(input_values),
+                                       rtol=1e-4, atol=1e-4, err_msg=msg)
+
+        # weights differing between nodes cannot be loaded into weights shared between all nodes
+        self.save_per_gate_checkpoint(checkpoint_path, 2, 2, glstm.NONE_SHARED)
+        net = glstm_tf2.GraphLSTMNet(_kickoff_hand, num_units=2)
+        with self.assertRaises(ValueError):
+            net.load_checkpoint(checkpoint_path, "rnn/net")
+        # dynamic update orders are not supported
+        with self.assertRaises(ValueError):
+            glstm_tf2.GraphLSTMNet(_kickoff_hand, num_units=2, confidence_dict={"wrist": tf.constant([1.])})
+
+    def test_jit_compile_and_state(self):
+        import graph_lstm_tf2 as glstm_tf2
+        input_values = tf.constant(np.random.rand(5, len(nx.Graph(_kickoff_hand)), 3), tf.float32)
+        net, xla_net = [glstm_tf2.GraphLSTMNet(_kickoff_hand, num_units=3, timesteps=3, jit_compile=jit_compile,
+                                               shared_weights=glstm.NEIGHBOUR_CONNECTIONS_SHARED)
+                        for jit_compile in (False, True)]
+        net.build(input_values.shape)
+        xla_net.build(input_values.shape)
+        xla_net.set_weights(net.get_weights())
+
+        # same results and gradients with and without XLA
+        results = []
+        for n in (net, xla_net):
+            with tf.GradientTape() as tape:
+                output = n(input_values)
+                loss = tf.reduce_sum(output)
+            results.append([output] + [tf.convert_to_tensor(g) for g in tape.gradient(loss, n.trainable_weights)])
+        for result, xla_result in zip(*results):
+            self.assertAllClose(result, xla_result, rtol=1e-5, atol=1e-5)
+
+        # continuing from a returned state is the same as running all timesteps at once
+        _, state = net(input_values, timesteps=1, return_state=True)
+        self.assertAllClose(net(input_values, initial_state=state, timesteps=tf.constant(2)), results[0][0])
+        _, state = xla_net(input_values, timesteps=2, return_state=True)
+        self.assertAllClose(xla_net(input_values, initial_state=state, timesteps=1), results[0][0])
+
+
 class TestNormalizeForGraphLSTM(tf.test.TestCase):
 
     def setUp(self):
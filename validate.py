@@ -1,6 +1,8 @@
 # run a trained network on the test set and collect predictions in a .npy file
 
+import graph_lstm as glstm
 import region_ensemble.model as re
+import export_inference_graph as eig
 from helpers import *
 import dataset_loaders
 
@@ -14,6 +16,10 @@ import os
 
 prefix, model_name, epoch = get_prefix_model_name_optionally_epoch()
 
+# number of Graph LSTM timesteps, overriding the number the model was built with (None: as built)
+# only takes effect for models built with glstm.timesteps_placeholder
+graphlstm_timesteps = None
+
 # dataset path declarations
 
 checkpoint_dir = r"/home/matthias-k/GraphLSTM_data/%s" % prefix
@@ -53,26 +59,38 @@ validation_summary_writer = tf.summary.FileWriter(tensorboard_dir, sess.graph)
 
 with sess.as_default():
 
-    print("Loading meta graph …")
-    loader = tf.train.import_meta_graph(checkpoint_dir + "/%s.meta" % model_name)
-
     if epoch is None:
-        print("Restoring weights for last epoch …")
-        loader.restore(sess, tf.train.latest_checkpoint(checkpoint_dir))
+        checkpoint_path = tf.train.latest_checkpoint(checkpoint_dir)
     else:
-        print("Restoring weights for epoch %i …" % epoch)
-        loader.restore(sess, checkpoint_dir + "/%s-%i" % (model_name, epoch))
-
-    print("Getting necessary tensors …")
-    collection = tf.get_collection(COLLECTION)
-    if len(collection) == 6:
-        input_tensor, output_tensor, groundtruth_tensor, train_step, loss, merged = collection
-        is_training = tf.placeholder(tf.bool)
-    elif len(collection) == 7:
-        input_tensor, output_tensor, groundtruth_tensor, train_step, loss, merged, is_training = collection
+        checkpoint_path = checkpoint_dir + "/%s-%i" % (model_name, epoch)
+
+    # use the inference graph exported by export_inference_graph.py if there is one, which only computes the output
+    use_inference_graph = os.path.exists(inference_graph_path(checkpoint_path))
+    if use_inference_graph:
+        print("Loading inference graph …")
+        input_tensor, output_tensor = eig.load_inference_graph(inference_graph_path(checkpoint_path))
     else:
-        raise ValueError("Expected 6 or 7 tensors in tf.get_collection(COLLECTION), but found %i:\n%r"
-                         % (len(collection), collection))
+        print("Loading meta graph (run export_inference_graph.py for a faster inference graph) …")
+        loader = tf.train.import_meta_graph(checkpoint_dir + "/%s.meta" % model_name)
+
+        if epoch is None:
+            print("Restoring weights for last epoch …")
+        else:
+            print("Restoring weights for epoch %i …" % epoch)
+        loader.restore(sess, checkpoint_path)
+
+        print("Getting necessary tensors …")
+        collection = tf.get_collection(COLLECTION)
+        if len(collection) == 6:
+            input_tensor, output_tensor, groundtruth_tensor, train_step, loss, merged = collection
+            is_training = tf.placeholder(tf.bool)
+        elif len(collection) == 7:
+            input_tensor, output_tensor, groundtruth_tensor, train_step, loss, merged, is_training = collection
+        else:
+            raise ValueError("Expected 6 or 7 tensors in tf.get_collection(COLLECTION), but found %i:\n%r"
+                             % (len(collection), collection))
+    timesteps_feed_dict = {} if graphlstm_timesteps is None else \
+        {t: graphlstm_timesteps for t in tf.get_collection(glstm.TIMESTEPS_COLLECTION)}
 
     validate_image_batch_gen = re.image_batch_generator_one_epoch(HIM2017.validate_root,
                                                                   HIM2017.validate_list,
@@ -85,22 +103,28 @@ with sess.as_default():
         X = batch
         actual_batch_size = X.shape[0]
         X = X.reshape([actual_batch_size, *input_shape[1:]])
-        Y_dummy = np.zeros([actual_batch_size, 21, 3])  # necessary as the restored "merged" tensor computes the loss
 
-        # POTENTIAL ERRORS: this script assumes that MHP models use flattened output (63), wheres non-MHP models use
-        # separate output dimensions per joint (21, 3). If an error arises when validating a model, check here.
-        if len(collection) == 7:
-            Y_dummy = Y_dummy.reshape([actual_batch_size, 63])
-
-        batch_predictions, summary = sess.run([output_tensor, merged], feed_dict={input_tensor: X,
-                                                                                  groundtruth_tensor: Y_dummy,
-                                                                                  K.learning_phase(): 0,
-                                                                                  is_training: False})
+        if use_inference_graph:
+            batch_predictions = sess.run(output_tensor, feed_dict={input_tensor: X, **timesteps_feed_dict})
+        else:
+            # necessary as the restored "merged" tensor computes the loss
+            Y_dummy = np.zeros([actual_batch_size, 21, 3])
+
+            # POTENTIAL ERRORS: this script assumes that MHP models use flattened output (63), wheres non-MHP models
+            # use separate output dimensions per joint (21, 3). If an error arises when validating a model, check here.
+            if len(collection) == 7:
+                Y_dummy = Y_dummy.reshape([actual_batch_size, 63])
+
+            batch_predictions, summary = sess.run([output_tensor, merged], feed_dict={input_tensor: X,
+                                                                                      groundtruth_tensor: Y_dummy,
+                                                                                      K.learning_phase(): 0,
+                                                                                      is_training: False,
+                                                                                      **timesteps_feed_dict})
+            validation_summary_writer.add_summary(summary, global_step=global_step)
         if predictions is not None:
             predictions = np.concatenate((predictions, batch_predictions))
         else:
             predictions = batch_predictions
-        validation_summary_writer.add_summary(summary, global_step=global_step)
         global_step += 1
 
 # # STORE PREDICTION RESULTS